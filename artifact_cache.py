@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from threading import Lock
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'auto-translator', 'artifacts')
+
+# Files above this size are hashed from samples instead of being read completely
+SAMPLED_HASH_THRESHOLD = 64 * 1024 * 1024
+SAMPLE_SIZE = 1024 * 1024
+SAMPLE_COUNT = 32
+
+
+def content_hash(path):
+    """
+    Hash a file's content, sampling large files
+
+    Files up to 64 MB are hashed completely. Larger files are hashed from their
+    size and 32 evenly spaced 1 MB samples including the first and last one,
+    which reads a few dozen megabytes regardless of the file size. Re-encoded or
+    truncated media changes the samples; an edit confined to unsampled bytes of
+    an otherwise identical file would not be detected.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if size <= SAMPLED_HASH_THRESHOLD:
+            for block in iter(lambda: f.read(SAMPLE_SIZE), b''):
+                digest.update(block)
+        else:
+            digest.update(f"sampled:{size}".encode('ascii'))
+            step = (size - SAMPLE_SIZE) / (SAMPLE_COUNT - 1)
+            for i in range(SAMPLE_COUNT):
+                f.seek(int(i * step))
+                digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def stage_key(stage, input_hash, **params):
+    """Key for a stage output: the stage name, the hash of its input and the parameters it depends on"""
+    payload = json.dumps([stage, input_hash, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed store for stage outputs (decoded audio, transcripts, translations)
+
+    Each artifact is a file stored under its stage key. An SQLite index tracks
+    sizes and last use; when the stored files exceed max_bytes, the least recently
+    used artifacts are removed. File content hashes are remembered by path, size
+    and modification time, so unchanged inputs are not hashed again.
+
+    Args:
+        root (str): Cache directory (default: ARTIFACT_CACHE_DIR env or ~/.cache/auto-translator/artifacts)
+        max_bytes (int): Size limit for stored artifacts (default: ARTIFACT_CACHE_MAX_MB env or 5000 MB)
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.getenv('ARTIFACT_CACHE_DIR') or DEFAULT_CACHE_DIR
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('ARTIFACT_CACHE_MAX_MB', '5000')) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.root, 'index.sqlite3'), timeout=30,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            )
+        ''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS artifacts_last_used ON artifacts (last_used)')
+        self.connection.commit()
+
+    def file_hash(self, path):
+        """Content hash of a file, reusing the remembered hash while size and mtime are unchanged"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.connection.execute('SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ?',
+                                          (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = content_hash(path)
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)',
+                                    (path, stat.st_size, stat.st_mtime_ns, digest))
+            self.connection.commit()
+        return digest
+
+    def get(self, key):
+        """Return the path of a stored artifact, or None"""
+        with self.lock:
+            row = self.connection.execute('SELECT path FROM artifacts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                self._forget(key)
+                return None
+            self.connection.execute('UPDATE artifacts SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+            return row[0]
+
+    def _forget(self, key):
+        # Called with the lock held
+        self.connection.execute('DELETE FROM artifacts WHERE key = ?', (key,))
+        self.connection.commit()
+
+    def _missing(self, key):
+        # The file was evicted (possibly by another process) between get() and reading it
+        with self.lock:
+            self._forget(key)
+
+    def fetch(self, key, destination):
+        """Copy a stored artifact to destination; returns False when it is not cached"""
+        path = self.get(key)
+        if path is None:
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        try:
+            shutil.copyfile(path, destination)
+        except FileNotFoundError:
+            self._missing(key)
+            return False
+        return True
+
+    def _temporary(self, directory, suffix):
+        # A unique name per writer, so threads storing the same key never share a temporary file
+        handle, temporary = tempfile.mkstemp(suffix=suffix, dir=directory)
+        os.close(handle)
+        return temporary
+
+    def put(self, key, source, suffix=''):
+        """Store a copy of the file at source under key and return the stored path"""
+        directory = os.path.join(self.root, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, key + suffix)
+        temporary = self._temporary(directory, '.tmp')
+        try:
+            shutil.copyfile(source, temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self._record(key, path)
+        return path
+
+    def put_array(self, key, array):
+        """Store a numpy array (e.g. decoded PCM) under key"""
+        import numpy as np
+
+        directory = os.path.join(self.root, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, key + '.npy')
+        temporary = self._temporary(directory, '.tmp.npy')
+        try:
+            np.save(temporary, array)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self._record(key, path)
+        return path
+
+    def get_array(self, key):
+        """Load a stored numpy array, or return None"""
+        import numpy as np
+
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            return np.load(path)
+        except FileNotFoundError:
+            self._missing(key)
+            return None
+
+    def _record(self, key, path):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)',
+                                    (key, path, os.path.getsize(path), time.time()))
+            self.connection.commit()
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM artifacts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the limit so eviction does not run on every insert
+        to_free = total - int(self.max_bytes * 0.9)
+        freed = 0
+        evicted = []
+        for key, path, size in self.connection.execute('SELECT key, path, size FROM artifacts ORDER BY last_used'):
+            evicted.append((key,))
+            freed += size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            if freed >= to_free:
+                break
+        self.connection.executemany('DELETE FROM artifacts WHERE key = ?', evicted)
+        self.connection.commit()
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_artifact_cache():
+    """Return the process-wide artifact cache, or None when disabled via ARTIFACT_CACHE=0"""
+    global _cache
+    if os.getenv('ARTIFACT_CACHE', '1').lower() in ('0', 'false', 'no', 'off'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ArtifactCache()
+        return _cache
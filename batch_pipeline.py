@@ -0,0 +1,150 @@
+import time
+from queue import Queue
+from threading import Lock, Thread
+
+# Marks the end of the work stream for a single worker
+_DONE = object()
+
+
+class StageStats:
+    """Per-stage counters collected while the pipeline runs"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.first_start = None
+        self.last_end = None
+        self.lock = Lock()
+
+    def record(self, started, finished, ok):
+        with self.lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.busy_time += finished - started
+            if self.first_start is None or started < self.first_start:
+                self.first_start = started
+            if self.last_end is None or finished > self.last_end:
+                self.last_end = finished
+
+    @property
+    def wall_time(self):
+        if self.first_start is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def summary(self):
+        wall = self.wall_time
+        per_minute = self.processed / wall * 60 if wall > 0 else 0.0
+        utilization = self.busy_time / (wall * self.workers) * 100 if wall > 0 else 0.0
+        return (f"{self.name:<12} processed={self.processed} failed={self.failed} "
+                f"busy={self.busy_time:.1f}s wall={wall:.1f}s "
+                f"throughput={per_minute:.2f} files/min utilization={utilization:.0f}%")
+
+
+class Stage:
+    """
+    One step of the pipeline
+
+    Args:
+        name (str): Stage name used in logs and the summary
+        func (callable): Takes a job and returns the job for the next stage
+        workers (int): Number of threads running this stage
+        queue_depth (int): Maximum number of jobs waiting in front of this stage
+    """
+
+    def __init__(self, name, func, workers=1, queue_depth=2):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.queue_depth = max(1, queue_depth)
+        self.stats = StageStats(name, self.workers)
+
+
+class StagePipeline:
+    """
+    Run jobs through a chain of stages with bounded queues between them
+
+    Every stage has its own worker threads, so different jobs occupy different
+    stages at the same time. Bounded queues keep a fast stage from running far
+    ahead of a slow one and holding too many intermediate results in memory.
+    A job whose stage raises is reported and dropped from the remaining stages.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.results = []
+        self.results_lock = Lock()
+        self.total_time = 0.0
+
+    def _run_worker(self, stage, inbox, outbox):
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                return
+            started = time.perf_counter()
+            try:
+                result = stage.func(job)
+                ok = True
+            except Exception as e:
+                print(f"[{stage.name}] failed for {job.get('input', job)}: {str(e)}")
+                result = None
+                ok = False
+            stage.stats.record(started, time.perf_counter(), ok)
+
+            if not ok or result is None:
+                continue
+            if outbox is None:
+                with self.results_lock:
+                    self.results.append(result)
+            else:
+                outbox.put(result)
+
+    def _run_stage(self, stage, inbox, outbox, next_workers):
+        threads = [
+            Thread(target=self._run_worker, args=(stage, inbox, outbox),
+                   name=f"{stage.name}-{i}", daemon=True)
+            for i in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Tell every worker of the next stage that no more jobs are coming
+        if outbox is not None:
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    def run(self, jobs):
+        """Push all jobs through the stages and return the jobs that completed every stage"""
+        queues = [Queue(maxsize=stage.queue_depth) for stage in self.stages]
+        supervisors = []
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            next_workers = self.stages[i + 1].workers if outbox is not None else 0
+            supervisor = Thread(target=self._run_stage,
+                                args=(stage, queues[i], outbox, next_workers),
+                                daemon=True)
+            supervisor.start()
+            supervisors.append(supervisor)
+
+        started = time.perf_counter()
+        for job in jobs:
+            queues[0].put(job)
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for supervisor in supervisors:
+            supervisor.join()
+        self.total_time = time.perf_counter() - started
+        return self.results
+
+    def print_summary(self):
+        """Print per-stage throughput collected during the last run"""
+        print(f"Pipeline finished in {self.total_time:.1f}s")
+        for stage in self.stages:
+            print(stage.stats.summary())
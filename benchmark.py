@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+import ffmpeg
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+STAGES = ['extract_audio', 'transcribe_audio', 'transcribe_batch', 'translate_srt', 'video_text']
+WORDS = ('the quick brown fox jumps over a lazy dog while we wait for the next train to arrive '
+         'she said that nothing would ever be the same again after that long summer night').split()
+
+
+def generate_video(path, duration, width=640, height=360):
+    """Synthetic test pattern video with beeping audio (1 s on, 1 s off) and a keyframe every 2 seconds"""
+    video = ffmpeg.input(f'testsrc2=size={width}x{height}:rate=25', f='lavfi', t=duration)
+    audio = ffmpeg.input('aevalsrc=0.3*sin(2*PI*440*t)*lt(mod(t\\,2)\\,1):s=16000', f='lavfi', t=duration)
+    output = ffmpeg.output(video, audio, path, vcodec='libx264', acodec='aac', g=50, pix_fmt='yuv420p')
+    ffmpeg.run(output, cmd=['ffmpeg', '-nostdin'], overwrite_output=True, capture_stderr=True)
+
+
+def generate_clip(path, duration, frequency=440):
+    """Synthetic audio clip with the same beep pattern as the test video"""
+    audio = ffmpeg.input(f'aevalsrc=0.3*sin(2*PI*{frequency}*t)*lt(mod(t\\,2)\\,1):s=16000', f='lavfi', t=duration)
+    ffmpeg.run(ffmpeg.output(audio, path), cmd=['ffmpeg', '-nostdin'], overwrite_output=True, capture_stderr=True)
+
+
+def generate_srt(path, cue_count, seed=0):
+    """SRT fixture with random sentences; every fifth cue repeats an earlier line like real dialogue does"""
+    from srt_model import Cue, write_srt
+
+    rng = random.Random(seed)
+    cues = []
+    for i in range(1, cue_count + 1):
+        if i > 5 and i % 5 == 0:
+            text = rng.choice(cues).text
+        else:
+            lines = rng.choice((1, 1, 2))
+            text = '\n'.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))).capitalize()
+                             for _ in range(lines))
+        cues.append(Cue(i, (i - 1) * 3000, (i - 1) * 3000 + 2500, text))
+    write_srt(path, cues)
+
+
+def prepare_media(workdir, duration, srt_sizes, clip_count=0):
+    """Create the synthetic media once; existing files are reused so runs stay comparable"""
+    os.makedirs(workdir, exist_ok=True)
+    video = os.path.join(workdir, f'video_{duration}s.mp4')
+    if not os.path.exists(video):
+        print(f"Generating {duration}s synthetic video...")
+        generate_video(video, duration)
+    fixtures = {}
+    for size in srt_sizes:
+        fixtures[size] = os.path.join(workdir, f'subtitles_{size}.srt')
+        if not os.path.exists(fixtures[size]):
+            generate_srt(fixtures[size], size)
+    # Short clips of 30-90 seconds for batched transcription
+    clips = []
+    durations = [30 + (i * 17) % 61 for i in range(clip_count)]
+    for i, clip_duration in enumerate(durations):
+        clips.append(os.path.join(workdir, 'clips', f'clip_{i:04d}.wav'))
+        if not os.path.exists(clips[-1]):
+            os.makedirs(os.path.dirname(clips[-1]), exist_ok=True)
+            generate_clip(clips[-1], clip_duration, 300 + (i * 37) % 500)
+    return {'video': video, 'duration': duration, 'srt': fixtures, 'clips': clips, 'clip_durations': durations}
+
+
+def create_stub(options):
+    from gemini_stub import GeminiStub
+
+    return GeminiStub(latency=options['latency'], jitter=options['jitter'], error_rate=options['error_rate'],
+                      quota_rpm=options['quota_rpm'], processing_time=options['processing_time'],
+                      seed=options['seed'])
+
+
+def create_client(options):
+    """
+    Stub model, files provider and stats function for the Gemini benchmarks
+
+    With --stub-keys above 1, every key gets its own stub (and quota) behind a
+    GeminiPool whose entries each have the --rpm budget.
+    """
+    if options['stub_keys'] <= 1:
+        stub = create_stub(options)
+        return stub.model(), stub, stub.stats
+
+    from gemini_pool import GeminiPool, PoolEntry
+
+    stubs = [create_stub(dict(options, seed=options['seed'] + i)) for i in range(options['stub_keys'])]
+    pool = GeminiPool([PoolEntry(f"key{i}/gemini-stub", stub.model(), options['rpm'], files=stub, key=f"key{i}")
+                       for i, stub in enumerate(stubs, 1)])
+
+    def stats():
+        totals = {}
+        for stub in stubs:
+            for name, value in stub.stats().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+    return pool, pool, stats
+
+
+def bench_extract_audio(run, media, options, workdir):
+    from extract_audio import extract_audio, load_audio_pcm
+
+    if run == 'mp3':
+        extract_audio(media['video'], os.path.join(workdir, 'audio.mp3'))
+    else:
+        load_audio_pcm(media['video'])
+    return {'audio_seconds': media['duration']}
+
+
+def bench_transcribe_audio(run, media, options, workdir):
+    from extract_audio import load_audio_pcm
+    from transcribe_audio import transcribe_audio
+
+    audio = load_audio_pcm(media['video'])
+    start = time.time()
+    transcribe_audio(audio, options['whisper_model'], 'srt', os.path.join(workdir, 'bench'),
+                     workers=options['transcribe_workers'])
+    return {'audio_seconds': media['duration'], 'model_and_decode_seconds': time.time() - start}
+
+
+def bench_transcribe_batch(run, media, options, workdir):
+    from model_registry import get_model, resolve_device, resolve_precision
+    from transcribe_audio import transcribe_audio, transcribe_batch
+
+    # Outputs are written next to the clips; load the model first so only decoding is compared
+    device = resolve_device()
+    get_model(options['whisper_model'], device, resolve_precision(device))
+    start = time.time()
+    if run == 'loop':
+        for clip in media['clips']:
+            transcribe_audio(clip, options['whisper_model'], 'srt', workers=1)
+    else:
+        transcribe_batch(media['clips'], options['whisper_model'], 'srt', options['batch_size'])
+    return {'audio_seconds': sum(media['clip_durations']), 'files': len(media['clips']),
+            'decode_seconds': time.time() - start}
+
+
+def bench_translate_srt(run, media, options, workdir):
+    from srt_model import read_srt
+    from translate_subtitles import translate_srt
+
+    model, _, stats = create_client(options)
+    input_file = media['srt'][int(run)]
+    translate_srt(input_file, os.path.join(workdir, f'translated_{run}.srt'), 'en', options['target_langs'],
+                  max_requests_per_minute=options['rpm'] * options['stub_keys'], parallel_requests=options['parallel'],
+                  model=model, use_cache=False)
+    return {'cues': len(read_srt(input_file)) * len(options['target_langs']), **stats()}
+
+
+def bench_video_text(run, media, options, workdir):
+    from extract_video_text import VideoTextExtractor
+    from translate_subtitles import create_rate_limiter
+
+    model, files, stats = create_client(options)
+    extractor = VideoTextExtractor(model=model, files=files)
+    rate_limiter = create_rate_limiter(options['rpm'] * options['stub_keys'], options['parallel'])
+    output = os.path.join(workdir, f'video_text_{run}.srt')
+    cues = None
+    if run == 'frames':
+        cues = len(extractor.process_frames(media['video'], output, rate_limiter=rate_limiter))
+    else:
+        # Work on a copy, since chunk files are written next to the input
+        video = os.path.join(workdir, 'video_text_input.mp4')
+        shutil.copyfile(media['video'], video)
+        try:
+            extractor.process_video(video, output, chunk_duration=options['chunk_duration'], rate_limiter=rate_limiter)
+        finally:
+            os.remove(video)
+    return {'cues': cues, 'audio_seconds': media['duration'], **stats()}
+
+
+BENCHMARKS = {
+    'extract_audio': (bench_extract_audio, lambda media: ['mp3', 'pcm']),
+    'transcribe_audio': (bench_transcribe_audio, lambda media: ['whisper']),
+    'transcribe_batch': (bench_transcribe_batch, lambda media: ['loop', 'batch']),
+    'translate_srt': (bench_translate_srt, lambda media: [str(size) for size in media['srt']]),
+    'video_text': (bench_video_text, lambda media: ['chunks', 'frames']),
+}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_single(stage, run, media, options, workdir):
+    """Run one benchmark in this process and return its metrics"""
+    func, _ = BENCHMARKS[stage]
+    start = time.time()
+    metrics = func(run, media, options, workdir)
+    wall = time.time() - start
+    metrics.update({'wall_seconds': wall, 'peak_rss_mb': peak_rss_mb()})
+    if metrics.get('cues'):
+        metrics['cues_per_second'] = metrics['cues'] / wall
+    if metrics.get('audio_seconds'):
+        metrics['audio_seconds_per_second'] = metrics['audio_seconds'] / wall
+    return metrics
+
+
+def run_benchmark(stages, options, workdir, output_file=None, compare_file=None):
+    """
+    Run the selected benchmarks and save the results
+
+    Every benchmark runs in its own subprocess, so peak memory is measured per
+    benchmark and no model or cache state carries over between them.
+
+    Args:
+        stages (list): Stage names from STAGES
+        options (dict): Media, stub and pipeline settings (see main)
+        workdir (str): Directory for synthetic media and outputs
+        output_file (str): Path to save the results as JSON
+        compare_file (str): Earlier results file to compare wall times with (optional)
+
+    Returns:
+        dict: Results with one entry per benchmark
+    """
+    clip_count = options['clip_count'] if 'transcribe_batch' in stages else 0
+    options = dict(options, clip_count=clip_count)
+    media = prepare_media(workdir, options['duration'], options['srt_sizes'], clip_count)
+    results = {}
+    for stage in stages:
+        for run in BENCHMARKS[stage][1](media):
+            name = f"{stage}:{run}"
+            print(f"Running {name}...")
+            command = [sys.executable, os.path.abspath(__file__), '--run-single', stage, run,
+                       '--workdir', workdir, '--options', json.dumps(options)]
+            process = subprocess.run(command, capture_output=True, text=True)
+            if process.returncode != 0:
+                error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'unknown error'
+                print(f"  {name} failed: {error}")
+                results[name] = {'error': error}
+                continue
+            results[name] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    previous = {}
+    if compare_file:
+        with open(compare_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)['results']
+
+    print(f"\n{'benchmark':<24} {'wall s':>8} {'cues/s':>9} {'audio s/s':>10} {'peak MB':>8} {'API calls':>10} {'vs prev':>8}")
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<24} failed: {result['error']}")
+            continue
+        change = ''
+        if 'wall_seconds' in previous.get(name, {}):
+            change = f"{result['wall_seconds'] / previous[name]['wall_seconds'] - 1:+.0%}"
+        cues_per_second = f"{result['cues_per_second']:.1f}" if 'cues_per_second' in result else '-'
+        audio_rate = f"{result['audio_seconds_per_second']:.1f}" if 'audio_seconds_per_second' in result else '-'
+        print(f"{name:<24} {result['wall_seconds']:>8.2f} {cues_per_second:>9} {audio_rate:>10} "
+              f"{result['peak_rss_mb']:>8.0f} {result.get('api_calls', '-'):>10} {change:>8}")
+
+    speedups = {}
+    loop, batch = results.get('transcribe_batch:loop', {}), results.get('transcribe_batch:batch', {})
+    if 'decode_seconds' in loop and 'decode_seconds' in batch:
+        # Model loading is excluded, so this is the gain from batched decoding alone
+        speedups['transcribe_batch'] = loop['decode_seconds'] / batch['decode_seconds']
+        print(f"\nBatched decoding: {speedups['transcribe_batch']:.2f}x the per-file loop "
+              f"({loop['decode_seconds']:.1f}s vs {batch['decode_seconds']:.1f}s for {batch['files']} clips)")
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None,
+        'options': options,
+        'results': results,
+        'speedups': speedups,
+    }
+    if output_file:
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to: {output_file}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline offline on synthetic media and a local Gemini stub')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to benchmark (default: all)')
+    parser.add_argument('--workdir', default='benchmark_data', help='Directory for synthetic media (default: benchmark_data)')
+    parser.add_argument('--output', help='Results JSON file (default: benchmark_results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier results JSON file to compare wall times with')
+
+    media = parser.add_argument_group('synthetic media')
+    media.add_argument('--duration', type=int, default=120, help='Length of the synthetic video in seconds (default: 120)')
+    media.add_argument('--srt-sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                       help='Cue counts of the SRT fixtures (default: 100 1000 5000)')
+    media.add_argument('--clip-count', type=int, default=32,
+                       help='Number of 30-90 second clips for the transcribe_batch benchmark (default: 32)')
+
+    stub = parser.add_argument_group('Gemini stub')
+    stub.add_argument('--latency', type=float, default=0.5, help='Mean response time in seconds (default: 0.5)')
+    stub.add_argument('--jitter', type=float, default=0.5, help='Relative response time variation (default: 0.5)')
+    stub.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500 (default: 0)')
+    stub.add_argument('--quota-rpm', type=int, help='Requests per minute before 429 errors (default: unlimited)')
+    stub.add_argument('--processing-time', type=float, default=1.0,
+                      help='Seconds before an uploaded file is ready (default: 1)')
+    stub.add_argument('--stub-keys', type=int, default=1,
+                      help='API keys, each with its own stub and quota, behind a Gemini pool; --rpm applies '
+                           'to each key (default: 1, no pool)')
+    stub.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+
+    pipeline = parser.add_argument_group('pipeline')
+    pipeline.add_argument('--rpm', type=int, default=600, help='Client requests-per-minute limit (default: 600)')
+    pipeline.add_argument('--parallel', type=int, default=10, help='Client parallel requests (default: 10)')
+    pipeline.add_argument('--target-langs', nargs='+', default=['ru'], help='Translation languages (default: ru)')
+    pipeline.add_argument('--chunk-duration', type=int, default=30,
+                          help='Video chunk length for on-screen text extraction (default: 30)')
+    pipeline.add_argument('--whisper-model', default='tiny', help='Whisper model for transcription (default: tiny)')
+    pipeline.add_argument('--transcribe-workers', type=int, default=1, help='Transcription worker processes (default: 1)')
+    pipeline.add_argument('--batch-size', type=int, default=16,
+                          help='Windows decoded together by the transcribe_batch benchmark (default: 16)')
+
+    # Internal: run one benchmark in this process and print its metrics as JSON
+    parser.add_argument('--run-single', nargs=2, metavar=('STAGE', 'RUN'), help=argparse.SUPPRESS)
+    parser.add_argument('--options', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.run_single:
+        options = json.loads(args.options)
+        media = prepare_media(args.workdir, options['duration'], options['srt_sizes'], options['clip_count'])
+        stage, run = args.run_single
+        print(json.dumps(run_single(stage, run, media, options, args.workdir)))
+        return
+
+    options = {
+        'duration': args.duration, 'srt_sizes': args.srt_sizes,
+        'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate, 'quota_rpm': args.quota_rpm,
+        'processing_time': args.processing_time, 'seed': args.seed, 'stub_keys': args.stub_keys,
+        'rpm': args.rpm, 'parallel': args.parallel, 'target_langs': args.target_langs,
+        'chunk_duration': args.chunk_duration, 'whisper_model': args.whisper_model,
+        'transcribe_workers': args.transcribe_workers, 'clip_count': args.clip_count, 'batch_size': args.batch_size,
+    }
+    output = args.output or os.path.join('benchmark_results', datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    run_benchmark(args.stages, options, args.workdir, output, args.compare)
+
+
+if __name__ == "__main__":
+    main()
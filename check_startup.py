@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that take seconds to import and are only needed once a model or the API is used
+HEAVY_MODULES = ('torch', 'whisper', 'faster_whisper', 'ctranslate2', 'google.generativeai', 'cv2', 'numpy')
+
+# Entry point -> heavy modules it may import at startup
+ENTRY_POINTS = {
+    'process_video': (),
+    'translate_subtitles': (),
+    'extract_audio': (),
+    'service': (),
+    'transcribe_audio': ('numpy',),
+}
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure(module, runs=3):
+    """
+    Import an entry point in fresh interpreters
+
+    Returns:
+        tuple: (fastest import time in seconds, heavy modules loaded by the import)
+    """
+    times = []
+    loaded = []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                 capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'unknown error'
+            raise RuntimeError(f"importing {module} failed: {error}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        loaded = result['modules']
+    return min(times), loaded
+
+
+def check_startup(max_seconds=1.0, runs=3, modules=None):
+    """
+    Check that entry points start quickly and import heavy dependencies only when they are used
+
+    Args:
+        max_seconds (float): Import time budget per entry point
+        runs (int): Imports per entry point; the fastest one counts, to smooth out noise
+        modules (list): Entry points to check (default: all)
+
+    Returns:
+        bool: True when every entry point is within budget and imports no unexpected heavy module
+    """
+    ok = True
+    print(f"{'entry point':<22} {'import s':>9}  heavy modules")
+    for module in modules or ENTRY_POINTS:
+        try:
+            seconds, loaded = measure(module, runs)
+        except RuntimeError as e:
+            print(f"{module:<22} {'-':>9}  {str(e)}")
+            ok = False
+            continue
+        unexpected = [name for name in loaded if name not in ENTRY_POINTS.get(module, ())]
+        problems = []
+        if unexpected:
+            problems.append(f"imports {', '.join(unexpected)} at startup")
+        if seconds > max_seconds:
+            problems.append(f"over the {max_seconds:.2f}s budget")
+        print(f"{module:<22} {seconds:>9.3f}  {', '.join(loaded) or '-'}"
+              f"{'  FAIL: ' + '; '.join(problems) if problems else ''}")
+        ok = ok and not problems
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the startup time and heavy imports of the entry points')
+    parser.add_argument('modules', nargs='*', help=f'Entry points to check (default: {" ".join(ENTRY_POINTS)})')
+    parser.add_argument('--max-seconds', type=float, default=float(os.getenv('STARTUP_MAX_SECONDS', '1.0')),
+                        help='Import time budget per entry point (default: STARTUP_MAX_SECONDS env or 1.0)')
+    parser.add_argument('--runs', type=int, default=3, help='Imports per entry point, the fastest counts (default: 3)')
+    args = parser.parse_args()
+    if not check_startup(args.max_seconds, args.runs, args.modules):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a', '.ogg', '.mp4', '.mkv', '.webm')
+DEFAULT_CONFIGS = ['whisper:fp32', 'whisper:int8', 'faster-whisper:int8']
+
+
+def normalize_words(text):
+    """Lowercase words without punctuation for word error rate"""
+    return re.findall(r"\w+(?:'\w+)?", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the number of reference words"""
+    reference = normalize_words(reference)
+    hypothesis = normalize_words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def find_samples(sample_dir):
+    """Audio files in sample_dir that have a reference transcript <name>.txt next to them"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, '*'))):
+        reference = os.path.splitext(path)[0] + '.txt'
+        if path.lower().endswith(AUDIO_EXTENSIONS) and os.path.exists(reference):
+            samples.append((path, reference))
+    return samples
+
+
+def fetch_samples(sample_dir):
+    """Download the audio files listed in <sample_dir>/manifest.json that are not there yet"""
+    manifest = os.path.join(sample_dir, 'manifest.json')
+    if not os.path.exists(manifest):
+        return
+    with open(manifest, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    for entry in entries:
+        path = os.path.join(sample_dir, entry['file'])
+        if os.path.exists(path):
+            continue
+        print(f"Downloading {entry['file']} from {entry['url']}...")
+        urllib.request.urlretrieve(entry['url'], path)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_config(backend, precision, model_name, device, audio_files):
+    """Transcribe audio_files with one backend configuration in this process and return timings"""
+    from extract_audio import load_audio_pcm
+    from model_registry import get_model
+
+    # Decode up front so the timings only cover the model
+    audio = {path: load_audio_pcm(path) for path in audio_files}
+
+    start = time.time()
+    model = get_model(model_name, device, precision, backend)
+    load_seconds = time.time() - start
+
+    texts = {}
+    start = time.time()
+    for path, samples in audio.items():
+        texts[path] = model.transcribe(samples)["text"]
+    transcribe_seconds = time.time() - start
+
+    return {
+        "load_seconds": load_seconds,
+        "transcribe_seconds": transcribe_seconds,
+        "audio_seconds": sum(len(samples) for samples in audio.values()) / 16000,
+        "peak_rss_mb": peak_rss_mb(),
+        "texts": texts,
+    }
+
+
+def compare_backends(sample_dir, configs, model_name, device, output_file=None, markdown_file=None):
+    """
+    Compare transcription backends on a fixed sample set
+
+    Each configuration runs in a fresh subprocess so its peak memory is measured
+    on its own. Word error rate is computed against <name>.txt reference
+    transcripts stored next to the audio files. Audio listed in a manifest.json
+    in sample_dir is downloaded first (see samples/).
+
+    Args:
+        sample_dir (str): Directory with audio files and reference transcripts
+        configs (list): "backend:precision" strings
+        model_name (str): Model size used for every configuration
+        device (str): Inference device
+        output_file (str): Optional path to save the results as JSON
+        markdown_file (str): Optional path to save the results as a Markdown table
+
+    Returns:
+        list: One result dict per configuration
+    """
+    fetch_samples(sample_dir)
+    samples = find_samples(sample_dir)
+    if not samples:
+        raise ValueError(f"No audio files with reference .txt transcripts found in: {sample_dir}")
+    audio_files = [path for path, _ in samples]
+    references = {path: open(reference, encoding='utf-8').read() for path, reference in samples}
+
+    results = []
+    for config in configs:
+        backend, _, precision = config.partition(':')
+        print(f"Running {config} on {len(audio_files)} files...")
+        command = [sys.executable, os.path.abspath(__file__), '--run-config', backend, precision or '',
+                   '--model', model_name, '--device', device, '--files', *audio_files]
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'unknown error'
+            print(f"  {config} failed: {error}")
+            results.append({"config": config, "error": error})
+            continue
+
+        run = json.loads(process.stdout.strip().splitlines()[-1])
+        errors = [word_error_rate(references[path], run["texts"][path]) for path in audio_files]
+        words = [len(normalize_words(references[path])) for path in audio_files]
+        results.append({
+            "config": config,
+            "load_seconds": run["load_seconds"],
+            "transcribe_seconds": run["transcribe_seconds"],
+            "realtime_factor": run["transcribe_seconds"] / run["audio_seconds"] if run["audio_seconds"] else 0.0,
+            "peak_rss_mb": run["peak_rss_mb"],
+            # Weighted by reference length, so long samples count proportionally
+            "wer": sum(e * w for e, w in zip(errors, words)) / max(1, sum(words)),
+            "per_file_wer": dict(zip(audio_files, errors)),
+        })
+
+    print(f"\n{'config':<24} {'load s':>8} {'transcribe s':>13} {'RTF':>6} {'peak RSS MB':>12} {'WER':>7}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['config']:<24} failed: {result['error']}")
+            continue
+        print(f"{result['config']:<24} {result['load_seconds']:>8.1f} {result['transcribe_seconds']:>13.1f} "
+              f"{result['realtime_factor']:>6.2f} {result['peak_rss_mb']:>12.0f} {result['wer']:>7.2%}")
+
+    if output_file:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({"model": model_name, "device": device, "samples": audio_files, "results": results}, f, indent=2)
+        print(f"\nResults saved to: {output_file}")
+    if markdown_file:
+        with open(markdown_file, 'w', encoding='utf-8') as f:
+            f.write(markdown_table(results, model_name, device, audio_files))
+        print(f"Table saved to: {markdown_file}")
+    return results
+
+
+def markdown_table(results, model_name, device, audio_files):
+    """Results as a Markdown table"""
+    lines = [f"Model `{model_name}` on `{device}`, {len(audio_files)} samples, {platform.processor() or platform.machine()}",
+             "",
+             "| backend | precision | load s | RTF | peak RSS MB | WER |",
+             "|---|---|---:|---:|---:|---:|"]
+    for result in results:
+        backend, _, precision = result['config'].partition(':')
+        if "error" in result:
+            lines.append(f"| {backend} | {precision or 'default'} | failed: {result['error']} | | | |")
+            continue
+        lines.append(f"| {backend} | {precision or 'default'} | {result['load_seconds']:.1f} | "
+                     f"{result['realtime_factor']:.2f} | {result['peak_rss_mb']:.0f} | {result['wer']:.2%} |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare speed, peak memory and word error rate of transcription backends')
+    parser.add_argument('sample_dir', nargs='?', help='Directory with audio files and <name>.txt reference transcripts')
+    parser.add_argument('--configs', nargs='+', default=DEFAULT_CONFIGS,
+                        help=f'backend:precision pairs to compare (default: {" ".join(DEFAULT_CONFIGS)})')
+    parser.add_argument('--model', default=os.getenv('WHISPER_MODEL', 'small'),
+                        help='Model size for every configuration (default: env setting or small)')
+    parser.add_argument('--device', default='cpu', help='Inference device (default: cpu)')
+    parser.add_argument('--output', default='backend_comparison.json', help='JSON results file')
+    parser.add_argument('--markdown', help='Also save the results as a Markdown table, e.g. backend_comparison.md')
+    # Internal: run a single configuration in this process and print its results as JSON
+    parser.add_argument('--run-config', nargs=2, metavar=('BACKEND', 'PRECISION'), help=argparse.SUPPRESS)
+    parser.add_argument('--files', nargs='+', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.run_config:
+        backend, precision = args.run_config
+        result = run_config(backend, precision or None, args.model, args.device, args.files)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    if not args.sample_dir:
+        parser.error("sample_dir is required")
+    compare_backends(args.sample_dir, args.configs, args.model, args.device, args.output, args.markdown)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,14 @@ import ffmpeg
 import argparse
 import os
 from dotenv import load_dotenv
+from metrics import metrics, add_metrics_arguments, start_metrics, finish_metrics
 
 # Load environment variables
 load_dotenv()
 
+# Whisper expects 16 kHz mono input
+SAMPLE_RATE = 16000
+
 def extract_audio(input_video, output_audio=None):
     """
     Extract audio from a video file using ffmpeg
@@ -27,22 +31,107 @@ def extract_audio(input_video, output_audio=None):
         audio_codec = os.getenv('AUDIO_CODEC', 'libmp3lame')
         stream = ffmpeg.input(input_video)
         stream = ffmpeg.output(stream, output_audio, acodec=audio_codec)
-        ffmpeg.run(stream, overwrite_output=True)
+        with metrics.span('ffmpeg_extract'):
+            ffmpeg.run(stream, overwrite_output=True)
         print(f"Audio successfully extracted to: {output_audio}")
         return output_audio
     except ffmpeg.Error as e:
         print(f"An error occurred: {e.stderr.decode()}")
         return None
 
+def load_audio_pcm(input_path, sample_rate=SAMPLE_RATE):
+    """
+    Decode audio from a media file straight into memory as mono float32 PCM
+
+    ffmpeg writes raw 16-bit samples to a pipe, so no intermediate audio
+    file is encoded or written to disk.
+
+    Args:
+        input_path (str): Path to input video or audio file
+        sample_rate (int): Output sample rate in Hz (default: 16000)
+
+    Returns:
+        numpy.ndarray: Samples in the [-1.0, 1.0] range, or None on failure
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    try:
+        stream = ffmpeg.input(input_path, threads=0)
+        stream = ffmpeg.output(stream, 'pipe:', format='s16le', acodec='pcm_s16le',
+                               ac=1, ar=sample_rate)
+        with metrics.span('ffmpeg_decode'):
+            out, _ = ffmpeg.run(stream, cmd=['ffmpeg', '-nostdin'],
+                                capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error as e:
+        print(f"An error occurred: {e.stderr.decode()}")
+        return None
+
+    import numpy as np
+
+    audio = np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+    metrics.inc('audio_seconds_decoded', len(audio) / sample_rate)
+    print(f"Decoded {len(audio) / sample_rate:.1f}s of audio from: {input_path}")
+    return audio
+
+def stream_audio_pcm(input_path, block_seconds=10, sample_rate=SAMPLE_RATE):
+    """
+    Decode audio from a media file as consecutive blocks of mono float32 PCM
+
+    Unlike load_audio_pcm, the samples are read from the ffmpeg pipe block by
+    block, so memory use does not grow with the length of the recording.
+
+    Args:
+        input_path (str): Path to input video or audio file
+        block_seconds (float): Length of each block in seconds (default: 10)
+        sample_rate (int): Output sample rate in Hz (default: 16000)
+
+    Yields:
+        numpy.ndarray: Samples in the [-1.0, 1.0] range
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+
+    import numpy as np
+
+    stream = ffmpeg.input(input_path, threads=0)
+    stream = ffmpeg.output(stream, 'pipe:', format='s16le', acodec='pcm_s16le',
+                           ac=1, ar=sample_rate).global_args('-loglevel', 'error')
+    process = ffmpeg.run_async(stream, cmd=['ffmpeg', '-nostdin'], pipe_stdout=True, pipe_stderr=True)
+    block_bytes = int(block_seconds * sample_rate) * 2
+    samples = 0
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            block = np.frombuffer(data[:len(data) // 2 * 2], np.int16).astype(np.float32) / 32768.0
+            samples += len(block)
+            yield block
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {input_path}: {process.stderr.read().decode().strip()}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+        metrics.inc('audio_seconds_decoded', samples / sample_rate)
+
 def main():
     parser = argparse.ArgumentParser(description='Extract audio from video file')
     parser.add_argument('input', help='Input video file path')
     parser.add_argument('-o', '--output', help='Output audio file path (optional)')
+    add_metrics_arguments(parser)
     
     args = parser.parse_args()
-    output_path = extract_audio(args.input, args.output)
-    if output_path:
-        print(f"Output path: {output_path}")
+    start_metrics(args)
+    try:
+        output_path = extract_audio(args.input, args.output)
+        if output_path:
+            print(f"Output path: {output_path}")
+    finally:
+        finish_metrics(args)
 
 if __name__ == "__main__":
     main()
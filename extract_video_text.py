@@ -1,27 +1,151 @@
 import os
-import math
+import csv
+import ffmpeg
 from dotenv import load_dotenv
 from datetime import timedelta
 import google.generativeai as genai
-import cv2
 import time
 import argparse
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from srt_model import Cue, format_timestamp, seconds_to_ms, write_srt
+from gemini_pool import GeminiPool, configured_keys, create_gemini_pool, pool_size
+from translate_subtitles import create_rate_limiter, response_token_count, response_usage, parse_payload
+from metrics import metrics, add_metrics_arguments, start_metrics, finish_metrics
 
 load_dotenv()
 
 API_KEY_ENV_VAR = "GEMINI_API_KEY"
 
+# Gemini bills about 258 tokens per sampled frame (1 fps) plus 32 per second of audio
+VIDEO_TOKENS_PER_SECOND = 290
+IMAGE_TOKENS = 258
+
+FRAMES_PROMPT = """Each image below is a still from a video, preceded by its marker [n] and timestamp.
+Transcribe all text visible in each image (labels, intertitles, subtitles), keeping line breaks.
+Answer with the marker [n] on its own line followed by the text of that image.
+Leave the text empty for images that contain no text."""
+
 
 def get_api_key():
-    """Fetch the Gemini API key from environment variables."""
-    api_key = os.getenv(API_KEY_ENV_VAR)
-    if not api_key:
+    """Fetch the Gemini API key (the first of GEMINI_API_KEYS, if set) from environment variables."""
+    keys = configured_keys()
+    if not keys:
         raise ValueError(f"Please set {API_KEY_ENV_VAR} in your environment or .env file")
-    return api_key
+    return keys[0]
+
+
+def parse_seconds(timestamp):
+    """Convert an H:MM:SS or H:MM:SS.fff timestamp to seconds"""
+    seconds = 0.0
+    for part in timestamp.replace(',', '.').split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def edge_hash(edges, size=24, density=0.08):
+    """
+    Perceptual hash of an edge map as a size*size-bit integer
+
+    A bit is set where a grid cell is dense with edges. Unlike a brightness hash
+    such as dHash, it stays stable on flat or noisy backgrounds, where intertitles
+    usually sit, and changes when text appears, disappears or moves.
+    """
+    cells = cv2.resize(edges.astype(np.float32), (size, size), interpolation=cv2.INTER_AREA) > density
+    return int(sum(1 << i for i, bit in enumerate(cells.flatten()) if bit))
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def sample_scene_frames(input_path, sample_fps=2.0, scene_threshold=0.005, hash_distance=6, max_width=768):
+    """
+    Pick the frames where the picture or its text changes
+
+    Frames are sampled at sample_fps and compared with the previous sample by their
+    edge maps, which react to text appearing on a static background as well as to
+    cuts. A change starts a new still unless its edge hash is within hash_distance
+    bits of the current still, in which case the current still just lasts longer.
+
+    Args:
+        input_path (str): Path to input video file
+        sample_fps (float): Frames per second to inspect
+        scene_threshold (float): Fraction of edge pixels that must differ to count as a change
+        hash_distance (int): Largest edge hash distance treated as the same picture
+        max_width (int): Stills are downscaled to at most this width
+
+    Returns:
+        list: dicts with "start" and "end" in seconds and "image" as JPEG bytes
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {input_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, round(fps / sample_fps))
+
+    stills = []
+    previous_edges = None
+    frame_index = -1
+    timestamp = 0.0
+    while True:
+        # grab() skips decoding into an image for the frames that are not inspected
+        if not cap.grab():
+            break
+        frame_index += 1
+        if frame_index % step:
+            continue
+        ok, frame = cap.retrieve()
+        if not ok:
+            break
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000 or frame_index / fps
+
+        gray = cv2.cvtColor(cv2.resize(frame, (320, 180), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        edges = cv2.Canny(gray, 100, 200) > 0
+        changed = previous_edges is None or np.mean(edges != previous_edges) > scene_threshold
+        previous_edges = edges
+        if not changed:
+            continue
+
+        frame_hash = edge_hash(edges)
+        if stills and hamming_distance(frame_hash, stills[-1]['hash']) <= hash_distance:
+            continue
+        if stills:
+            stills[-1]['end'] = timestamp
+
+        height, width = frame.shape[:2]
+        if width > max_width:
+            frame = cv2.resize(frame, (max_width, round(height * max_width / width)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        stills.append({'start': timestamp, 'end': None, 'hash': frame_hash, 'image': jpeg.tobytes()})
+
+    cap.release()
+    if stills:
+        stills[-1]['end'] = timestamp + step / fps
+    return stills
 
 
 class VideoTextExtractor:
-    def __init__(self, model_name="gemini-1.5-pro"):
+    def __init__(self, model_name="gemini-1.5-pro", model=None, files=None):
+        """
+        Args:
+            model_name (str): Gemini model name
+            model: Model object to use instead of creating one, e.g. a GeminiStub model
+            files: Provider of upload_file/get_file to use instead of the Gemini Files API
+
+        With several keys in GEMINI_API_KEYS or fallback models in GEMINI_FALLBACK_MODELS,
+        requests and uploads are spread over a GeminiPool.
+        """
+        self.files = files or (model if isinstance(model, GeminiPool) else genai)
+        if model is not None:
+            self.model = model
+            return
+        if pool_size(model_name) > 1:
+            self.model = create_gemini_pool(model_name)
+            self.files = files or self.model
+            return
+
         # Configure the API key
         self.api_key = get_api_key()
         genai.configure(api_key=self.api_key)
@@ -37,79 +161,190 @@ class VideoTextExtractor:
             raise
         
     def split_video(self, input_path, chunk_duration=1200):  # 1200 seconds = 20 minutes
-        """Split video into chunks if longer than chunk_duration"""
-        cap = cv2.VideoCapture(input_path)
-        if not cap.isOpened():
-            raise ValueError(f"Could not open video file: {input_path}")
-            
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        total_duration = total_frames / fps
-        
+        """
+        Split video into chunks if longer than chunk_duration
+
+        Streams are copied without re-encoding, so cuts land on the first keyframe at
+        or after each chunk_duration boundary and chunks are not exactly chunk_duration
+        long. The real start of every chunk is read back from ffmpeg's segment list.
+
+        Returns:
+            list: (chunk_path, start_offset_seconds) pairs in playback order
+        """
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input video file not found: {input_path}")
+        try:
+            probe = ffmpeg.probe(input_path)
+        except ffmpeg.Error as e:
+            raise ValueError(f"Could not open video file: {input_path}: {e.stderr.decode()}")
+
+        total_duration = float(probe['format'].get('duration', 0))
         if total_duration <= chunk_duration:
-            cap.release()
-            return [input_path]
-        
-        chunk_files = []
-        num_chunks = math.ceil(total_duration / chunk_duration)
-        base_name = os.path.splitext(input_path)[0]
-        
-        for i in range(num_chunks):
-            start_time = i * chunk_duration
-            end_time = min((i + 1) * chunk_duration, total_duration)
-            
-            start_frame = int(start_time * fps)
-            end_frame = int(end_time * fps)
-            
-            chunk_path = f"{base_name}_chunk_{i}.mp4"
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(chunk_path, fourcc, fps, 
-                                (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                                 int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
-            
-            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-            for _ in range(start_frame, end_frame):
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                out.write(frame)
-            
-            out.release()
-            chunk_files.append(chunk_path)
-        
-        cap.release()
-        return chunk_files
+            return [(input_path, 0.0)]
+
+        base_name, extension = os.path.splitext(input_path)
+        segment_list = f"{base_name}_chunks.csv"
+        stream = ffmpeg.input(input_path)
+        # Map streams that exist only: audio-only files have no video, and cover art is not the video
+        videos = [s for s in probe['streams'] if s['codec_type'] == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')]
+        streams = [stream[str(videos[0]['index'])]] if videos else []
+        if any(s['codec_type'] == 'audio' for s in probe['streams']):
+            streams.append(stream.audio)
+        if not streams:
+            raise ValueError(f"No video or audio stream in: {input_path}")
+        output = ffmpeg.output(*streams, f"{base_name}_chunk_%03d{extension}", c='copy', f='segment',
+                               segment_time=chunk_duration, reset_timestamps=1,
+                               segment_list=segment_list, segment_list_type='csv')
+        try:
+            ffmpeg.run(output, cmd=['ffmpeg', '-nostdin'], overwrite_output=True, capture_stderr=True)
+        except ffmpeg.Error as e:
+            raise ValueError(f"Could not split video file: {input_path}: {e.stderr.decode()}")
+
+        # Each line is "<file name>,<start time>,<end time>" in seconds of the source timeline
+        chunks = []
+        chunk_dir = os.path.dirname(os.path.abspath(input_path))
+        with open(segment_list, 'r', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if row:
+                    chunks.append((os.path.join(chunk_dir, row[0]), float(row[1])))
+        os.remove(segment_list)
+
+        # Offsets are relative to the first chunk, in case the source does not start at zero
+        first_start = chunks[0][1] if chunks else 0.0
+        chunks = [(path, start - first_start) for path, start in chunks]
+        print(f"Split video into {len(chunks)} chunks at: " +
+              ", ".join(str(timedelta(seconds=round(start))) for _, start in chunks))
+        return chunks
+
+    def generate(self, parts, estimated_tokens, rate_limiter=None, operation='video_text'):
+        """Send one request under the shared rate limiter and record its latency and token usage"""
+        rate_limiter = rate_limiter or create_rate_limiter()
+        with rate_limiter.request(estimated_tokens):
+            start = time.perf_counter()
+            try:
+                response = self.model.generate_content(parts, request_options={"timeout": 600})
+            except Exception as e:
+                metrics.record_request(operation, time.perf_counter() - start, 'error', error=type(e).__name__)
+                rate_limiter.on_error(e)
+                raise
+        metrics.record_request(operation, time.perf_counter() - start, 'ok', *response_usage(response))
+        rate_limiter.on_success()
+        rate_limiter.record_tokens(estimated_tokens, response_token_count(response))
+        return response
+
+    def wait_for_upload(self, video_file, timeout=None):
+        """Poll an uploaded file until Gemini has processed it, backing off between checks"""
+        if timeout is None:
+            timeout = float(os.getenv('UPLOAD_TIMEOUT', '1800'))
+        deadline = time.monotonic() + timeout
+        delay = 2.0
+        while video_file.state.name == "PROCESSING":
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"File was not processed within {timeout:.0f}s: {video_file.display_name}")
+            time.sleep(delay)
+            # Short chunks are usually ready within seconds, long ones take minutes
+            delay = min(delay * 1.5, 30.0)
+            video_file = self.files.get_file(video_file.name)
+        return video_file
 
-    def process_chunk(self, video_path):
+    def process_chunk(self, video_path, rate_limiter=None, chunk_duration=1200):
         """Process a single video chunk using Gemini API"""
-        print(f"Processing {video_path}...")
+        print(f"Uploading {video_path}...")
         
         # Upload the video
-        video_file = genai.upload_file(path=video_path)
-        
-        # Wait for processing
-        while video_file.state.name == "PROCESSING":
-            print('.', end='')
-            time.sleep(10)
-            video_file = genai.get_file(video_file.name)
-
-        if video_file.state.name == "FAILED":
-            raise ValueError(f"File processing failed: {video_path}")
-
-        # Extract text with timestamps
-        prompt = """Extract all text that appears in the video (labels, intertitles, subtitles) with their exact timestamps.
-        Format the output as a list of entries with timestamps in HH:MM:SS format and the corresponding text.
-        Only include entries where text actually appears."""
-
-        response = self.model.generate_content(
-            [video_file, prompt],
-            request_options={"timeout": 600}
-        )
-        
-        # Clean up the uploaded file
-        video_file.delete()
-        
-        return response.text
+        with metrics.span('upload'):
+            video_file = self.files.upload_file(path=video_path)
+        metrics.inc('uploaded_bytes', os.path.getsize(video_path))
+        try:
+            # Wait for processing
+            with metrics.span('upload_processing'):
+                video_file = self.wait_for_upload(video_file)
+            if video_file.state.name == "FAILED":
+                raise ValueError(f"File processing failed: {video_path}")
+
+            # Extract text with timestamps
+            prompt = """Extract all text that appears in the video (labels, intertitles, subtitles) with their exact timestamps.
+            Format the output as a list of entries with timestamps in HH:MM:SS format and the corresponding text.
+            Only include entries where text actually appears."""
+
+            print(f"Extracting text from {video_path}...")
+            response = self.generate([video_file, prompt], int(chunk_duration * VIDEO_TOKENS_PER_SECOND),
+                                     rate_limiter, 'video_text')
+            return response.text
+        finally:
+            # Clean up the uploaded file, also when the chunk failed
+            try:
+                video_file.delete()
+            except Exception as e:
+                print(f"Could not delete uploaded file for {video_path}: {str(e)}")
+
+    def process_frame_batch(self, stills, first_number, rate_limiter=None):
+        """Ask Gemini for the text on a batch of stills and return {still number: text}"""
+        parts = [FRAMES_PROMPT]
+        for number, still in enumerate(stills, first_number):
+            parts.append(f"[{number}] {format_timestamp(seconds_to_ms(still['start']))}")
+            parts.append({'mime_type': 'image/jpeg', 'data': still['image']})
+
+        response = self.generate(parts, len(stills) * IMAGE_TOKENS, rate_limiter, 'frames')
+        return parse_payload(response.text)
+
+    def process_frames(self, input_path, output_path, sample_fps=2.0, scene_threshold=0.005,
+                       batch_size=None, workers=None, rate_limiter=None):
+        """
+        Create an SRT file from stills taken at scene and text changes
+
+        Instead of uploading the video, only the distinct frames are sent, downscaled
+        and in batches. Cue times are the real times of the frames where the text
+        appears and changes.
+
+        Args:
+            input_path (str): Path to input video file
+            output_path (str): Path to output SRT file
+            sample_fps (float): Frames per second inspected for changes
+            scene_threshold (float): Fraction of edge pixels that must differ to count as a change
+            batch_size (int): Stills per request (default: FRAMES_PER_REQUEST env or 20)
+            workers (int): Batches processed at the same time (default: VIDEO_TEXT_WORKERS env or 3)
+            rate_limiter (RateLimiter): Shared request budget (default: created from environment variables)
+        """
+        if batch_size is None:
+            batch_size = int(os.getenv('FRAMES_PER_REQUEST', '20'))
+        if workers is None:
+            workers = int(os.getenv('VIDEO_TEXT_WORKERS', '3'))
+        rate_limiter = rate_limiter or create_rate_limiter()
+
+        with metrics.span('scene_sampling'):
+            stills = sample_scene_frames(input_path, sample_fps, scene_threshold)
+        upload_size = sum(len(still['image']) for still in stills)
+        metrics.inc('uploaded_bytes', upload_size)
+        print(f"Selected {len(stills)} stills ({upload_size / 1024 / 1024:.1f} MB) "
+              f"instead of uploading {os.path.getsize(input_path) / 1024 / 1024:.1f} MB of video")
+
+        texts = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(self.process_frame_batch, stills[i:i + batch_size], i + 1, rate_limiter)
+                for i in range(0, len(stills), batch_size)
+            ]
+            for batch, future in enumerate(futures, 1):
+                texts.update(future.result())
+                print(f"Processed batch {batch}/{len(futures)}")
+
+        # Consecutive stills showing the same text become one cue
+        cues = []
+        for number, still in enumerate(stills, 1):
+            text = texts.get(number)
+            if not text:
+                continue
+            start, end = seconds_to_ms(still['start']), seconds_to_ms(still['end'])
+            if cues and cues[-1].text == text and cues[-1].end == start:
+                cues[-1].end = end
+            else:
+                cues.append(Cue(len(cues) + 1, start, end, text))
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        write_srt(output_path, cues)
+        return cues
 
     def parse_timestamps(self, text):
         """Parse the Gemini response into SRT format entries"""
@@ -153,43 +388,61 @@ class VideoTextExtractor:
             srt_content += f"{entry['text']}\n\n"
         return srt_content
 
-    def process_video(self, input_path, output_path, chunk_duration=1200):
-        """Process entire video and create SRT file"""
+    def process_video(self, input_path, output_path, chunk_duration=1200, workers=None, rate_limiter=None):
+        """
+        Process entire video and create SRT file
+
+        Chunks are uploaded and processed concurrently by up to workers threads that
+        share one rate limiter; their entries are merged in playback order.
+
+        Args:
+            input_path (str): Path to input video file
+            output_path (str): Path to output SRT file
+            chunk_duration (int): Target chunk length in seconds
+            workers (int): Chunks processed at the same time (default: VIDEO_TEXT_WORKERS env or 3)
+            rate_limiter (RateLimiter): Shared request budget (default: created from environment variables)
+        """
+        if workers is None:
+            workers = int(os.getenv('VIDEO_TEXT_WORKERS', '3'))
+        rate_limiter = rate_limiter or create_rate_limiter()
+
         # Split video if necessary
-        chunk_files = self.split_video(input_path, chunk_duration)
-        
+        with metrics.span('split_video'):
+            chunks = self.split_video(input_path, chunk_duration)
+
+        results = [None] * len(chunks)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as executor:
+                futures = {
+                    executor.submit(self.process_chunk, chunk_file, rate_limiter, chunk_duration): i
+                    for i, (chunk_file, _) in enumerate(chunks)
+                }
+                try:
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                        print(f"Processed chunk {sum(r is not None for r in results)}/{len(chunks)}")
+                except BaseException:
+                    # Do not start the remaining chunks; running ones finish and clean up their uploads
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+        finally:
+            # Clean up temporary chunk files
+            for chunk_file, _ in chunks:
+                if chunk_file != input_path and os.path.exists(chunk_file):
+                    os.remove(chunk_file)
+
         all_entries = []
-        time_offset = 0
-        
-        for chunk_file in chunk_files:
-            # Process each chunk
-            chunk_text = self.process_chunk(chunk_file)
+        for chunk_text, (_, time_offset) in zip(results, chunks):
             chunk_entries = self.parse_timestamps(chunk_text)
             
-            # Adjust timestamps based on chunk position
+            # Shift timestamps by the exact start of the chunk in the source video
             for entry in chunk_entries:
                 entry['index'] = len(all_entries) + 1
-                # Add time offset for chunks after the first
-                if chunk_file != chunk_files[0]:
-                    start_parts = entry['start'].split(':')
-                    total_seconds = int(start_parts[0]) * 3600 + int(start_parts[1]) * 60 + int(start_parts[2])
-                    total_seconds += time_offset
-                    entry['start'] = str(timedelta(seconds=total_seconds))
-                    
-                    end_parts = entry['end'].split(':')
-                    total_seconds = int(end_parts[0]) * 3600 + int(end_parts[1]) * 60 + int(end_parts[2])
-                    total_seconds += time_offset
-                    entry['end'] = str(timedelta(seconds=total_seconds))
+                entry['start'] = format_timestamp(seconds_to_ms(parse_seconds(entry['start']) + time_offset))
+                entry['end'] = format_timestamp(seconds_to_ms(parse_seconds(entry['end']) + time_offset))
                 
             all_entries.extend(chunk_entries)
-            
-            # Update time offset for next chunk
-            if chunk_file != chunk_files[0]:
-                time_offset += chunk_duration
-            
-            # Clean up temporary chunk files
-            if len(chunk_files) > 1 and os.path.exists(chunk_file):
-                os.remove(chunk_file)
         
         # Create output directory if it doesn't exist
         os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
@@ -207,10 +460,21 @@ def main():
     parser.add_argument('--output', '-o', help='Output SRT file path (default: input_extracted.srt)')
     parser.add_argument('--chunk-duration', '-c', type=int, default=1200,
                        help='Duration of video chunks in seconds (default: 1200)')
+    parser.add_argument('--workers', '-w', type=int,
+                       help='Chunks uploaded and processed at the same time (default: VIDEO_TEXT_WORKERS env or 3)')
+    parser.add_argument('--mode', choices=['video', 'frames'], default='video',
+                       help='video: upload the video in chunks; frames: send only stills taken at scene and text changes '
+                            '(default: video)')
+    parser.add_argument('--sample-fps', type=float, default=2.0,
+                       help='Frames mode: frames per second inspected for changes (default: 2)')
+    parser.add_argument('--scene-threshold', type=float, default=0.005,
+                       help='Frames mode: fraction of edge pixels that must change to take a new still (default: 0.005)')
     parser.add_argument('--model', '-m', default=os.getenv('GEMINI_MODEL', 'gemini-1.5-pro'),
                        help='Gemini model name (default: from GEMINI_MODEL env var or gemini-1.5-pro)')
+    add_metrics_arguments(parser)
     
     args = parser.parse_args()
+    start_metrics(args)
     
     # Ensure API key is available before processing
     _ = get_api_key()
@@ -226,11 +490,18 @@ def main():
     # Initialize extractor and process video
     extractor = VideoTextExtractor(model_name=args.model)
     try:
-        extractor.process_video(args.input, args.output, chunk_duration=args.chunk_duration)
+        if args.mode == 'frames':
+            extractor.process_frames(args.input, args.output, sample_fps=args.sample_fps,
+                                     scene_threshold=args.scene_threshold, workers=args.workers)
+        else:
+            extractor.process_video(args.input, args.output, chunk_duration=args.chunk_duration,
+                                    workers=args.workers)
         print(f"Successfully processed video. Output saved to: {args.output}")
     except Exception as e:
         print(f"Error processing video: {str(e)}")
         raise
+    finally:
+        finish_metrics(args)
 
 if __name__ == "__main__":
     main()
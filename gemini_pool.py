@@ -0,0 +1,397 @@
+import asyncio
+import mimetypes
+import os
+import time
+from threading import Lock
+from dotenv import load_dotenv
+from metrics import metrics
+from rate_limiter import TokenBucket, is_quota_error
+
+# Load environment variables
+load_dotenv()
+
+# Longest time an entry stays out of rotation after repeated quota errors
+MAX_COOLDOWN = 600.0
+
+
+def configured_keys():
+    """API keys from GEMINI_API_KEYS (comma separated), falling back to GEMINI_API_KEY"""
+    keys = [key.strip() for key in os.getenv('GEMINI_API_KEYS', '').split(',') if key.strip()]
+    if not keys and os.getenv('GEMINI_API_KEY'):
+        keys = [os.getenv('GEMINI_API_KEY')]
+    return keys
+
+
+def configured_models(model_name=None):
+    """The main model followed by the fallback models from GEMINI_FALLBACK_MODELS"""
+    model_name = model_name or os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+    fallbacks = [name.strip() for name in os.getenv('GEMINI_FALLBACK_MODELS', '').split(',') if name.strip()]
+    return list(dict.fromkeys([model_name] + fallbacks))
+
+
+def pool_size(model_name=None):
+    """Number of key/model combinations configured in the environment (at least 1)"""
+    return max(1, len(configured_keys()) * len(configured_models(model_name)))
+
+
+def estimate_request_tokens(contents):
+    """Rough input tokens of a request: about 4 characters per token, 258 per inline image"""
+    parts = contents if isinstance(contents, list) else [contents]
+    tokens = 0
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // 4 + 1
+        elif isinstance(part, dict):
+            tokens += 258
+    return tokens
+
+
+class PoolEntry:
+    """
+    One API key and model with its own request budget
+
+    Args:
+        name (str): Label used in logs and metrics, e.g. "key2/gemini-1.5-flash"
+        model: GenerativeModel (or stub model) bound to the entry's key
+        max_requests_per_minute (int): Requests allowed per minute for this entry
+        max_tokens_per_minute (int): Tokens allowed per minute for this entry (optional)
+        files: Files API bound to the same key (upload_file/get_file), for requests with uploads
+        key (str): Identifies the API key; entries with the same key share uploaded files
+        priority (int): 0 for the main model, higher for fallback models
+    """
+
+    def __init__(self, name, model, max_requests_per_minute, max_tokens_per_minute=None, files=None,
+                 key=None, priority=0):
+        self.name = name
+        self.model = model
+        self.requests = TokenBucket(max_requests_per_minute)
+        self.tokens = TokenBucket(max_tokens_per_minute) if max_tokens_per_minute else None
+        self.files = files
+        self.key = key or name
+        self.priority = priority
+        self.cooldown_until = 0.0
+        self.strikes = 0
+
+    def headroom(self):
+        """Fraction of the request (and token) budget currently available"""
+        headroom = self.requests.available() / self.requests.capacity
+        if self.tokens:
+            headroom = min(headroom, self.tokens.available() / self.tokens.capacity)
+        return headroom
+
+
+class PooledFile:
+    """Uploaded file that remembers which key it belongs to"""
+
+    def __init__(self, file, entry_key, files, pool=None):
+        self.file = file
+        self.entry_key = entry_key
+        self.files = files
+        self.pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def delete(self):
+        try:
+            if hasattr(self.files, 'delete_file'):
+                self.files.delete_file(self.file.name)
+            else:
+                self.file.delete()
+        finally:
+            if self.pool is not None:
+                self.pool.forget_file(self.file.name)
+
+
+class GeminiPool:
+    """
+    Several API keys and models behind the GenerativeModel interface
+
+    Every entry has its own requests-per-minute (and optional tokens-per-minute)
+    budget. Each request goes to the entry that can send it soonest: entries of
+    the main model are preferred over fallback models, then the one with the most
+    headroom. An entry that returns a quota error is taken out of rotation for
+    GEMINI_POOL_COOLDOWN seconds (doubling on repeated errors) and the request is
+    sent to the next entry. Quota errors only reach the caller when every entry
+    has failed.
+
+    The pool also stands in for the Files API: upload_file uses the key with the
+    most headroom, and requests that include the uploaded file go to entries of
+    that key only.
+
+    Args:
+        entries (list): PoolEntry objects
+        cooldown (float): Seconds an entry is skipped after a quota error (default: GEMINI_POOL_COOLDOWN env or 60)
+    """
+
+    def __init__(self, entries, cooldown=None):
+        if not entries:
+            raise ValueError("A Gemini pool needs at least one entry")
+        self.entries = list(entries)
+        if cooldown is None:
+            cooldown = float(os.getenv('GEMINI_POOL_COOLDOWN', '60'))
+        self.cooldown = cooldown
+        self.model_name = getattr(self.entries[0].model, 'model_name', None)
+        self.uploads = {}
+        self.lock = Lock()
+
+    def _choose(self, tokens, keys=None, exclude=()):
+        """Pick an entry and reserve its budget; returns (entry, seconds to wait before sending)"""
+        with self.lock:
+            now = time.monotonic()
+            candidates = [entry for entry in self.entries
+                          if (keys is None or entry.key in keys) and entry not in exclude]
+            ready = [entry for entry in candidates if entry.cooldown_until <= now]
+            if not ready:
+                # Everything is cooling down; wait for the entry that comes back first
+                entry = min(candidates, key=lambda entry: entry.cooldown_until)
+                wait = entry.cooldown_until - now
+            else:
+                entry = min(ready, key=lambda entry: (entry.headroom() < 1 / entry.requests.capacity,
+                                                      entry.priority, -entry.headroom()))
+                wait = 0.0
+            delay = entry.requests.reserve(1)
+            if entry.tokens and tokens:
+                delay = max(delay, entry.tokens.reserve(tokens))
+        return entry, max(wait, delay)
+
+    def _on_error(self, entry, error):
+        metrics.inc('gemini_pool_errors', entry=entry.name, quota=str(is_quota_error(error)).lower())
+        if not is_quota_error(error):
+            return False
+        with self.lock:
+            now = time.monotonic()
+            # Requests already in flight fail together; count them as one signal
+            if entry.cooldown_until <= now:
+                entry.strikes += 1
+                seconds = min(MAX_COOLDOWN, self.cooldown * 2 ** (entry.strikes - 1))
+                entry.cooldown_until = now + seconds
+                print(f"Quota error on {entry.name}, taking it out of rotation for {seconds:.0f}s")
+        return True
+
+    def _fail_over(self, entry, error, tried, keys):
+        # Try the next entry after a quota error, unless every eligible entry has failed already
+        tried.append(entry)
+        candidates = [candidate for candidate in self.entries if keys is None or candidate.key in keys]
+        if not self._on_error(entry, error) or len(tried) >= len(candidates):
+            return False
+        metrics.inc('gemini_pool_failovers')
+        return True
+
+    def _refund(self, entry, tokens):
+        entry.requests.adjust(1)
+        if entry.tokens and tokens:
+            entry.tokens.adjust(tokens)
+
+    def _on_success(self, entry, estimated_tokens, response):
+        entry.strikes = 0
+        metrics.inc('gemini_pool_requests', entry=entry.name)
+        usage = getattr(response, 'usage_metadata', None)
+        actual = getattr(usage, 'total_token_count', None)
+        if entry.tokens and actual is not None:
+            entry.tokens.adjust(estimated_tokens - actual)
+
+    def _prepare(self, contents):
+        # Requests with an uploaded file must use the key the file was uploaded with
+        parts = contents if isinstance(contents, list) else [contents]
+        keys = {part.entry_key for part in parts if isinstance(part, PooledFile)} or None
+        if keys:
+            contents = [part.file if isinstance(part, PooledFile) else part for part in parts]
+        return contents, keys, estimate_request_tokens(contents)
+
+    def generate_content(self, contents, request_options=None):
+        """Send a request from a thread, failing over to other entries on quota errors"""
+        contents, keys, tokens = self._prepare(contents)
+        tried = []
+        while True:
+            entry, delay = self._choose(tokens, keys, tried)
+            if delay > 0:
+                metrics.observe('rate_limiter_wait_seconds', delay, kind='pool')
+                time.sleep(delay)
+            try:
+                response = entry.model.generate_content(contents, request_options=request_options)
+            except Exception as e:
+                if not self._fail_over(entry, e, tried, keys):
+                    raise
+                continue
+            self._on_success(entry, tokens, response)
+            return response
+
+    async def generate_content_async(self, contents, request_options=None):
+        """Send a request from a coroutine, failing over to other entries on quota errors"""
+        contents, keys, tokens = self._prepare(contents)
+        tried = []
+        while True:
+            entry, delay = self._choose(tokens, keys, tried)
+            if delay > 0:
+                metrics.observe('rate_limiter_wait_seconds', delay, kind='pool')
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    # The request will not be sent; give its budget back to the entry
+                    self._refund(entry, tokens)
+                    raise
+            try:
+                response = await entry.model.generate_content_async(contents, request_options=request_options)
+            except Exception as e:
+                if not self._fail_over(entry, e, tried, keys):
+                    raise
+                continue
+            self._on_success(entry, tokens, response)
+            return response
+
+    async def count_tokens_async(self, contents):
+        # Token counting has its own quota and is not budgeted
+        return await self.entries[0].model.count_tokens_async(contents)
+
+    def upload_file(self, path):
+        """Upload a file with the key that has the most headroom"""
+        with self.lock:
+            entry = max((entry for entry in self.entries if entry.files is not None),
+                        key=lambda entry: (entry.cooldown_until <= time.monotonic(), entry.headroom()))
+        file = PooledFile(entry.files.upload_file(path=path), entry.key, entry.files, self)
+        with self.lock:
+            self.uploads[file.name] = (entry.key, entry.files)
+        return file
+
+    def get_file(self, name):
+        """Current state of a file uploaded with upload_file"""
+        with self.lock:
+            key, files = self.uploads[name]
+        return PooledFile(files.get_file(name), key, files, self)
+
+    def forget_file(self, name):
+        """Stop tracking a deleted upload, so long-running processes do not keep every file name"""
+        with self.lock:
+            self.uploads.pop(name, None)
+
+    def stats(self):
+        """State of every entry"""
+        now = time.monotonic()
+        return [{
+            'name': entry.name,
+            'headroom': round(entry.headroom(), 3),
+            'cooling_down_seconds': round(max(0.0, entry.cooldown_until - now), 1),
+        } for entry in self.entries]
+
+
+class KeyFiles:
+    """
+    Gemini Files API bound to one API key; genai.upload_file always uses the globally configured key
+
+    Uses the FileServiceClient of google-generativeai 0.8.3 (pinned in requirements.txt), which
+    adds the media upload to the generated client; check this class when upgrading the SDK.
+    """
+
+    def __init__(self, api_key):
+        from google.generativeai.client import FileServiceClient
+
+        self.client = FileServiceClient(client_options={"api_key": api_key})
+
+    def upload_file(self, path):
+        from google.generativeai.types import file_types
+
+        return file_types.File(self.client.create_file(path, mime_type=mimetypes.guess_type(path)[0],
+                                                       display_name=os.path.basename(path)))
+
+    def get_file(self, name):
+        from google.generativeai.types import file_types
+
+        return file_types.File(self.client.get_file(name=name))
+
+    def delete_file(self, name):
+        self.client.delete_file(name=name)
+
+
+class KeyModel:
+    """
+    GenerativeModel that sends its requests with the given key instead of the global one
+
+    google-generativeai 0.8.3 (pinned in requirements.txt) has no public per-model key:
+    GenerativeModel creates its clients from genai.configure() only when its _client and
+    _async_client attributes are unset, so they are set here to clients built with the key.
+    Check this class when upgrading the SDK.
+
+    An async client is bound to the event loop it was created in, so it is created on first use
+    in the running loop: the shared loop of translate_subtitles.run_async for synchronous
+    callers, or the caller's own loop in async code. Clients of loops that have since closed
+    are dropped.
+
+    Args:
+        api_key (str): Key for every request of this model
+        model_name (str): Gemini model, e.g. gemini-1.5-flash
+    """
+
+    def __init__(self, api_key, model_name):
+        from google.ai import generativelanguage as glm
+
+        self.api_key = api_key
+        self.model = self._model(model_name)
+        self.model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self.async_models = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def _model(model_name):
+        import google.generativeai as genai
+
+        return genai.GenerativeModel(model_name)
+
+    @property
+    def model_name(self):
+        return self.model.model_name
+
+    def _async_model(self):
+        from google.ai import generativelanguage as glm
+
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            # The clients hold on to their loop, so forget those whose loop has been closed
+            for closed in [other for other in self.async_models if other.is_closed()]:
+                del self.async_models[closed]
+            model = self.async_models.get(loop)
+            if model is None:
+                model = self._model(self.model.model_name)
+                model._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self.api_key})
+                self.async_models[loop] = model
+        return model
+
+    def generate_content(self, contents, **kwargs):
+        return self.model.generate_content(contents, **kwargs)
+
+    async def generate_content_async(self, contents, **kwargs):
+        return await self._async_model().generate_content_async(contents, **kwargs)
+
+    async def count_tokens_async(self, contents):
+        return await self._async_model().count_tokens_async(contents)
+
+
+def create_gemini_pool(model_name=None, max_requests_per_minute=None, max_tokens_per_minute=None):
+    """
+    Build a pool with one entry per configured key and model
+
+    Args:
+        model_name (str): Main model (default: GEMINI_MODEL env or gemini-1.5-flash); fallback
+            models come from GEMINI_FALLBACK_MODELS
+        max_requests_per_minute (int): Budget of each entry (default: MAX_REQUESTS_PER_MINUTE env or 15)
+        max_tokens_per_minute (int): Token budget of each entry (default: MAX_TOKENS_PER_MINUTE env, unlimited if unset)
+
+    Returns:
+        GeminiPool
+    """
+    keys = configured_keys()
+    if not keys:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    if max_requests_per_minute is None:
+        max_requests_per_minute = int(os.getenv('MAX_REQUESTS_PER_MINUTE', '15'))
+    if max_tokens_per_minute is None and os.getenv('MAX_TOKENS_PER_MINUTE'):
+        max_tokens_per_minute = int(os.getenv('MAX_TOKENS_PER_MINUTE'))
+
+    entries = []
+    for number, key in enumerate(keys, 1):
+        files = KeyFiles(key)
+        for priority, name in enumerate(configured_models(model_name)):
+            entries.append(PoolEntry(f"key{number}/{name}", KeyModel(key, name), max_requests_per_minute,
+                                     max_tokens_per_minute, files=files, key=f"key{number}", priority=priority))
+    print(f"Using a Gemini pool of {len(keys)} keys x {len(entries) // len(keys)} models")
+    return GeminiPool(entries)
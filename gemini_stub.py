@@ -0,0 +1,200 @@
+import asyncio
+import os
+import random
+import re
+import time
+from collections import deque
+from threading import Lock
+
+# Marker formats used by translate_subtitles and extract_video_text
+PAYLOAD_MARKER = re.compile(r'^\[(\d+)\][ \t]*\n(.*?)(?=^\[\d+\][ \t]*$|\Z)', re.MULTILINE | re.DOTALL)
+LANGUAGES_LINE = re.compile(r'Translate every subtitle into each of these languages: ([\w\-, ]+)\.')
+FRAME_MARKER = re.compile(r'^\[(\d+)\] ')
+
+
+class StubError(Exception):
+    """API error raised by the stub; code mirrors the HTTP status (429 for quota errors)"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class StubResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_tokens, len(text) // 4 + 1)
+
+
+class _TokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class _State:
+    def __init__(self, name):
+        self.name = name
+
+
+class StubFile:
+    """Uploaded file that becomes ACTIVE after the stub's processing delay"""
+
+    def __init__(self, stub, path):
+        self.stub = stub
+        self.name = f"files/{len(stub.files) + 1}"
+        self.display_name = path
+        self.ready_at = time.monotonic() + stub.processing_time
+        self.deleted = False
+
+    @property
+    def state(self):
+        return _State("ACTIVE" if time.monotonic() >= self.ready_at else "PROCESSING")
+
+    def delete(self):
+        self.deleted = True
+
+
+class StubModel:
+    """Stand-in for genai.GenerativeModel backed by a GeminiStub"""
+
+    def __init__(self, stub, model_name="gemini-stub"):
+        self.stub = stub
+        self.model_name = model_name
+
+    def generate_content(self, contents, request_options=None):
+        self.stub.admit()
+        time.sleep(self.stub.sample_latency())
+        return self.stub.respond(contents)
+
+    async def generate_content_async(self, contents, request_options=None):
+        self.stub.admit()
+        await asyncio.sleep(self.stub.sample_latency())
+        return self.stub.respond(contents)
+
+    async def count_tokens_async(self, contents):
+        return _TokenCount(len(str(contents)) // 4 + 1)
+
+
+class GeminiStub:
+    """
+    In-process stand-in for the Gemini API used by benchmarks
+
+    Requests wait for a random latency, fail with a 500 error at error_rate and
+    with a 429 error once more than quota_rpm requests arrive within a minute.
+    Translation requests are answered in the marker format the client expects,
+    video and still requests with made-up on-screen text.
+
+    Args:
+        latency (float): Mean response time in seconds
+        jitter (float): Response times vary uniformly by this fraction of the latency
+        error_rate (float): Fraction of requests failing with a server error
+        quota_rpm (int): Requests per minute before quota errors (optional, unlimited when not set)
+        processing_time (float): Seconds before an uploaded file becomes ACTIVE
+        seed (int): Random seed for reproducible runs
+    """
+
+    def __init__(self, latency=0.5, jitter=0.5, error_rate=0.0, quota_rpm=None, processing_time=1.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_rpm = quota_rpm
+        self.processing_time = processing_time
+        self.random = random.Random(seed)
+        self.lock = Lock()
+        self.window = deque()
+        self.files = []
+        self.calls = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.uploaded_bytes = 0
+
+    def model(self, model_name="gemini-stub"):
+        return StubModel(self, model_name)
+
+    def sample_latency(self):
+        with self.lock:
+            return max(0.0, self.latency * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def admit(self):
+        """Count a request and raise the configured quota and server errors"""
+        now = time.monotonic()
+        with self.lock:
+            self.calls += 1
+            while self.window and now - self.window[0] >= 60:
+                self.window.popleft()
+            if self.quota_rpm and len(self.window) >= self.quota_rpm:
+                self.quota_errors += 1
+                raise StubError(429, "Resource has been exhausted (e.g. check quota).")
+            self.window.append(now)
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                raise StubError(500, "An internal error has occurred.")
+
+    def respond(self, contents):
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt = "\n".join(part for part in parts if isinstance(part, str))
+        prompt_tokens = len(prompt) // 4 + 1
+
+        if any(isinstance(part, StubFile) for part in parts):
+            text = self._video_text()
+            prompt_tokens += 290 * 60
+        elif any(isinstance(part, dict) for part in parts):
+            numbers = [FRAME_MARKER.match(part).group(1) for part in parts
+                       if isinstance(part, str) and FRAME_MARKER.match(part)]
+            text = "\n".join(f"[{number}]\nTitle {number}" for number in numbers)
+            prompt_tokens += 258 * len(numbers)
+        else:
+            text = self._translation(prompt)
+
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += len(text) // 4 + 1
+        return StubResponse(text, prompt_tokens)
+
+    def _translation(self, prompt):
+        languages = LANGUAGES_LINE.search(prompt)
+        items = PAYLOAD_MARKER.findall(prompt)
+        if languages:
+            codes = [code.strip() for code in languages.group(1).split(',')]
+            return "\n".join(f"[{number}:{code}]\n{code.upper()} {text.strip()}"
+                             for number, text in items for code in codes)
+        return "\n".join(f"[{number}]\n~ {text.strip()}" for number, text in items)
+
+    def _video_text(self):
+        # A handful of on-screen captions at fixed times within the chunk
+        return "\n".join(f"00:00:{seconds:02d} Caption at {seconds}s" for seconds in range(5, 60, 10))
+
+    # Files API stand-ins, used as VideoTextExtractor(files=stub)
+    def upload_file(self, path):
+        with self.lock:
+            file = StubFile(self, path)
+            self.files.append(file)
+            self.uploaded_bytes += os.path.getsize(path)
+        return file
+
+    def get_file(self, name):
+        with self.lock:
+            return next(file for file in self.files if file.name == name)
+
+    def stats(self):
+        """Counters for the requests served so far"""
+        with self.lock:
+            return {
+                "api_calls": self.calls,
+                "server_errors": self.errors,
+                "quota_errors": self.quota_errors,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+                "uploads": len(self.files),
+                "uploaded_bytes": self.uploaded_bytes,
+                "undeleted_uploads": sum(not file.deleted for file in self.files),
+            }
@@ -0,0 +1,255 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PREFIX = 'auto_translator'
+# Seconds; covers fast cache lookups up to long model loads and video uploads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """
+    Process-wide counters, histograms and timing spans
+
+    Events (finished spans, API requests) are appended as JSON lines when a metrics
+    file is configured. Counters and histograms can be exported in the Prometheus
+    text format, to a file or over HTTP, and summarized as a timing breakdown.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.spans = {}
+        self.lock = Lock()
+        self.sink = None
+        self.prometheus_path = None
+        self.server = None
+        self.started = time.time()
+
+    def configure(self, jsonl_path=None, prometheus_path=None, port=None):
+        """Enable JSON lines output, a Prometheus text file and/or a Prometheus HTTP endpoint"""
+        if jsonl_path:
+            os.makedirs(os.path.dirname(os.path.abspath(jsonl_path)), exist_ok=True)
+            self.sink = open(jsonl_path, 'a', encoding='utf-8')
+        self.prometheus_path = prometheus_path
+        if port:
+            self.serve(port)
+
+    def emit(self, event, **fields):
+        """Append one event to the JSON lines file, if configured"""
+        if self.sink is None:
+            return
+        line = json.dumps({'ts': round(time.time(), 3), 'event': event, **fields}, ensure_ascii=False, default=str)
+        with self.lock:
+            self.sink.write(line + '\n')
+            self.sink.flush()
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a value in a histogram"""
+        key = (name, _label_key(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time a block of work as a stage span"""
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe('stage_seconds', seconds, stage=name)
+            with self.lock:
+                total, count, longest = self.spans.get(name, (0.0, 0, 0.0))
+                self.spans[name] = (total + seconds, count + 1, max(longest, seconds))
+            self.emit('span', name=name, seconds=round(seconds, 6), status=status, **labels)
+
+    def record_request(self, operation, seconds, status, prompt_tokens=None, output_tokens=None, **labels):
+        """Record the latency and token usage of one API request"""
+        self.observe('request_seconds', seconds, operation=operation, status=status)
+        self.inc('requests_total', operation=operation, status=status)
+        if prompt_tokens:
+            self.inc('tokens_total', prompt_tokens, operation=operation, kind='prompt')
+        if output_tokens:
+            self.inc('tokens_total', output_tokens, operation=operation, kind='output')
+        self.emit('request', operation=operation, seconds=round(seconds, 6), status=status,
+                  prompt_tokens=prompt_tokens, output_tokens=output_tokens, **labels)
+
+    def prometheus_text(self):
+        """All counters and histograms in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, (h.buckets, list(h.counts), h.sum, h.count)) for key, h in histograms]
+
+        typed = set()
+        for (name, key), value in counters:
+            metric = f"{PREFIX}_{name}" if name.endswith('_total') else f"{PREFIX}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(key)} {value}")
+        for (name, key), (buckets, counts, total, count) in histograms:
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append(f"{metric}_bucket{_format_labels(key, [('le', str(bound))])} {bucket_count}")
+            lines.append(f"{metric}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{metric}_sum{_format_labels(key)} {total}")
+            lines.append(f"{metric}_count{_format_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path=None):
+        """Write the Prometheus text to a file atomically, e.g. for the node_exporter textfile collector"""
+        path = path or self.prometheus_path
+        if not path:
+            return
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+    def serve(self, port):
+        """Serve the Prometheus text at http://<host>:<port>/metrics from a background thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('', port), Handler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Serving metrics on port {port}")
+
+    def profile_report(self):
+        """Per-run timing breakdown of spans, rate limiter waits and API requests"""
+        wall = time.time() - self.started
+        with self.lock:
+            spans = sorted(self.spans.items(), key=lambda item: -item[1][0])
+            counters = dict(self.counters)
+            histograms = {key: (h.sum, h.count, h.max) for key, h in self.histograms.items()}
+
+        lines = [f"Run time: {wall:.2f}s", "",
+                 f"{'span':<28} {'count':>7} {'total s':>10} {'mean s':>9} {'max s':>9} {'% of run':>9}"]
+        for name, (total, count, longest) in spans:
+            lines.append(f"{name:<28} {count:>7} {total:>10.2f} {total / count:>9.3f} {longest:>9.3f} "
+                         f"{total / wall:>9.0%}")
+
+        timings = [(name, dict(key), values) for (name, key), values in histograms.items() if name != 'stage_seconds']
+        if timings:
+            lines += ["", f"{'timing':<48} {'count':>7} {'total s':>10} {'mean s':>9} {'max s':>9}"]
+            for name, labels, (total, count, longest) in sorted(timings, key=lambda item: -item[2][0]):
+                label = f"{name}{{{','.join(f'{k}={v}' for k, v in sorted(labels.items()))}}}" if labels else name
+                lines.append(f"{label:<48} {count:>7} {total:>10.2f} {total / max(1, count):>9.3f} {longest:>9.3f}")
+
+        if counters:
+            lines += ["", f"{'counter':<60} {'value':>10}"]
+            for (name, key), value in sorted(counters.items()):
+                label = f"{name}{{{','.join(f'{k}={v}' for k, v in key)}}}" if key else name
+                lines.append(f"{label:<60} {value:>10g}")
+        return '\n'.join(lines)
+
+    def close(self):
+        """Flush the final state: a summary event, the Prometheus file and the HTTP endpoint"""
+        if self.sink is not None:
+            with self.lock:
+                spans = {name: {'total_seconds': total, 'count': count, 'max_seconds': longest}
+                         for name, (total, count, longest) in self.spans.items()}
+                counters = {f"{name}{_format_labels(key)}": value for (name, key), value in self.counters.items()}
+            self.emit('summary', wall_seconds=round(time.time() - self.started, 3), spans=spans, counters=counters)
+            self.sink.close()
+            self.sink = None
+        self.write_prometheus()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+# Shared registry used by every module in the process
+metrics = Metrics()
+
+
+def add_metrics_arguments(parser):
+    """Add the --profile and metrics output options to a command line parser"""
+    group = parser.add_argument_group('metrics')
+    group.add_argument('--profile', action='store_true', help='Print a timing breakdown of the run at the end')
+    group.add_argument('--metrics-file', default=os.getenv('METRICS_FILE'),
+                       help='Append metrics events as JSON lines to this file (default: METRICS_FILE env)')
+    group.add_argument('--prometheus-file', default=os.getenv('METRICS_PROMETHEUS_FILE'),
+                       help='Write Prometheus text metrics to this file at the end (default: METRICS_PROMETHEUS_FILE env)')
+    group.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', '0')) or None,
+                       help='Serve Prometheus metrics over HTTP on this port while running (default: METRICS_PORT env)')
+    return group
+
+
+def start_metrics(args):
+    """Configure metrics outputs from parsed command line arguments"""
+    metrics.configure(args.metrics_file, args.prometheus_file, args.metrics_port)
+
+
+def finish_metrics(args):
+    """Write the metrics outputs and print the profile if requested"""
+    metrics.close()
+    if args.profile:
+        print("\n" + metrics.profile_report())
@@ -0,0 +1,144 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from threading import Lock
+from dotenv import load_dotenv
+from metrics import metrics
+from transcription_backends import get_backend_class
+
+# Load environment variables
+load_dotenv()
+
+
+def _cuda_available():
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+def _release_cuda_memory():
+    if _cuda_available():
+        import torch
+        torch.cuda.empty_cache()
+
+
+def resolve_device(device=None):
+    """Pick the inference device, preferring CUDA (NVIDIA GPU) when available"""
+    if device:
+        return device
+    return "cuda" if _cuda_available() else "cpu"
+
+
+def resolve_precision(device, precision=None, backend=None):
+    """Use the requested precision, WHISPER_PRECISION env, or the backend default for the device"""
+    precision = precision or os.getenv('WHISPER_PRECISION')
+    if precision:
+        return precision
+    return get_backend_class(backend).default_precision(device)
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded transcription models
+
+    Models are keyed by (backend, model name, device, precision) and loaded once.
+    When more than max_models are held, the least recently used one is released.
+    Loading happens outside the registry lock: callers asking for a model that is
+    being loaded wait for that load, while other models stay available.
+    """
+
+    def __init__(self, max_models=None):
+        if max_models is None:
+            max_models = int(os.getenv('WHISPER_MODEL_CACHE_SIZE', '2'))
+        self.max_models = max(1, max_models)
+        self.models = OrderedDict()
+        self.model_locks = {}
+        self.loading = {}
+        self.lock = Lock()
+
+    def _key(self, model_name, device, precision, backend):
+        backend = get_backend_class(backend).name
+        device = resolve_device(device)
+        return (backend, model_name, device, resolve_precision(device, precision, backend))
+
+    def get(self, model_name, device=None, precision=None, backend=None):
+        """Return a loaded backend, loading it on first use"""
+        key = self._key(model_name, device, precision, backend)
+        backend, model_name, device, precision = key
+
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                metrics.inc('model_cache_hits')
+                return self.models[key]
+            # The first caller loads the model; concurrent callers for the same key wait for its result
+            loading = self.loading.get(key)
+            if loading is None:
+                self.loading[key] = Future()
+        if loading is not None:
+            metrics.inc('model_cache_hits')
+            return loading.result()
+
+        print(f"Loading {backend} model '{model_name}' using {device.upper()} device ({precision})...")
+        metrics.inc('model_cache_misses')
+        try:
+            with metrics.span('model_load', backend=backend, model=model_name, device=device, precision=precision):
+                model = get_backend_class(backend)(model_name, device, precision)
+        except BaseException as e:
+            with self.lock:
+                loading = self.loading.pop(key)
+            loading.set_exception(e)
+            raise
+
+        with self.lock:
+            loading = self.loading.pop(key)
+            self.models[key] = model
+            self.model_locks[key] = Lock()
+
+            while len(self.models) > self.max_models:
+                evicted_key, _ = self.models.popitem(last=False)
+                self.model_locks.pop(evicted_key, None)
+                print(f"Releasing {evicted_key[0]} model '{evicted_key[1]}' ({evicted_key[2]}, {evicted_key[3]})")
+                if evicted_key[2] == "cuda":
+                    _release_cuda_memory()
+        loading.set_result(model)
+        return model
+
+    @contextmanager
+    def use(self, model_name, device=None, precision=None, backend=None):
+        """
+        Borrow a model for exclusive use
+
+        Whisper installs decoding hooks on the model for each transcription, so
+        threads sharing one model must not run it at the same time.
+        """
+        model = self.get(model_name, device, precision, backend)
+        key = self._key(model_name, device, precision, backend)
+        with self.lock:
+            model_lock = self.model_locks.setdefault(key, Lock())
+        with model_lock:
+            yield model
+
+    def clear(self):
+        """Release all cached models"""
+        with self.lock:
+            self.models.clear()
+            self.model_locks.clear()
+            _release_cuda_memory()
+
+
+# Shared registry used by every transcription entry point in the process
+registry = ModelRegistry()
+
+
+def get_model(model_name, device=None, precision=None, backend=None):
+    """Get a transcription backend from the process-wide registry"""
+    return registry.get(model_name, device, precision, backend)
+
+
+def use_model(model_name, device=None, precision=None, backend=None):
+    """Borrow a transcription backend from the process-wide registry for exclusive use"""
+    return registry.use(model_name, device, precision, backend)
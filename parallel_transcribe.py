@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from metrics import metrics
+from vad import SAMPLE_RATE, split_on_silence
+
+# Each worker process holds its own model
+_worker_model = None
+
+
+def _init_worker(model_name, precision, threads, backend):
+    global _worker_model
+    from model_registry import get_model
+
+    # Split the cores between workers instead of letting every worker use all of them
+    os.environ['TRANSCRIBE_THREADS'] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = get_model(model_name, "cpu", precision, backend)
+
+
+def _detect_language(samples):
+    return _worker_model.detect_language(samples)
+
+
+def _transcribe_segment(index, offset, samples, language):
+    result = _worker_model.transcribe(samples, language=language, verbose=None)
+    segments = []
+    for segment in result["segments"]:
+        segments.append({
+            "start": segment["start"] + offset,
+            "end": segment["end"] + offset,
+            "text": segment["text"],
+        })
+    return index, segments
+
+
+def transcribe_parallel(audio, model_name, workers=None, precision=None, language=None,
+                        max_segment_seconds=None, backend=None):
+    """
+    Transcribe audio on the CPU by splitting it at silences across a process pool
+
+    Speech regions are detected with an energy-based detector and grouped into
+    segments that are transcribed independently, one model per worker process.
+    Segment timestamps are shifted back to the position in the original audio.
+
+    Args:
+        audio (numpy.ndarray): 16 kHz mono float32 samples
+        model_name (str): Whisper model name
+        workers (int): Number of worker processes (default: TRANSCRIBE_WORKERS env or CPU count)
+        precision (str): Model precision passed to the model registry (default: backend default for CPU)
+        language (str): Spoken language; detected once on the first segment when not given
+        max_segment_seconds (float): Longest segment sent to a worker (default: VAD_MAX_SEGMENT env or 120)
+        backend (str): Transcription backend name (default: WHISPER_BACKEND env or whisper)
+
+    Returns:
+        dict: Whisper-style result with "text", "segments" and "language"
+    """
+    if workers is None:
+        workers = int(os.getenv('TRANSCRIBE_WORKERS', '0')) or os.cpu_count() or 1
+    if max_segment_seconds is None:
+        max_segment_seconds = float(os.getenv('VAD_MAX_SEGMENT', '120'))
+
+    with metrics.span('vad'):
+        segments = split_on_silence(audio, SAMPLE_RATE, max_segment_seconds)
+    if not segments:
+        return {"text": "", "segments": [], "language": language}
+    workers = max(1, min(workers, len(segments)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    speech_seconds = sum(end - start for start, end in segments) / SAMPLE_RATE
+    print(f"Split audio into {len(segments)} speech segments ({speech_seconds:.0f}s of speech), "
+          f"transcribing with {workers} workers x {threads} threads...")
+
+    # Spawned workers avoid inheriting inference thread pools from the parent
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(model_name, precision, threads, backend)) as executor:
+        if language is None:
+            first_start, first_end = segments[0]
+            language = executor.submit(_detect_language, audio[first_start:first_end]).result()
+            print(f"Detected language: {language}")
+
+        futures = [
+            executor.submit(_transcribe_segment, index, start / SAMPLE_RATE, audio[start:end], language)
+            for index, (start, end) in enumerate(segments)
+        ]
+        results = {}
+        for future in futures:
+            index, transcribed = future.result()
+            results[index] = transcribed
+            print(f"Transcribed segment {len(results)}/{len(segments)}")
+
+    ordered = [segment for index in range(len(segments)) for segment in results[index]]
+    return {
+        "text": "".join(segment["text"] for segment in ordered),
+        "segments": ordered,
+        "language": language,
+    }
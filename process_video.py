@@ -1,34 +1,292 @@
 import argparse
+import glob
 import os
-from extract_audio import extract_audio
-from transcribe_audio import transcribe_audio
-from translate_subtitles import translate_srt
+from extract_audio import extract_audio, load_audio_pcm, SAMPLE_RATE
+from translate_subtitles import (translate_srt, create_rate_limiter, parse_languages, get_translation_prompt,
+                                 gemini_model_name, setup_gemini, StreamingTranslator)
+from translation_cache import TranslationCheckpoint, prompt_hash
+from transcription_backends import get_backend_class
+from model_registry import resolve_device, resolve_precision
+from artifact_cache import get_artifact_cache, stage_key
+from batch_pipeline import Stage, StagePipeline
+from metrics import metrics, add_metrics_arguments, start_metrics, finish_metrics
 
-def process_video(input_video, output_audio=None, target_lang="en"):
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.avi', '.webm', '.m4v', '.flv', '.wmv')
+STAGES = ('extract', 'transcribe', 'translate')
+
+def lookup_artifact(cache, stage, key):
+    """Return the stored path of a stage output and count the cache hit or miss"""
+    path = cache.get(key)
+    metrics.inc('artifact_cache_hits' if path else 'artifact_cache_misses', stage=stage)
+    return path
+
+def transcript_key(job):
+    """Artifact key of the transcript: the input content plus every setting that changes the transcript"""
+    device = resolve_device()
+    backend = get_backend_class(job.get('backend')).name
+    mode = job.get('mode', 'full')
+    # Only whole-file transcription splits the audio across worker processes
+    workers = int(os.getenv('TRANSCRIBE_WORKERS', '1')) if mode == 'full' and device == 'cpu' else 1
+    return stage_key('transcript', job['input_hash'],
+                     model=job.get('model') or os.getenv('WHISPER_MODEL', 'small'),
+                     backend=backend,
+                     precision=resolve_precision(device, job.get('precision'), backend),
+                     language=job.get('language'),
+                     mode=mode,
+                     workers=max(1, workers),
+                     output_format=job.get('output_format') or os.getenv('OUTPUT_FORMAT', 'txt'))
+
+def extract_stage(job):
+    """
+    Decode audio for a job, saving an encoded copy only when output_audio is set
+
+    Decoding is skipped when job['decode'] is False, i.e. when the transcribe stage does not run,
+    and encoding when job['encode'] is False, i.e. when the extract stage does not run. Windowed
+    jobs (job['mode'] == 'windowed') are decoded by the transcribe stage as it reads the file.
+    """
+    input_video = job['input']
+    output_audio = job.get('output_audio')
+    cache = job.get('cache')
+    with metrics.span('extract_stage', file=os.path.basename(input_video)):
+        if cache:
+            job['input_hash'] = cache.file_hash(input_video)
+
+        if output_audio and job.get('encode', True):
+            audio_key = None
+            if cache:
+                audio_key = stage_key('audio', job['input_hash'], codec=os.getenv('AUDIO_CODEC', 'libmp3lame'),
+                                      extension=os.path.splitext(output_audio)[1])
+            if audio_key and lookup_artifact(cache, 'audio', audio_key):
+                cache.fetch(audio_key, output_audio)
+                print(f"Reusing cached audio: {output_audio}")
+            else:
+                if not extract_audio(input_video, output_audio):
+                    raise RuntimeError(f"Audio extraction failed: {input_video}")
+                if audio_key:
+                    cache.put(audio_key, output_audio, os.path.splitext(output_audio)[1])
+        job['output_base'] = os.path.splitext(output_audio or input_video)[0]
+        if not job.get('decode', True):
+            return job
+
+        if cache:
+            # A cached transcript makes the decoded audio unnecessary
+            job['transcript_key'] = transcript_key(job)
+            if lookup_artifact(cache, 'transcript', job['transcript_key']):
+                job['cached_transcript'] = True
+                return job
+        if job.get('mode') == 'windowed':
+            return job
+        if cache:
+            # Stored as 16-bit samples, which is what ffmpeg decoded, at half the size of float32
+            pcm_key = stage_key('pcm', job['input_hash'], sample_rate=SAMPLE_RATE)
+            pcm = cache.get_array(pcm_key) if lookup_artifact(cache, 'pcm', pcm_key) else None
+            if pcm is not None:
+                import numpy as np
+                job['audio'] = pcm.astype(np.float32) / 32768.0
+                return job
+
+        job['audio'] = load_audio_pcm(input_video)
+        if job['audio'] is None:
+            raise RuntimeError(f"Audio decoding failed: {input_video}")
+        if cache:
+            import numpy as np
+            cache.put_array(pcm_key, np.round(job['audio'] * 32768.0).astype(np.int16))
+    return job
+
+def transcribe_stage(job):
+    """Transcribe the decoded audio of a job (or the file, window by window) and release the samples afterwards"""
+    cache = job.get('cache')
+    key = job.get('transcript_key')
+    output_format = job.get('output_format') or os.getenv('OUTPUT_FORMAT', 'txt')
+    windowed = job.get('mode') == 'windowed'
+    if cache and key and job.get('cached_transcript'):
+        job['transcript'] = f"{job['output_base']}_transcript.{output_format}"
+        if cache.fetch(key, job['transcript']):
+            print(f"Reusing cached transcript: {job['transcript']}")
+            return job
+        # Evicted since the extract stage looked it up
+        if not windowed:
+            job['audio'] = load_audio_pcm(job['input'])
+            if job['audio'] is None:
+                raise RuntimeError(f"Audio decoding failed: {job['input']}")
+
+    from transcribe_audio import transcribe_audio, transcribe_windowed
+
+    with metrics.span('transcribe_stage', file=os.path.basename(job['input'])):
+        if windowed:
+            job['transcript'] = transcribe_windowed(job['input'], job['output_base'], job.get('model'),
+                                                    output_format, job.get('backend'), job.get('precision'),
+                                                    job.get('language'))
+        else:
+            audio = job.pop('audio')
+            job['transcript'] = transcribe_audio(audio, model_name=job.get('model'), output_format=output_format,
+                                                 output_base=job['output_base'], backend=job.get('backend'),
+                                                 precision=job.get('precision'), language=job.get('language'))
+    if cache and key and job['transcript']:
+        cache.put(key, job['transcript'], os.path.splitext(job['transcript'])[1])
+    return job
+
+def existing_transcript(job):
+    """Transcript left by an earlier run for a job, or the input itself when it is an SRT file"""
+    if job['input'].lower().endswith('.srt'):
+        return job['input']
+    base = os.path.splitext(job.get('output_audio') or job['input'])[0]
+    transcript = f"{base}_transcript.srt"
+    if not os.path.exists(transcript):
+        raise RuntimeError(f"No transcript to translate: {transcript} (run the transcribe stage first)")
+    return transcript
+
+def has_content(path):
+    """Whether an output file has any text; empty outputs are never stored in the artifact cache"""
+    if not os.path.exists(path):
+        return False
+    with open(path, 'r', encoding='utf-8') as f:
+        return bool(f.read().strip())
+
+def translation_keys(cache, transcript, target_langs, model=None):
+    """Artifact keys of the translations of a transcript, one per language"""
+    transcript_hash = cache.file_hash(transcript)
+    return {lang: stage_key('translation', transcript_hash, source_lang="auto", target_lang=lang,
+                            model=gemini_model_name(model), prompt=prompt_hash(get_translation_prompt("auto", lang)))
+            for lang in target_langs}
+
+def target_languages(target_lang):
+    """Target languages that need translation; English needs none"""
+    target_langs = [target_lang] if isinstance(target_lang, str) else target_lang
+    return [lang for lang in target_langs if lang != "en"]
+
+def transcription_mode(stream=False, windowed=False):
+    """How a job is transcribed: 'windowed' (read in windows), 'stream' (decoded, then streamed) or 'full'"""
+    if windowed:
+        return 'windowed'
+    return 'stream' if stream else 'full'
+
+def transcript_format(stages, target_lang):
+    """Transcript format of a run: SRT whenever it is translated, so the translations keep their timings"""
+    if 'translate' in stages and target_languages(target_lang):
+        return 'srt'
+    return os.getenv('OUTPUT_FORMAT', 'txt')
+
+def translate_stage(job, target_lang, rate_limiter=None, model=None):
+    """Translate the transcript of a job into every target language except English"""
+    target_langs = target_languages(target_lang)
+    if not target_langs:
+        return job
+    if 'transcript' not in job:
+        job['transcript'] = existing_transcript(job)
+    base_name = os.path.splitext(job['transcript'])[0]
+    output_files = {lang: f"{base_name}_{lang}.srt" for lang in target_langs}
+
+    # Each language is keyed separately, so adding a language only translates that one
+    cache = job.get('cache')
+    keys = {}
+    translated = {}
+    if cache:
+        keys = translation_keys(cache, job['transcript'], target_langs, model)
+        for lang in target_langs:
+            if lookup_artifact(cache, 'translation', keys[lang]) and cache.fetch(keys[lang], output_files[lang]):
+                print(f"Reusing cached translation: {output_files[lang]}")
+                translated[lang] = output_files[lang]
+    missing = [lang for lang in target_langs if lang not in translated]
+
+    if missing:
+        # All languages share one parse of the transcript and one rate limit budget
+        with metrics.span('translate_stage', file=os.path.basename(job['input'])):
+            translated.update(translate_srt(job['transcript'], f"{base_name}_{{lang}}.srt", "auto", missing,
+                                            rate_limiter=rate_limiter, model=model))
+        for lang in missing:
+            # A checkpoint left behind means some subtitles were kept untranslated
+            if cache and not os.path.exists(TranslationCheckpoint(output_files[lang]).path) \
+                    and has_content(output_files[lang]):
+                cache.put(keys[lang], output_files[lang], '.srt')
+    job['translated'] = {lang: translated[lang] for lang in target_langs}
+    return job
+
+def stream_stage(job, target_lang, rate_limiter=None, model=None):
+    """
+    Transcribe a job and translate its subtitles while the transcription is still running
+
+    Each subtitle goes to a StreamingTranslator as soon as Whisper finalizes it,
+    so translation requests use the API budget during transcription and the
+    translations are ready shortly after the last segment. Jobs whose transcript
+    comes from the artifact cache run the regular stages.
+    """
+    target_langs = target_languages(target_lang)
+    if job.get('cached_transcript') or not target_langs:
+        transcribe_stage(job)
+        return translate_stage(job, target_lang, rate_limiter, model)
+    from transcribe_audio import stream_transcription
+
+    windowed = job.get('mode') == 'windowed'
+    audio = job['input'] if windowed else job.pop('audio')
+    output_format = job.get('output_format') or os.getenv('OUTPUT_FORMAT', 'txt')
+    base_name = f"{job['output_base']}_transcript"
+    translator = StreamingTranslator(f"{base_name}_{{lang}}.srt", "auto", target_langs,
+                                     rate_limiter=rate_limiter, model=model)
+    with metrics.span('stream_stage', file=os.path.basename(job['input'])):
+        try:
+            job['transcript'] = stream_transcription(audio, job['output_base'], job.get('model'), output_format,
+                                                     job.get('backend'), job.get('precision'), translator.add,
+                                                     job.get('language'), windowed)
+        except BaseException:
+            translator.cancel()
+            raise
+        del audio
+        job['translated'] = translator.finish()
+
+    cache = job.get('cache')
+    if cache and job.get('transcript_key'):
+        cache.put(job['transcript_key'], job['transcript'], f".{output_format}")
+        keys = translation_keys(cache, job['transcript'], target_langs, model)
+        for lang, path in job['translated'].items():
+            if not translator.untranslated[lang] and has_content(path):
+                cache.put(keys[lang], path, '.srt')
+    return job
+
+def process_video(input_video, output_audio=None, target_lang="en", use_cache=True, stages=STAGES, stream=False,
+                  language=None, windowed=False):
     """
     Process a video file by extracting audio, transcribing it, and translating the subtitles
 
     Args:
         input_video (str): Path to input video file
-        output_audio (str): Path to output audio file (optional)
-        target_lang (str): Target language for translation (default: en)
+        output_audio (str): Path to output audio file (optional, only written when given)
+        target_lang (str | list): Target language(s) for translation (default: en)
+        use_cache (bool): Reuse stage outputs of earlier runs with the same input and settings (default: True)
+        stages (tuple): Stages to run; translate on its own uses the transcript of an earlier run (default: all)
+        stream (bool): Translate subtitles while transcription is still running (default: False)
+        language (str): Spoken language (default: detected)
+        windowed (bool): Read and transcribe the audio in 30-second windows so memory use does not
+            grow with the length of the video (default: False)
     """
-    # Step 1: Extract audio
-    audio_file = extract_audio(input_video, output_audio)
-    if not audio_file:
+    # Step 1: Extract audio. Whisper gets decoded PCM from an ffmpeg pipe;
+    # an encoded audio file is only produced when explicitly requested.
+    stream = stream and 'transcribe' in stages and 'translate' in stages
+    job = {'input': input_video, 'output_audio': output_audio,
+           'cache': get_artifact_cache() if use_cache else None,
+           'encode': 'extract' in stages, 'decode': 'transcribe' in stages,
+           'output_format': transcript_format(stages, target_lang), 'language': language,
+           'mode': transcription_mode(stream, windowed)}
+    try:
+        if 'extract' in stages or 'transcribe' in stages:
+            extract_stage(job)
+    except RuntimeError as e:
+        print(str(e))
         return
 
     # Step 2: Transcribe audio
     try:
-        transcript_file = transcribe_audio(audio_file)
-        if not transcript_file:
-            return
+        if stream:
+            stream_stage(job, target_lang)
+        elif 'transcribe' in stages:
+            transcribe_stage(job)
+            if not job['transcript']:
+                return
 
         # Step 3: Translate subtitles
-        if target_lang != "en":  # Only translate if target language is not English
-            base_name = os.path.splitext(transcript_file)[0]
-            translated_file = f"{base_name}_{target_lang}.srt"
-            translate_srt(transcript_file, translated_file, "auto", target_lang)
+        if 'translate' in stages and not stream:
+            translate_stage(job, target_lang)
+        if job.get('translated'):
             print(f"Video processing and translation completed successfully!")
         else:
             print(f"Video processing completed successfully!")
@@ -36,14 +294,133 @@ def process_video(input_video, output_audio=None, target_lang="en"):
     except Exception as e:
         print(f"An error occurred during processing: {str(e)}")
 
+def find_input_videos(pattern):
+    """Resolve a directory or glob pattern into a sorted list of video files"""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        paths = [p for p in paths if p.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p))
+
+def process_batch(input_videos, output_dir=None, target_lang="en",
+                  extract_workers=2, transcribe_workers=1, translate_workers=2,
+                  extract_queue=2, transcribe_queue=2, translate_queue=4, use_cache=True, stages=STAGES,
+                  stream=False, language=None, windowed=False):
+    """
+    Process many videos with extraction, transcription and translation overlapped
+
+    While one file is being transcribed, the next is being extracted and the
+    previous one is being translated. Queue depths bound how many decoded files
+    wait in memory in front of each stage.
+
+    Args:
+        input_videos (list): Paths to input video files
+        output_dir (str): Directory for extracted audio files (optional, audio is only saved when given)
+        target_lang (str | list): Target language(s) for translation (default: en)
+        extract_workers, transcribe_workers, translate_workers (int): Worker threads per stage
+        extract_queue, transcribe_queue, translate_queue (int): Queue depth in front of each stage
+        use_cache (bool): Reuse stage outputs of earlier runs with the same input and settings (default: True)
+        stages (tuple): Stages to run (default: all)
+        stream (bool): Translate each file while it is transcribed; the transcribe workers then
+            also translate and the translate stage is left out (default: False)
+        language (str): Spoken language of every file (default: detected per file)
+        windowed (bool): Transcribe each file in 30-second windows as it is read, so files are
+            not decoded into memory by the extract workers (default: False)
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    cache = get_artifact_cache() if use_cache else None
+    stream = stream and 'transcribe' in stages and 'translate' in stages
+    jobs = []
+    for input_video in input_videos:
+        output_audio = None
+        if output_dir:
+            name = os.path.splitext(os.path.basename(input_video))[0]
+            output_audio = os.path.join(output_dir, f"{name}.mp3")
+        jobs.append({'input': input_video, 'output_audio': output_audio, 'cache': cache,
+                     'encode': 'extract' in stages, 'decode': 'transcribe' in stages, 'output_format': transcript_format(stages, target_lang),
+                     'language': language, 'mode': transcription_mode(stream, windowed)})
+
+    # All translation workers share one rate limit budget and one Gemini model (or key pool)
+    rate_limiter = create_rate_limiter()
+    model = setup_gemini() if 'translate' in stages and target_languages(target_lang) else None
+    pipeline_stages = []
+    if 'extract' in stages or 'transcribe' in stages:
+        pipeline_stages.append(Stage("extract", extract_stage, extract_workers, extract_queue))
+    if stream:
+        pipeline_stages.append(Stage("transcribe", lambda job: stream_stage(job, target_lang, rate_limiter, model),
+                                     transcribe_workers, transcribe_queue))
+    elif 'transcribe' in stages:
+        pipeline_stages.append(Stage("transcribe", transcribe_stage, transcribe_workers, transcribe_queue))
+    if 'translate' in stages and not stream:
+        pipeline_stages.append(Stage("translate", lambda job: translate_stage(job, target_lang, rate_limiter, model),
+                                     translate_workers, translate_queue))
+    pipeline = StagePipeline(pipeline_stages)
+    print(f"Processing {len(jobs)} files...")
+    results = pipeline.run(jobs)
+    pipeline.print_summary()
+    return results
+
 def main():
     parser = argparse.ArgumentParser(description='Extract audio from video, transcribe it, and translate subtitles')
-    parser.add_argument('--input', help='Input video file path', required=True)
-    parser.add_argument('--output', help='Output audio file path', required=True)
-    parser.add_argument('--target-lang', default='ru', help='Target language for translation (default: en)')
+    parser.add_argument('--input', help='Input video file path, or a directory / glob pattern for batch mode', required=True)
+    parser.add_argument('--output', help='Output audio file path (optional, audio is only saved when given). In batch mode: output directory for audio files')
+    parser.add_argument('--target-lang', default=['ru'], nargs='+',
+                        help='Target language(s) for translation, space or comma separated (default: ru)')
+    parser.add_argument('--stages', default=list(STAGES), nargs='+',
+                        help='Stages to run, space or comma separated: extract, transcribe, translate (default: all). '
+                             'translate alone uses <name>_transcript.srt from an earlier run, or an SRT --input')
+    parser.add_argument('--stream', action='store_true',
+                        default=os.getenv('STREAM_TRANSLATION', '0').lower() in ('1', 'true', 'yes', 'on'),
+                        help='Translate subtitles while transcription is still running (default: STREAM_TRANSLATION env)')
+    parser.add_argument('--language', help='Spoken language of the videos, e.g. en (default: detected)')
+    parser.add_argument('--windowed', action='store_true',
+                        default=os.getenv('TRANSCRIBE_WINDOWED', '0').lower() in ('1', 'true', 'yes', 'on'),
+                        help='Read and transcribe audio in 30-second windows so memory use stays flat on long videos '
+                             '(default: TRANSCRIBE_WINDOWED env)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Recompute every stage instead of reusing cached outputs of earlier runs')
+
+    batch = parser.add_argument_group('batch mode')
+    batch.add_argument('--extract-workers', type=int, default=2, help='Audio extraction threads (default: 2)')
+    batch.add_argument('--transcribe-workers', type=int, default=1,
+                       help='Transcription threads; they share one loaded model (default: 1)')
+    batch.add_argument('--translate-workers', type=int, default=2, help='Files translated at the same time (default: 2)')
+    batch.add_argument('--extract-queue', type=int, default=2, help='Files waiting for extraction (default: 2)')
+    batch.add_argument('--transcribe-queue', type=int, default=2,
+                       help='Decoded files waiting for transcription (default: 2)')
+    batch.add_argument('--translate-queue', type=int, default=4, help='Transcripts waiting for translation (default: 4)')
+
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
-    process_video(args.input, args.output, args.target_lang)
+    args.target_lang = parse_languages(args.target_lang)
+    stages = [stage.strip() for value in args.stages for stage in value.split(',') if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)} (choose from: {', '.join(STAGES)})")
+    if stages == ['extract'] and not args.output:
+        parser.error("--stages extract on its own needs --output for the audio file")
+    batch_mode = os.path.isdir(args.input) or glob.has_magic(args.input)
+    input_videos = find_input_videos(args.input) if batch_mode else [args.input]
+    if not input_videos:
+        parser.error(f"No video files found for: {args.input}")
+
+    start_metrics(args)
+    try:
+        if batch_mode:
+            process_batch(input_videos, args.output, args.target_lang,
+                          args.extract_workers, args.transcribe_workers, args.translate_workers,
+                          args.extract_queue, args.transcribe_queue, args.translate_queue,
+                          use_cache=not args.no_cache, stages=stages, stream=args.stream, language=args.language,
+                          windowed=args.windowed)
+        else:
+            process_video(args.input, args.output, args.target_lang, use_cache=not args.no_cache, stages=stages,
+                          stream=args.stream, language=args.language, windowed=args.windowed)
+    finally:
+        finish_metrics(args)
 
 if __name__ == "__main__":
     main()
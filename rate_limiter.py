@@ -0,0 +1,240 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from threading import Condition, Lock
+from metrics import metrics
+
+
+def is_quota_error(error):
+    """Check whether an API error means the quota or rate limit was exceeded (HTTP 429)"""
+    if getattr(error, 'code', None) == 429:
+        return True
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'rate limit' in message
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """Exponential backoff with full jitter for the given zero-based retry attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute
+
+    Callers reserve tokens up front and are told how long to wait before using
+    them, so the lock is only held for the bookkeeping and never while sleeping.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        """Take tokens and return the delay in seconds before they may be used"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def available(self):
+        """Tokens that could be taken right now without waiting (negative while in debt)"""
+        with self.lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+    def adjust(self, amount):
+        """Give tokens back (positive amount) or take extra ones (negative amount)"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on in-flight requests that adapts to quota errors
+
+    The limit is cut multiplicatively when the API reports quota or 429 errors and
+    grows back additively (about one slot per limit-many successes), like TCP
+    congestion control. Slots can be acquired from threads and coroutines.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=None, decrease_factor=0.5, cooldown=5.0):
+        self.maximum = maximum or initial
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(max(self.minimum, min(initial, self.maximum)))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = Condition()
+        self.async_waiters = deque()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def _wake_waiters(self):
+        # Called with the condition held
+        self.condition.notify_all()
+        while self.async_waiters:
+            loop, future = self.async_waiters.popleft()
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.current_limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.in_flight < self.current_limit:
+                    self.in_flight += 1
+                    return
+                future = loop.create_future()
+                self.async_waiters.append((loop, future))
+            await future
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    def on_success(self):
+        with self.condition:
+            if self.limit < self.maximum:
+                previous = self.current_limit
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                if self.current_limit > previous:
+                    self._wake_waiters()
+
+    def on_quota_error(self):
+        with self.condition:
+            now = time.monotonic()
+            # Requests already in flight fail together; count them as one signal
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            metrics.inc('concurrency_decreases')
+            print(f"Quota error or timeout received, reducing parallel requests to {self.current_limit}")
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """
+    Shared request budget for the Gemini API
+
+    Combines a requests-per-minute bucket, an optional tokens-per-minute bucket and
+    an adaptive in-flight request limit. One instance can be shared by threads and
+    asyncio tasks across many files.
+
+    Args:
+        max_requests_per_minute (int): Requests allowed per minute
+        max_tokens_per_minute (int): Tokens (input + output) allowed per minute (optional)
+        max_concurrency (int): Upper bound for in-flight requests (optional, unlimited when not set)
+    """
+
+    def __init__(self, max_requests_per_minute, max_tokens_per_minute=None, max_concurrency=None):
+        self.max_requests = max_requests_per_minute
+        self.requests = TokenBucket(max_requests_per_minute)
+        self.tokens = TokenBucket(max_tokens_per_minute) if max_tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency) if max_concurrency else None
+
+    def _reserve(self, tokens):
+        delay = self.requests.reserve(1)
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def wait_if_needed(self, tokens=0):
+        """Block the calling thread until a request using the given tokens may be sent"""
+        delay = self._reserve(tokens)
+        metrics.observe('rate_limiter_wait_seconds', delay, kind='budget')
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_if_needed_async(self, tokens=0):
+        """Wait without blocking the event loop until a request may be sent"""
+        delay = self._reserve(tokens)
+        metrics.observe('rate_limiter_wait_seconds', delay, kind='budget')
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # The request will not be sent; give its budget to the next caller
+                self._refund(tokens)
+                raise
+
+    def _refund(self, tokens):
+        self.requests.adjust(1)
+        if self.tokens and tokens:
+            self.tokens.adjust(tokens)
+
+    def record_tokens(self, estimated, actual):
+        """Correct the token budget once the real usage of a request is known"""
+        if self.tokens and actual is not None:
+            self.tokens.adjust(estimated - actual)
+
+    def on_success(self):
+        if self.concurrency:
+            self.concurrency.on_success()
+
+    def on_error(self, error):
+        if is_quota_error(error):
+            metrics.inc('quota_errors')
+        elif isinstance(error, TimeoutError):
+            # Requests that time out usually mean the API is overloaded; back off as for quota errors
+            metrics.inc('request_timeouts')
+        else:
+            return
+        if self.concurrency:
+            self.concurrency.on_quota_error()
+
+    @contextmanager
+    def request(self, tokens=0):
+        """Hold an in-flight slot and the rate budget for one request (threads)"""
+        if self.concurrency:
+            start = time.monotonic()
+            self.concurrency.acquire()
+            metrics.observe('rate_limiter_wait_seconds', time.monotonic() - start, kind='concurrency')
+        try:
+            self.wait_if_needed(tokens)
+            yield
+        finally:
+            if self.concurrency:
+                self.concurrency.release()
+
+    @asynccontextmanager
+    async def request_async(self, tokens=0):
+        """Hold an in-flight slot and the rate budget for one request (asyncio)"""
+        if self.concurrency:
+            start = time.monotonic()
+            await self.concurrency.acquire_async()
+            metrics.observe('rate_limiter_wait_seconds', time.monotonic() - start, kind='concurrency')
+        try:
+            await self.wait_if_needed_async(tokens)
+            yield
+        finally:
+            if self.concurrency:
+                self.concurrency.release()
@@ -0,0 +1,505 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from threading import Event, Lock, Semaphore, Thread
+from dotenv import load_dotenv
+from process_video import STAGES, extract_stage, transcribe_stage, translate_stage, transcript_format, transcription_mode
+from translate_subtitles import translate_srt, create_rate_limiter, setup_gemini, parse_languages
+from artifact_cache import get_artifact_cache
+from model_registry import get_model
+from metrics import metrics
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'auto-translator', 'jobs.sqlite3')
+JOB_OPTIONS = ('output', 'target_lang', 'source_lang', 'model', 'backend', 'precision', 'no_cache')
+
+
+class JobStore:
+    """
+    Persistent job queue backed by SQLite
+
+    Jobs keep their parameters, status, current stage and result, so a restarted
+    service picks up where it left off: jobs that were running when the process
+    stopped are queued again, and the artifact cache lets them skip the stages
+    they had already finished.
+
+    Args:
+        path (str): SQLite database path (default: SERVICE_DB_PATH env or ~/.cache/auto-translator/jobs.sqlite3)
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SERVICE_DB_PATH') or DEFAULT_DB_PATH
+        self.lock = Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            )
+        ''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)')
+        self.connection.commit()
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def add(self, kind, params):
+        """Queue a new job and return it"""
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO jobs (id, kind, params, status, created) VALUES (?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(params, ensure_ascii=False), 'queued', time.time())
+            )
+            self.connection.commit()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def list(self, status=None, limit=100):
+        """Most recent jobs first, optionally only those with the given status"""
+        query = 'SELECT * FROM jobs'
+        args = []
+        if status:
+            query += ' WHERE status = ?'
+            args.append(status)
+        query += ' ORDER BY created DESC LIMIT ?'
+        args.append(limit)
+        with self.lock:
+            rows = self.connection.execute(query, args).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def claim_next(self):
+        """Mark the oldest queued job as running and return it, or None when the queue is empty"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?",
+                                    (time.time(), row['id']))
+            self.connection.commit()
+        return self._to_dict(row)
+
+    def update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], ensure_ascii=False)
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.connection.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+            self.connection.commit()
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet; returns False when it is already running or done"""
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self.connection.commit()
+        return cursor.rowcount > 0
+
+    def requeue_interrupted(self):
+        """Queue jobs again that were running when the service stopped"""
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0 WHERE status = 'running'"
+            )
+            self.connection.commit()
+        return cursor.rowcount
+
+
+class JobService:
+    """
+    Runs queued jobs in one long-lived process with warm models and clients
+
+    Each stage takes a slot of the resource it uses before it runs: ffmpeg
+    decoding, CPU/GPU transcription and Gemini requests have separate limits,
+    so a long transcription does not hold back translations of other jobs.
+    Whisper models stay loaded in the model registry, and one Gemini client
+    and rate limiter are shared by every job.
+
+    Args:
+        store (JobStore): Persistent job queue
+        extract_slots (int): Files decoded at the same time (default: SERVICE_EXTRACT_SLOTS env or 2)
+        transcribe_slots (int): Files transcribed at the same time (default: SERVICE_TRANSCRIBE_SLOTS env or 1)
+        translate_slots (int): Files translated at the same time (default: SERVICE_TRANSLATE_SLOTS env or 2)
+        max_active (int): Jobs in progress at once, including those waiting for a slot
+            (default: SERVICE_MAX_ACTIVE env or the sum of all slots)
+        model: Gemini model shared by all jobs (default: created from the environment on first use)
+        windowed (bool): Transcribe files in 30-second windows as they are read instead of decoding
+            them into memory first (default: TRANSCRIBE_WINDOWED env)
+    """
+
+    def __init__(self, store, extract_slots=None, transcribe_slots=None, translate_slots=None,
+                 max_active=None, model=None, windowed=None):
+        self.store = store
+        limits = {
+            'extract': extract_slots or int(os.getenv('SERVICE_EXTRACT_SLOTS', '2')),
+            'transcribe': transcribe_slots or int(os.getenv('SERVICE_TRANSCRIBE_SLOTS', '1')),
+            'translate': translate_slots or int(os.getenv('SERVICE_TRANSLATE_SLOTS', '2')),
+        }
+        self.slots = {resource: Semaphore(max(1, limit)) for resource, limit in limits.items()}
+        self.max_active = max_active or int(os.getenv('SERVICE_MAX_ACTIVE', '0')) or sum(limits.values())
+        self.active = Semaphore(self.max_active)
+        self.model = model
+        if windowed is None:
+            windowed = os.getenv('TRANSCRIBE_WINDOWED', '0').lower() in ('1', 'true', 'yes', 'on')
+        self.windowed = windowed
+        self.model_lock = Lock()
+        self.rate_limiter = create_rate_limiter()
+        self.wakeup = Event()
+        self.stopping = Event()
+        self.dispatcher = None
+
+    def gemini_model(self):
+        """The shared Gemini model, created on first use"""
+        with self.model_lock:
+            if self.model is None:
+                self.model = setup_gemini()
+            return self.model
+
+    def preload(self, model_name=None):
+        """Load the default Whisper model before the first job arrives"""
+        get_model(model_name or os.getenv('WHISPER_MODEL', 'small'))
+
+    def submit(self, params):
+        """
+        Validate job parameters and queue the job
+
+        Args:
+            params (dict): input (video or .srt path, required) and optionally output, target_lang,
+                source_lang, model, backend, precision and no_cache
+
+        Returns:
+            dict: The queued job
+        """
+        unknown = set(params) - set(JOB_OPTIONS) - {'input'}
+        if unknown:
+            raise ValueError(f"Unknown job options: {', '.join(sorted(unknown))}")
+        input_path = params.get('input')
+        if not input_path:
+            raise ValueError("input is required")
+        input_path = os.path.abspath(input_path)
+        if not os.path.isfile(input_path):
+            raise ValueError(f"Input file not found: {input_path}")
+
+        target_lang = params.get('target_lang') or ['ru']
+        params = {**params, 'input': input_path,
+                  'target_lang': parse_languages([target_lang] if isinstance(target_lang, str) else target_lang)}
+        if params.get('output'):
+            params['output'] = os.path.abspath(params['output'])
+        kind = 'srt' if input_path.lower().endswith('.srt') else 'video'
+        job = self.store.add(kind, params)
+        metrics.inc('service_jobs_submitted', kind=kind)
+        self.wakeup.set()
+        return job
+
+    def start(self):
+        """Queue interrupted jobs again and start dispatching"""
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"Resuming {requeued} interrupted jobs")
+        self.dispatcher = Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def stop(self, timeout=5):
+        """Stop dispatching new jobs; running jobs are resumed on the next start"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.dispatcher:
+            self.dispatcher.join(timeout)
+
+    def _dispatch(self):
+        while not self.stopping.is_set():
+            # Wait for a free job slot in steps, so stop() is noticed while every slot is busy
+            if not self.active.acquire(timeout=1):
+                continue
+            if self.stopping.is_set():
+                self.active.release()
+                break
+            job = self.store.claim_next()
+            if job is None:
+                self.active.release()
+                # Poll now and then as well, in case jobs are added to the database from outside
+                self.wakeup.wait(5)
+                self.wakeup.clear()
+                continue
+            Thread(target=self._run, args=(job,), name=f"job-{job['id']}", daemon=True).start()
+
+    def _run_stage(self, job_id, resource, progress, func, *args):
+        self.store.update(job_id, stage=f"waiting for {resource}")
+        with self.slots[resource]:
+            self.store.update(job_id, stage=resource)
+            with metrics.span(f'service_{resource}'):
+                result = func(*args)
+        self.store.update(job_id, progress=progress)
+        return result
+
+    def _run(self, job):
+        job_id = job['id']
+        params = job['params']
+        print(f"Job {job_id} started: {params['input']}")
+        try:
+            use_cache = not params.get('no_cache')
+            if job['kind'] == 'srt':
+                output = params.get('output') or f"{os.path.splitext(params['input'])[0]}_{{lang}}.srt"
+                translated = self._run_stage(job_id, 'translate', 1.0, lambda: translate_srt(
+                    params['input'], output, params.get('source_lang') or 'auto', params['target_lang'],
+                    rate_limiter=self.rate_limiter, model=self.gemini_model(), use_cache=use_cache))
+                result = {'translated': translated}
+            else:
+                state = {'input': params['input'], 'output_audio': params.get('output'),
+                         'model': params.get('model'), 'backend': params.get('backend'),
+                         'precision': params.get('precision'),
+                         'output_format': transcript_format(STAGES, params['target_lang']),
+                         'language': params.get('source_lang'),
+                         'mode': transcription_mode(windowed=self.windowed),
+                         'cache': get_artifact_cache() if use_cache else None}
+                self._run_stage(job_id, 'extract', 0.2, extract_stage, state)
+                self._run_stage(job_id, 'transcribe', 0.7, transcribe_stage, state)
+                targets = [lang for lang in params['target_lang'] if lang != 'en']
+                model = self.gemini_model() if targets else None
+                self._run_stage(job_id, 'translate', 1.0, translate_stage, state, targets, self.rate_limiter, model)
+                result = {'transcript': state['transcript'], 'translated': state.get('translated', {})}
+                if state.get('output_audio'):
+                    result['audio'] = state['output_audio']
+            self.store.update(job_id, status='done', stage=None, progress=1.0, result=result, finished=time.time())
+            metrics.inc('service_jobs_finished', kind=job['kind'], status='done')
+            print(f"Job {job_id} done")
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e), finished=time.time())
+            metrics.inc('service_jobs_finished', kind=job['kind'], status='failed')
+            print(f"Job {job_id} failed: {str(e)}")
+        finally:
+            self.active.release()
+            self.wakeup.set()
+
+
+def make_handler(service):
+    """HTTP request handler class for the job API of a service"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _job_id(self):
+            parts = [unquote(part) for part in urlsplit(self.path).path.strip('/').split('/')]
+            return parts[1] if len(parts) == 2 and parts[0] == 'jobs' and parts[1] else None
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            path = url.path
+            if path == '/metrics':
+                data = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif path.rstrip('/') == '/jobs':
+                status = parse_qs(url.query).get('status', [None])[0]
+                self._send(200, {'jobs': service.store.list(status)})
+            elif self._job_id():
+                job = service.store.get(self._job_id())
+                if job:
+                    self._send(200, job)
+                else:
+                    self._send(404, {'error': 'job not found'})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if urlsplit(self.path).path.rstrip('/') != '/jobs':
+                self._send(404, {'error': 'not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                params = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(params, dict):
+                    raise ValueError("job parameters must be a JSON object")
+                self._send(201, service.submit(params))
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+
+        def do_DELETE(self):
+            job_id = self._job_id()
+            job = service.store.get(job_id) if job_id else None
+            if job is None:
+                self._send(404, {'error': 'job not found'})
+            elif service.store.cancel(job_id):
+                self._send(200, service.store.get(job_id))
+            else:
+                self._send(409, {'error': f"job is {job['status']} and can no longer be cancelled"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(service, host='127.0.0.1', port=8765, socket_path=None):
+    """Serve the job API over TCP, or over a Unix socket when socket_path is given, until interrupted"""
+    handler = make_handler(service)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+        print(f"Job service listening on unix socket {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        print(f"Job service listening on http://{host}:{port}")
+    service.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping; running jobs will be resumed on the next start")
+    finally:
+        service.stop()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method, path, body=None, url=None, socket_path=None):
+    """Send one request to a running service and return (status, decoded JSON body)"""
+    if socket_path:
+        connection = UnixHTTPConnection(socket_path)
+    else:
+        url = (url or os.getenv('SERVICE_URL', 'http://127.0.0.1:8765')).split('://')[-1].rstrip('/')
+        connection = http.client.HTTPConnection(url, timeout=30)
+    try:
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data else {}
+        connection.request(method, path, body=data, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'null')
+    finally:
+        connection.close()
+
+
+def print_job(job):
+    stage = f" ({job['stage']}, {job['progress']:.0%})" if job['status'] == 'running' else ''
+    print(f"{job['id']}  {job['status']}{stage}  {job['params']['input']}")
+    if job.get('error'):
+        print(f"  error: {job['error']}")
+    if job.get('result'):
+        print(f"  result: {json.dumps(job['result'], ensure_ascii=False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the processing pipeline as a job queue service, or talk to one')
+    parser.add_argument('--url', help='Service address for client commands (default: SERVICE_URL env or http://127.0.0.1:8765)')
+    parser.add_argument('--socket', default=os.getenv('SERVICE_SOCKET'),
+                        help='Unix socket path to serve on or connect to instead of TCP (default: SERVICE_SOCKET env)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='Start the service')
+    serve_parser.add_argument('--host', default=os.getenv('SERVICE_HOST', '127.0.0.1'), help='Listen address (default: 127.0.0.1)')
+    serve_parser.add_argument('--port', type=int, default=int(os.getenv('SERVICE_PORT', '8765')), help='Listen port (default: 8765)')
+    serve_parser.add_argument('--db', help='Job database path (default: SERVICE_DB_PATH env or ~/.cache/auto-translator/jobs.sqlite3)')
+    serve_parser.add_argument('--extract-slots', type=int, help='Files decoded at the same time (default: 2)')
+    serve_parser.add_argument('--transcribe-slots', type=int, help='Files transcribed at the same time (default: 1)')
+    serve_parser.add_argument('--translate-slots', type=int, help='Files translated at the same time (default: 2)')
+    serve_parser.add_argument('--preload', action='store_true', help='Load the Whisper model before accepting jobs')
+    serve_parser.add_argument('--windowed', action='store_true', default=None,
+                              help='Transcribe videos in 30-second windows as they are read (default: TRANSCRIBE_WINDOWED env)')
+
+    submit_parser = commands.add_parser('submit', help='Queue a video or SRT file')
+    submit_parser.add_argument('input', help='Video file, or SRT file to translate only')
+    submit_parser.add_argument('--output', help='Audio output path for videos, or translation output path for SRT files')
+    submit_parser.add_argument('--target-lang', default=['ru'], nargs='+', help='Target language(s) (default: ru)')
+    submit_parser.add_argument('--source-lang', help='Source language of SRT files, or spoken language of videos (default: auto)')
+    submit_parser.add_argument('--model', help='Whisper model (default: the service WHISPER_MODEL)')
+    submit_parser.add_argument('--backend', help='Transcription backend (default: the service WHISPER_BACKEND)')
+    submit_parser.add_argument('--precision', help='Model precision (default: the service WHISPER_PRECISION)')
+    submit_parser.add_argument('--no-cache', action='store_true', help='Recompute every stage')
+
+    status_parser = commands.add_parser('status', help='Show one job, or the most recent jobs')
+    status_parser.add_argument('job_id', nargs='?', help='Job id (default: list recent jobs)')
+    cancel_parser = commands.add_parser('cancel', help='Cancel a queued job')
+    cancel_parser.add_argument('job_id')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        service = JobService(JobStore(args.db), args.extract_slots, args.transcribe_slots, args.translate_slots,
+                             windowed=args.windowed)
+        if args.preload:
+            service.preload()
+        serve(service, args.host, args.port, args.socket)
+        return
+
+    if args.command == 'submit':
+        params = {name: getattr(args, name) for name in JOB_OPTIONS if getattr(args, name, None)}
+        # Paths are resolved by the service, which may run in another directory
+        params['input'] = os.path.abspath(args.input)
+        if args.output:
+            params['output'] = os.path.abspath(args.output)
+        status, body = request('POST', '/jobs', params, args.url, args.socket)
+    elif args.command == 'status':
+        status, body = request('GET', f"/jobs/{quote(args.job_id, safe='')}" if args.job_id else '/jobs', None, args.url, args.socket)
+    else:
+        status, body = request('DELETE', f"/jobs/{quote(args.job_id, safe='')}", None, args.url, args.socket)
+
+    if status >= 400:
+        print(f"Error: {body.get('error', status)}")
+        raise SystemExit(1)
+    for job in body['jobs'] if 'jobs' in body else [body]:
+        print_job(job)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import re
+
+TIMING_PATTERN = re.compile(
+    r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+
+
+class Cue:
+    """A single subtitle: its number, start/end time in milliseconds and text"""
+
+    __slots__ = ('index', 'start', 'end', 'text')
+
+    def __init__(self, index, start, end, text):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def __repr__(self):
+        return f"Cue({self.index}, {format_timestamp(self.start)} --> {format_timestamp(self.end)}, {self.text!r})"
+
+    def with_text(self, text):
+        """Return a copy of the cue with the same timing and different text"""
+        return Cue(self.index, self.start, self.end, text)
+
+
+def _to_ms(hours, minutes, seconds, millis):
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis.ljust(3, '0'))
+
+
+def seconds_to_ms(seconds):
+    """Convert a time in seconds (float) to whole milliseconds"""
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(ms):
+    """Format milliseconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    seconds, millis = divmod(int(ms), 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def parse_srt(content):
+    """
+    Parse SRT content into a list of cues
+
+    Blocks without a timing line are skipped. Cue numbers are taken from the file
+    when present, otherwise cues are numbered by position.
+    """
+    cues = []
+    for block in re.split(r'\n\s*\n', content.replace('\r\n', '\n').strip()):
+        lines = block.split('\n')
+        for i, line in enumerate(lines):
+            match = TIMING_PATTERN.search(line)
+            if match:
+                break
+        else:
+            continue
+        number = lines[i - 1].strip() if i > 0 else ''
+        index = int(number) if number.isdigit() else len(cues) + 1
+        start = _to_ms(*match.groups()[:4])
+        end = _to_ms(*match.groups()[4:])
+        cues.append(Cue(index, start, end, '\n'.join(lines[i + 1:]).strip()))
+    return cues
+
+
+def read_srt(path):
+    """Read and parse an SRT file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_srt(f.read())
+
+
+def format_srt(cues):
+    """Format cues as SRT content"""
+    return ''.join(
+        f"{cue.index}\n{format_timestamp(cue.start)} --> {format_timestamp(cue.end)}\n{cue.text}\n\n"
+        for cue in cues
+    )
+
+
+def write_srt(path, cues):
+    """Write cues to an SRT file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(format_srt(cues))
+
+
+def parse_text(content, max_chars=500):
+    """
+    Split plain text (e.g. a .txt transcript) into cues without timings
+
+    Each paragraph becomes one or more cues: long paragraphs are cut after a
+    sentence once max_chars is reached. The cue number is the paragraph number,
+    so format_text can put the paragraphs back together; times are 0.
+    """
+    cues = []
+    paragraphs = re.split(r'\n\s*\n', content.replace('\r\n', '\n').strip())
+    for number, paragraph in enumerate((p.strip() for p in paragraphs if p.strip()), 1):
+        piece = ''
+        for sentence in re.split(r'(?<=[.!?…。！？])\s+', paragraph):
+            if piece and len(piece) + len(sentence) + 1 > max_chars:
+                cues.append(Cue(number, 0, 0, piece))
+                piece = ''
+            piece = f"{piece} {sentence}" if piece else sentence
+        cues.append(Cue(number, 0, 0, piece))
+    return cues
+
+
+def format_text(cues):
+    """Join cues from parse_text back into paragraphs"""
+    paragraphs = {}
+    for cue in cues:
+        paragraphs.setdefault(cue.index, []).append(cue.text)
+    return '\n\n'.join(' '.join(pieces) for pieces in paragraphs.values()) + '\n'
+
@@ -0,0 +1,155 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import artifact_cache
+import process_video
+from artifact_cache import ArtifactCache, content_hash, stage_key
+from gemini_stub import GeminiStub
+from rate_limiter import RateLimiter
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\nHello\n\n2\n00:00:03,000 --> 00:00:04,000\nWorld\n\n"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'artifacts'))
+    yield cache
+    cache.connection.close()
+
+
+@pytest.fixture
+def cpu(monkeypatch):
+    monkeypatch.setattr(process_video, 'resolve_device', lambda device=None: 'cpu')
+    for name in ('WHISPER_MODEL', 'WHISPER_BACKEND', 'WHISPER_PRECISION', 'TRANSCRIBE_WORKERS', 'OUTPUT_FORMAT'):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_stage_key_depends_on_every_parameter():
+    key = stage_key('transcript', 'abc', model='small', language=None)
+    assert key == stage_key('transcript', 'abc', language=None, model='small')
+    assert key != stage_key('transcript', 'abd', model='small', language=None)
+    assert key != stage_key('transcript', 'abc', model='small', language='en')
+    assert key != stage_key('translation', 'abc', model='small', language=None)
+
+
+def test_large_files_are_hashed_from_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache, 'SAMPLED_HASH_THRESHOLD', 1024)
+    monkeypatch.setattr(artifact_cache, 'SAMPLE_SIZE', 16)
+    monkeypatch.setattr(artifact_cache, 'SAMPLE_COUNT', 4)
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(bytes(range(256)) * 16)
+    digest = content_hash(str(path))
+
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    assert content_hash(str(path)) != digest
+    path.write_bytes(bytes(data) + b'x')
+    assert content_hash(str(path)) != digest
+
+
+def test_file_hash_is_remembered_until_the_file_changes(cache, tmp_path, monkeypatch):
+    path = tmp_path / 'input.srt'
+    path.write_text(SRT, encoding='utf-8')
+    digest = cache.file_hash(str(path))
+
+    monkeypatch.setattr(artifact_cache, 'content_hash', lambda path: pytest.fail("hashed again"))
+    assert cache.file_hash(str(path)) == digest
+    monkeypatch.undo()
+    path.write_text(SRT + "3\n00:00:05,000 --> 00:00:06,000\nMore\n", encoding='utf-8')
+    os.utime(path, ns=(0, 10 ** 9))
+    assert cache.file_hash(str(path)) != digest
+
+
+def test_transcript_key_covers_language_mode_and_workers(cpu, monkeypatch):
+    job = {'input_hash': 'abc', 'output_format': 'srt'}
+    key = process_video.transcript_key(job)
+    assert process_video.transcript_key(dict(job)) == key
+    assert process_video.transcript_key(dict(job, language='en')) != key
+    assert process_video.transcript_key(dict(job, mode='stream')) != key
+    assert process_video.transcript_key(dict(job, output_format='txt')) != key
+    assert process_video.transcript_key(dict(job, model='medium')) != key
+    assert process_video.transcript_key(dict(job, precision='int8')) != key
+
+    monkeypatch.setenv('TRANSCRIBE_WORKERS', '4')
+    assert process_video.transcript_key(dict(job)) != key
+    # Streaming transcription does not use the worker processes
+    assert process_video.transcript_key(dict(job, mode='stream')) == \
+        process_video.transcript_key({'input_hash': 'abc', 'output_format': 'srt', 'mode': 'stream'})
+
+
+def test_translation_keys_ignore_the_models_prefix(cache, tmp_path, monkeypatch):
+    monkeypatch.setenv('GEMINI_MODEL', 'gemini-1.5-flash')
+    transcript = tmp_path / 'a_transcript.srt'
+    transcript.write_text(SRT, encoding='utf-8')
+    from_env = process_video.translation_keys(cache, str(transcript), ['de', 'fr'])
+    from_model = process_video.translation_keys(cache, str(transcript), ['de', 'fr'],
+                                                GeminiStub().model('models/gemini-1.5-flash'))
+    assert from_env == from_model
+    assert from_env['de'] != from_env['fr']
+
+
+def test_translations_are_cached_and_reused(cache, tmp_path, monkeypatch):
+    monkeypatch.setenv('TRANSLATION_CACHE', '0')
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    transcript = tmp_path / 'a_transcript.srt'
+    transcript.write_text(SRT, encoding='utf-8')
+    job = {'input': str(tmp_path / 'a.mp4'), 'transcript': str(transcript), 'cache': cache}
+    process_video.translate_stage(job, ['de'], RateLimiter(10000), stub.model())
+    assert stub.calls == 1
+
+    os.remove(job['translated']['de'])
+    process_video.translate_stage(dict(job), ['de'], RateLimiter(10000), stub.model())
+    assert stub.calls == 1
+    assert "~ Hello" in open(job['translated']['de'], encoding='utf-8').read()
+
+
+def test_empty_transcript_is_not_cached_as_translated(cache, tmp_path, monkeypatch):
+    monkeypatch.setenv('TRANSLATION_CACHE', '0')
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    transcript = tmp_path / 'silent_transcript.srt'
+    transcript.write_text("", encoding='utf-8')
+    job = {'input': str(tmp_path / 'silent.mp4'), 'transcript': str(transcript), 'cache': cache}
+    with pytest.raises(ValueError):
+        process_video.translate_stage(job, ['de'], RateLimiter(10000), stub.model())
+
+    keys = process_video.translation_keys(cache, str(transcript), ['de'])
+    assert cache.get(keys['de']) is None
+    assert not process_video.has_content(str(tmp_path / 'silent_transcript_de.srt'))
+
+
+def test_threads_storing_one_key_never_share_a_temporary_file(cache, tmp_path):
+    sources = []
+    for number in range(8):
+        source = tmp_path / f'source{number}.srt'
+        source.write_text(SRT * (number + 1), encoding='utf-8')
+        sources.append(source)
+    threads = [threading.Thread(target=cache.put, args=('ab' * 8, str(source), '.srt')) for source in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stored = open(cache.get('ab' * 8), encoding='utf-8').read()
+    assert stored in [source.read_text(encoding='utf-8') for source in sources]
+    assert not [name for name in os.listdir(os.path.join(cache.root, 'ab')) if name.endswith('.tmp')]
+
+
+def test_artifact_evicted_after_lookup_is_a_miss(cache, tmp_path, monkeypatch):
+    source = tmp_path / 'input.srt'
+    source.write_text(SRT, encoding='utf-8')
+    paths = {'cd' * 8: cache.put('cd' * 8, str(source), '.srt'),
+             'ef' * 8: cache.put_array('ef' * 8, np.zeros(4, dtype=np.int16))}
+    # Another worker evicts the files right after get() found them
+    found = {key: cache.get(key) for key in paths}
+    for path in paths.values():
+        os.remove(path)
+    monkeypatch.setattr(cache, 'get', found.get)
+
+    assert not cache.fetch('cd' * 8, str(tmp_path / 'out.srt'))
+    assert cache.get_array('ef' * 8) is None
+    monkeypatch.undo()
+    assert cache.connection.execute('SELECT COUNT(*) FROM artifacts').fetchone()[0] == 0
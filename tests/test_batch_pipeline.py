@@ -0,0 +1,72 @@
+import threading
+import time
+
+from batch_pipeline import Stage, StagePipeline
+
+
+def step(name):
+    def func(job):
+        job['stages'].append(name)
+        return job
+    return func
+
+
+def run_with_timeout(pipeline, jobs, timeout=10):
+    results = []
+    runner = threading.Thread(target=lambda: results.extend(pipeline.run(jobs)), daemon=True)
+    runner.start()
+    runner.join(timeout)
+    assert not runner.is_alive(), "pipeline did not finish"
+    return results
+
+
+def test_jobs_pass_every_stage_in_order():
+    pipeline = StagePipeline([Stage("extract", step("extract")), Stage("transcribe", step("transcribe")),
+                              Stage("translate", step("translate"))])
+    jobs = [{'input': f"video{number}.mp4", 'stages': []} for number in range(6)]
+
+    results = run_with_timeout(pipeline, jobs)
+
+    assert [job['input'] for job in results] == [job['input'] for job in jobs]
+    assert all(job['stages'] == ["extract", "transcribe", "translate"] for job in results)
+    assert [stage.stats.processed for stage in pipeline.stages] == [6, 6, 6]
+
+
+def test_bounded_queues_hold_back_a_fast_stage():
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def produce(job):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        return job
+
+    def consume(job):
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return job
+
+    pipeline = StagePipeline([Stage("extract", produce), Stage("transcribe", consume, queue_depth=1)])
+    results = run_with_timeout(pipeline, [{'input': number} for number in range(20)])
+
+    assert len(results) == 20
+    # One job being consumed, one waiting in the queue and one held by the blocked producer
+    assert peak[0] <= 3
+
+
+def test_failing_job_is_dropped_without_stalling_the_others():
+    def flaky(job):
+        if job['input'] == 2:
+            raise RuntimeError("decoding failed")
+        return step("transcribe")(job)
+
+    pipeline = StagePipeline([Stage("extract", step("extract"), queue_depth=1),
+                              Stage("transcribe", flaky, workers=2, queue_depth=1),
+                              Stage("translate", step("translate"), queue_depth=1)])
+    results = run_with_timeout(pipeline, [{'input': number, 'stages': []} for number in range(5)])
+
+    assert sorted(job['input'] for job in results) == [0, 1, 3, 4]
+    assert (pipeline.stages[1].stats.processed, pipeline.stages[1].stats.failed) == (4, 1)
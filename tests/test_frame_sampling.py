@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('google.generativeai')  # imported by extract_video_text at startup
+
+from extract_video_text import edge_hash, hamming_distance, sample_scene_frames
+
+FPS = 10
+
+
+def title_card(text, offset=0, noise=0):
+    frame = np.full((360, 640, 3), 30, dtype=np.uint8)
+    cv2.putText(frame, text, (60 + offset, 200), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (255, 255, 255), 4)
+    if noise:
+        jitter = np.random.default_rng(offset).integers(-noise, noise + 1, frame.shape)
+        frame = np.clip(frame.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    return frame
+
+
+def edges(frame):
+    gray = cv2.cvtColor(cv2.resize(frame, (320, 180), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return cv2.Canny(gray, 100, 200) > 0
+
+
+def write_video(path, frames):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), FPS, (640, 360))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+
+def test_edge_hash_tells_text_changes_from_noise():
+    intro = edge_hash(edges(title_card("INTRO")))
+    assert hamming_distance(intro, edge_hash(edges(title_card("INTRO", noise=3)))) <= 6
+    assert hamming_distance(intro, edge_hash(edges(title_card("CHAPTER 2")))) > 6
+
+
+def test_near_duplicate_frames_are_skipped_and_scene_changes_kept(tmp_path):
+    video = tmp_path / 'titles.avi'
+    frames = ([title_card("INTRO")] * 20 + [title_card("INTRO", offset=1, noise=3)] * 20
+              + [title_card("CHAPTER 2")] * 20)
+    write_video(video, frames)
+
+    stills = sample_scene_frames(str(video))
+
+    assert len(stills) == 2
+    assert stills[0]['start'] == pytest.approx(0, abs=0.6)
+    assert stills[1]['start'] == pytest.approx(4, abs=0.6)
+    assert stills[0]['end'] == stills[1]['start']
+    assert all(still['image'][:2] == b'\xff\xd8' for still in stills)
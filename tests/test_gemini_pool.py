@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+import gemini_pool
+from gemini_pool import GeminiPool, PoolEntry
+from gemini_stub import GeminiStub, StubError
+from translate_subtitles import create_rate_limiter
+
+
+def entry(name, stub, rpm=60, key=None, priority=0):
+    return PoolEntry(name, stub.model(name), rpm, files=stub, key=key or name.split('/')[0], priority=priority)
+
+
+def test_quota_error_fails_over_to_the_next_entry():
+    exhausted = GeminiStub(latency=0, quota_rpm=1, seed=1)
+    exhausted.admit()
+    healthy = GeminiStub(latency=0, seed=1)
+    pool = GeminiPool([entry("key1/main", exhausted), entry("key2/main", healthy)], cooldown=30)
+    pool.entries[1].requests.adjust(-1)  # key1 has more headroom and is tried first
+
+    response = pool.generate_content("[1]\nHello")
+    assert response.text == "[1]\n~ Hello"
+    assert (exhausted.quota_errors, healthy.calls) == (1, 1)
+    assert pool.stats()[0]['cooling_down_seconds'] > 0
+    assert asyncio.run(pool.generate_content_async("[1]\nHi")).text == "[1]\n~ Hi"
+    assert exhausted.calls == 2
+
+
+def test_cooldown_doubles_on_repeated_quota_errors(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(gemini_pool.time, 'monotonic', lambda: now[0])
+    pool = GeminiPool([entry("key1/main", GeminiStub(latency=0))], cooldown=10)
+    error = StubError(429, "Resource has been exhausted")
+
+    pool._on_error(pool.entries[0], error)
+    assert pool.entries[0].cooldown_until == 110.0
+    pool._on_error(pool.entries[0], error)  # Same burst of failures
+    assert pool.entries[0].strikes == 1
+    now[0] = 111.0
+    pool._on_error(pool.entries[0], error)
+    assert pool.entries[0].cooldown_until == 131.0
+    assert not pool._on_error(pool.entries[0], StubError(500, "An internal error has occurred."))
+
+
+def test_main_model_is_preferred_over_fallbacks():
+    main, fallback = GeminiStub(latency=0), GeminiStub(latency=0)
+    pool = GeminiPool([entry("key1/fallback", fallback, rpm=600, priority=1), entry("key1/main", main, rpm=60)])
+    for _ in range(3):
+        pool.generate_content("[1]\nHello")
+    assert (main.calls, fallback.calls) == (3, 0)
+
+
+def test_uploaded_files_are_used_with_their_key(tmp_path):
+    first, second = GeminiStub(latency=0, processing_time=0), GeminiStub(latency=0, processing_time=0)
+    pool = GeminiPool([entry("key1/main", first), entry("key2/main", second)])
+    pool.entries[1].requests.adjust(-30)  # Uploads go to the key with the most headroom
+
+    chunk = tmp_path / 'chunk.mp4'
+    chunk.write_bytes(b'video')
+    file = pool.upload_file(str(chunk))
+    assert file.entry_key == "key1"
+    assert pool.get_file(file.name).state.name == "ACTIVE"
+    pool.entries[0].requests.adjust(-50)
+    for _ in range(2):
+        pool.generate_content([file, "Describe the text"])
+    assert (first.calls, second.calls) == (2, 0)
+
+
+def test_error_reaches_the_caller_when_every_entry_failed():
+    stubs = [GeminiStub(latency=0, quota_rpm=1) for _ in range(2)]
+    for stub in stubs:
+        stub.admit()
+    pool = GeminiPool([entry(f"key{number}/main", stub) for number, stub in enumerate(stubs, 1)])
+    with pytest.raises(StubError):
+        pool.generate_content("[1]\nHello")
+    assert [stub.calls for stub in stubs] == [2, 2]
+
+
+def test_rate_limiter_covers_every_key_of_the_pool(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEYS', 'one,two,three')
+    monkeypatch.setenv('GEMINI_FALLBACK_MODELS', '')
+    monkeypatch.setenv('MAX_REQUESTS_PER_MINUTE', '10')
+    monkeypatch.setenv('PARALLEL_REQUESTS', '4')
+    monkeypatch.delenv('MAX_TOKENS_PER_MINUTE', raising=False)
+    limiter = create_rate_limiter()
+    assert limiter.max_requests == 30
+    assert limiter.concurrency.current_limit == 12
+
+
+def test_key_model_creates_an_async_client_per_event_loop():
+    pytest.importorskip('google.generativeai')
+    model = gemini_pool.KeyModel("test-key", "gemini-1.5-flash")
+
+    async def async_model():
+        assert model._async_model() is model._async_model()
+        return model._async_model()
+
+    first = asyncio.run(async_model())
+    second = asyncio.run(async_model())
+    assert first is not second
+    assert len(model.async_models) == 1
+    assert model.model_name == "models/gemini-1.5-flash"
+
+
+def test_deleted_uploads_are_forgotten(tmp_path):
+    stub = GeminiStub(latency=0, processing_time=0)
+    pool = GeminiPool([entry("key1/main", stub)])
+    chunk = tmp_path / 'chunk.mp4'
+    chunk.write_bytes(b'video')
+
+    file = pool.upload_file(str(chunk))
+    pool.get_file(file.name).delete()
+    assert pool.uploads == {}
+    assert stub.files[0].deleted
@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+import transcription_backends
+from model_registry import ModelRegistry
+from transcription_backends import TranscriptionBackend
+
+
+class FakeBackend(TranscriptionBackend):
+    name = "fake"
+    precisions = ("fp32", "int8")
+    loads = []
+
+    def __init__(self, model_name, device, precision):
+        super().__init__(model_name, device, precision)
+        FakeBackend.loads.append((model_name, device, precision))
+
+
+@pytest.fixture(autouse=True)
+def fake_backend(monkeypatch):
+    monkeypatch.setitem(transcription_backends.BACKENDS, "fake", FakeBackend)
+    monkeypatch.delenv('WHISPER_PRECISION', raising=False)
+    FakeBackend.loads = []
+
+
+def test_model_is_loaded_once_per_key():
+    registry = ModelRegistry(max_models=2)
+    first = registry.get("tiny", "cpu", backend="fake")
+    assert registry.get("tiny", "cpu", backend="fake") is first
+    assert registry.get("tiny", "cpu", "int8", backend="fake") is not first
+    assert FakeBackend.loads == [("tiny", "cpu", "fp32"), ("tiny", "cpu", "int8")]
+
+
+def test_least_recently_used_model_is_evicted():
+    registry = ModelRegistry(max_models=2)
+    registry.get("tiny", "cpu", backend="fake")
+    registry.get("base", "cpu", backend="fake")
+    registry.get("tiny", "cpu", backend="fake")
+    registry.get("small", "cpu", backend="fake")
+
+    assert [key[1] for key in registry.models] == ["tiny", "small"]
+    registry.get("base", "cpu", backend="fake")
+    assert FakeBackend.loads.count(("base", "cpu", "fp32")) == 2
+
+
+def test_precision_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv('WHISPER_PRECISION', 'int8')
+    model = ModelRegistry().get("tiny", "cpu", backend="fake")
+    assert model.precision == "int8"
+
+
+def test_unsupported_precision_is_rejected():
+    with pytest.raises(ValueError):
+        ModelRegistry().get("tiny", "cpu", "fp16", backend="fake")
+
+
+def test_concurrent_callers_share_one_load():
+    registry = ModelRegistry()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("tiny", "cpu", backend="fake")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(FakeBackend.loads) == 1
+    assert all(model is results[0] for model in results)
+
+
+def test_use_serializes_borrowers():
+    registry = ModelRegistry()
+    active = []
+    overlaps = []
+
+    def borrow():
+        with registry.use("tiny", "cpu", backend="fake"):
+            active.append(1)
+            overlaps.append(len(active))
+            threading.Event().wait(0.01)
+            active.pop()
+
+    threads = [threading.Thread(target=borrow) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == [1, 1, 1, 1]
+
+
+def test_loading_one_model_does_not_block_others(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    class SlowBackend(FakeBackend):
+        name = "slow"
+
+        def __init__(self, model_name, device, precision):
+            started.set()
+            release.wait(5)
+            super().__init__(model_name, device, precision)
+
+    monkeypatch.setitem(transcription_backends.BACKENDS, "slow", SlowBackend)
+    registry = ModelRegistry()
+    loaded = registry.get("tiny", "cpu", backend="fake")
+    results = []
+    loaders = [threading.Thread(target=lambda: results.append(registry.get("base", "cpu", backend="slow")))
+               for _ in range(2)]
+    for thread in loaders:
+        thread.start()
+    assert started.wait(5)
+
+    assert registry.get("tiny", "cpu", backend="fake") is loaded
+    release.set()
+    for thread in loaders:
+        thread.join()
+    assert results[0] is results[1]
+    assert FakeBackend.loads.count(("base", "cpu", "fp32")) == 1
+
+
+def test_failed_load_is_retried_by_the_next_caller():
+    registry = ModelRegistry()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            registry.get("tiny", "cpu", "fp16", backend="fake")
+    assert registry.loading == {}
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from rate_limiter import AdaptiveConcurrency, RateLimiter, TokenBucket, is_quota_error
+
+
+def test_bucket_starts_full_and_charges_debt():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    # One token per second at 60 per minute
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.available() == pytest.approx(-1.0, abs=0.05)
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    bucket = TokenBucket(60)
+    bucket.reserve(60)
+    now[0] += 10
+    assert bucket.available() == pytest.approx(10.0)
+    now[0] += 1000
+    assert bucket.available() == 60
+
+
+def test_bucket_adjust_is_capped_at_capacity():
+    bucket = TokenBucket(10)
+    bucket.reserve(4)
+    bucket.adjust(100)
+    assert bucket.available() == pytest.approx(10.0)
+    bucket.adjust(-15)
+    assert bucket.available() == pytest.approx(-5.0, abs=0.01)
+
+
+def test_concurrency_halves_on_quota_error_and_grows_back():
+    concurrency = AdaptiveConcurrency(8, cooldown=0.0)
+    concurrency.on_quota_error()
+    assert concurrency.current_limit == 4
+    # About one slot per limit-many successes
+    for _ in range(5):
+        concurrency.on_success()
+    assert concurrency.current_limit == 5
+    for _ in range(100):
+        concurrency.on_success()
+    assert concurrency.current_limit == 8
+
+
+def test_concurrency_counts_simultaneous_errors_once():
+    concurrency = AdaptiveConcurrency(8, cooldown=60.0)
+    concurrency.on_quota_error()
+    concurrency.on_quota_error()
+    assert concurrency.current_limit == 4
+
+
+def test_concurrency_never_goes_below_minimum():
+    concurrency = AdaptiveConcurrency(2, minimum=1, cooldown=0.0)
+    for _ in range(5):
+        concurrency.on_quota_error()
+    assert concurrency.current_limit == 1
+
+
+def test_concurrency_limits_threads():
+    concurrency = AdaptiveConcurrency(2)
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        concurrency.acquire()
+        with lock:
+            peak.append(concurrency.in_flight)
+        time.sleep(0.01)
+        concurrency.release()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+    assert concurrency.in_flight == 0
+
+
+def test_concurrency_limits_coroutines():
+    concurrency = AdaptiveConcurrency(3)
+    peak = []
+
+    async def work():
+        await concurrency.acquire_async()
+        peak.append(concurrency.in_flight)
+        await asyncio.sleep(0.01)
+        concurrency.release()
+
+    async def run():
+        await asyncio.gather(*(work() for _ in range(10)))
+
+    asyncio.run(run())
+    assert max(peak) == 3
+    assert concurrency.in_flight == 0
+
+
+def test_cancelled_wait_refunds_the_budget():
+    limiter = RateLimiter(60, max_tokens_per_minute=1000)
+    limiter.requests.reserve(60)
+
+    async def run():
+        task = asyncio.create_task(limiter.wait_if_needed_async(tokens=200))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    # Only the refill since the reservation remains; the cancelled request is given back
+    assert limiter.requests.available() == pytest.approx(0.0, abs=0.2)
+    assert limiter.tokens.available() == pytest.approx(1000, abs=1)
+
+
+def test_quota_errors_are_recognised():
+    class ResourceExhausted(Exception):
+        pass
+
+    assert is_quota_error(ResourceExhausted("slow down"))
+    assert is_quota_error(Exception("429 Too Many Requests"))
+    assert is_quota_error(Exception("Quota exceeded for metric"))
+    assert not is_quota_error(Exception("500 Internal error"))
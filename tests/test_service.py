@@ -0,0 +1,54 @@
+import http.client
+import json
+import time
+from http.server import ThreadingHTTPServer
+from threading import Thread
+
+import pytest
+
+from service import JobService, JobStore, make_handler
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = JobService(JobStore(str(tmp_path / 'jobs.sqlite3')), max_active=1)
+    yield service
+    service.store.connection.close()
+
+
+@pytest.fixture
+def get(service):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path):
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_status_accepts_encoded_ids_and_query_parameters(service, get):
+    job = service.store.add('srt', {'input': '/tmp/in.srt', 'target_lang': ['de']})
+    encoded = ''.join(f"%{ord(char):02X}" for char in job['id'])
+
+    assert get(f"/jobs/{encoded}")[1]['id'] == job['id']
+    assert get(f"/jobs/{job['id']}?verbose=1&x=%20")[1]['id'] == job['id']
+    assert get('/jobs/unknown')[0] == 404
+    assert [item['id'] for item in get('/jobs?status=queued&limit=5')[1]['jobs']] == [job['id']]
+    assert get('/jobs?status=done')[1]['jobs'] == []
+
+
+def test_stop_does_not_wait_for_a_free_job_slot(service):
+    service.active.acquire()  # The only slot is held by a running job
+    service.start()
+    start = time.monotonic()
+    service.stop()
+    assert not service.dispatcher.is_alive()
+    assert time.monotonic() - start < 3
@@ -0,0 +1,61 @@
+import pytest
+
+import translate_subtitles
+from gemini_stub import GeminiStub
+from rate_limiter import RateLimiter
+from srt_model import Cue, format_srt, format_text, format_timestamp, parse_srt, parse_text, seconds_to_ms
+
+
+def test_parse_reads_numbers_timings_and_text():
+    cues = parse_srt("1\r\n00:00:01,500 --> 00:00:03,000\r\nHello\r\nthere\r\n\r\n"
+                     "7\n01:02:03.4 --> 01:02:05,000\nSecond\n")
+    assert [(cue.index, cue.start, cue.end, cue.text) for cue in cues] == [
+        (1, 1500, 3000, "Hello\nthere"),
+        (7, 3723400, 3725000, "Second"),
+    ]
+
+
+def test_parse_numbers_cues_without_numbers_and_skips_blocks_without_timings():
+    cues = parse_srt("Some header\n\n00:00:01,000 --> 00:00:02,000\nA\n\n00:00:03,000 --> 00:00:04,000\nB\n")
+    assert [(cue.index, cue.text) for cue in cues] == [(1, "A"), (2, "B")]
+
+
+def test_format_round_trips():
+    content = "1\n00:00:01,000 --> 00:00:02,500\nHello\n\n2\n00:59:59,999 --> 01:00:00,000\nTwo\nlines\n\n"
+    assert format_srt(parse_srt(content)) == content
+
+
+def test_timestamps():
+    assert format_timestamp(3723004) == "01:02:03,004"
+    assert seconds_to_ms(1.2345) == 1234
+    assert Cue(1, 0, 1000, "a").with_text("b").text == "b"
+
+
+def test_plain_text_is_split_into_paragraphs_and_sentences():
+    text = "First paragraph. Still first.\n\n" + " ".join(f"Sentence {i}." for i in range(100)) + "\n"
+    cues = parse_text(text, max_chars=200)
+    assert cues[0].text == "First paragraph. Still first."
+    assert len(cues) > 3
+    assert all(len(cue.text) <= 200 for cue in cues)
+    assert {cue.index for cue in cues} == {1, 2}
+    assert format_text(cues) == text
+
+
+def test_plain_text_input_is_translated(tmp_path):
+    stub = GeminiStub(latency=0.0, jitter=0.0, seed=1)
+    input_file = tmp_path / 'talk_transcript.txt'
+    input_file.write_text(" Hello there. How are you?\n\nSecond paragraph.", encoding='utf-8')
+    output_file = tmp_path / 'talk_de.txt'
+    translate_subtitles.translate_srt(str(input_file), str(output_file), "en", "de",
+                                      rate_limiter=RateLimiter(10000), model=stub.model(), use_cache=False)
+    assert stub.calls == 1
+    assert output_file.read_text(encoding='utf-8') == "~ Hello there. How are you?\n\n~ Second paragraph.\n"
+
+
+def test_empty_input_is_an_error(tmp_path):
+    input_file = tmp_path / 'empty.txt'
+    input_file.write_text("\n \n", encoding='utf-8')
+    with pytest.raises(ValueError):
+        translate_subtitles.translate_srt(str(input_file), str(tmp_path / 'out.txt'), "en", "de",
+                                          rate_limiter=RateLimiter(10000), model=GeminiStub().model(),
+                                          use_cache=False)
@@ -0,0 +1,11 @@
+import pytest
+
+from check_startup import ENTRY_POINTS, measure
+
+
+@pytest.mark.parametrize('module', ENTRY_POINTS)
+def test_entry_point_imports_no_heavy_module_at_startup(module):
+    # Import time depends on the machine and is left to check_startup.py; heavy imports do not
+    _, loaded = measure(module, runs=1)
+    unexpected = [name for name in loaded if name not in ENTRY_POINTS[module]]
+    assert not unexpected, f"{module} imports {', '.join(unexpected)} at startup"
@@ -0,0 +1,85 @@
+import pytest
+
+import translate_subtitles
+from gemini_stub import GeminiStub
+from metrics import metrics
+from rate_limiter import RateLimiter
+from srt_model import Cue, format_srt
+from translation_cache import TranslationCache
+
+TEXTS = ["Hello", "How are you?", "Hello", "Fine, thanks", "Hello", "Bye"]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = TranslationCache(str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setattr(translate_subtitles, 'get_translation_cache', lambda: cache)
+    yield cache
+    cache.connection.close()
+
+
+def counter(name):
+    return metrics.counters.get((name, ()), 0)
+
+
+def cues():
+    return [Cue(i, i * 1000, i * 1000 + 500, text) for i, text in enumerate(TEXTS, 1)]
+
+
+def stream(stub, output_file, **kwargs):
+    translator = translate_subtitles.StreamingTranslator(str(output_file), "en", ["de", "fr"],
+                                                         rate_limiter=RateLimiter(10000), model=stub.model(),
+                                                         **kwargs)
+    for cue in cues():
+        translator.add(cue)
+    return translator.finish()
+
+
+def test_stream_matches_translate_srt(tmp_path, cache):
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    (tmp_path / 'in.srt').write_text(format_srt(cues()), encoding='utf-8')
+    translate_subtitles.translate_srt(str(tmp_path / 'in.srt'), str(tmp_path / 'file_{lang}.srt'), "en",
+                                      ["de", "fr"], rate_limiter=RateLimiter(10000), model=stub.model(),
+                                      use_cache=False)
+    outputs = stream(stub, tmp_path / 'stream_{lang}.srt', use_cache=False)
+
+    for lang in ("de", "fr"):
+        assert open(outputs[lang], encoding='utf-8').read() == \
+            (tmp_path / f'file_{lang}.srt').read_text(encoding='utf-8')
+
+
+def test_repeated_lines_are_sent_once_per_chunk(tmp_path):
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    sent = []
+    respond = stub.respond
+    stub.respond = lambda contents: sent.append(contents) or respond(contents)
+    stream(stub, tmp_path / 'out_{lang}.srt', use_cache=False)
+
+    # One chunk, one request per language, each distinct line once
+    assert len(sent) == 2
+    assert all(contents.count("Hello") == 1 for contents in sent)
+
+
+def test_cache_metrics_count_unique_keys_like_translate_srt(tmp_path, cache):
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    misses = counter('translation_cache_misses')
+    stream(stub, tmp_path / 'first_{lang}.srt')
+    # 4 distinct texts in 2 languages
+    assert counter('translation_cache_misses') - misses == 8
+
+    hits = counter('translation_cache_hits')
+    calls = stub.calls
+    stream(stub, tmp_path / 'second_{lang}.srt')
+    assert counter('translation_cache_hits') - hits == 8
+    assert stub.calls == calls
+
+
+def test_chunks_fit_one_request(tmp_path):
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    translator = translate_subtitles.StreamingTranslator(str(tmp_path / 'out.srt'), "en", "de",
+                                                         rate_limiter=RateLimiter(10000), model=stub.model(),
+                                                         use_cache=False, chunk_tokens=20)
+    for i in range(30):
+        translator.add(Cue(i + 1, i * 1000, i * 1000 + 500, f"Line number {i}"))
+    translator.finish()
+    assert stub.calls == translator.sent
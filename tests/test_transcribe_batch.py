@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import transcribe_audio
+import transcription_backends
+from transcription_backends import TranscriptionBackend
+
+
+class BatchBackend(TranscriptionBackend):
+    name = "batch"
+    precisions = ("fp32",)
+    batches = []
+
+    def transcribe_batch(self, audios, language=None, batch_size=16):
+        BatchBackend.batches.append([len(audio) for audio in audios])
+        return [{"text": " Clip.", "language": "en", "segments": [{"start": 0.0, "end": 1.0, "text": " Clip."}]}
+                for _ in audios]
+
+
+@pytest.fixture(autouse=True)
+def batch_backend(monkeypatch):
+    monkeypatch.setitem(transcription_backends.BACKENDS, "batch", BatchBackend)
+    monkeypatch.setattr(transcribe_audio, 'resolve_device', lambda device=None: 'cpu')
+    monkeypatch.delenv('WHISPER_PRECISION', raising=False)
+    BatchBackend.batches = []
+
+
+def test_files_that_fail_to_decode_do_not_fail_the_batch(tmp_path, monkeypatch, capsys):
+    paths = []
+    for name in ('one', 'broken', 'two'):
+        path = tmp_path / f'{name}.wav'
+        path.write_bytes(b'audio')
+        paths.append(str(path))
+    monkeypatch.setattr(transcribe_audio, 'load_audio_pcm',
+                        lambda path: None if 'broken' in path else np.zeros(16000, dtype=np.float32))
+
+    outputs = transcribe_audio.transcribe_batch(paths, 'tiny', 'txt', batch_size=4, backend='batch')
+
+    assert outputs == [str(tmp_path / 'one_transcript.txt'), str(tmp_path / 'two_transcript.txt')]
+    assert BatchBackend.batches == [[16000, 16000]]
+    assert "Transcribed 2/3 files (1 could not be decoded)" in capsys.readouterr().out
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import translate_subtitles
+from gemini_stub import GeminiStub, StubError, StubModel, StubResponse
+from metrics import metrics
+from rate_limiter import RateLimiter
+
+ITEMS = [(1, "One"), (2, "Two"), (3, "Three"), (4, "Four")]
+
+
+class FirstOnlyModel(StubModel):
+    """Answers payloads of more than two subtitles with the first one only"""
+
+    async def generate_content_async(self, contents, request_options=None):
+        response = await super().generate_content_async(contents, request_options)
+        entries = response.text.split("\n[")
+        if len(entries) > 2:
+            return StubResponse(entries[0], 1)
+        return response
+
+
+class FailingModel(StubModel):
+    """Fails the first `failures` requests with a server error"""
+
+    def __init__(self, stub, failures):
+        super().__init__(stub)
+        self.failures = failures
+
+    async def generate_content_async(self, contents, request_options=None):
+        if self.failures:
+            self.failures -= 1
+            self.stub.calls += 1
+            raise StubError(500, "An internal error has occurred.")
+        return await super().generate_content_async(contents, request_options)
+
+
+class TimeoutModel(StubModel):
+    async def generate_content_async(self, contents, request_options=None):
+        await asyncio.sleep(1)
+
+
+@pytest.fixture(autouse=True)
+def no_delay(monkeypatch):
+    delays = []
+    monkeypatch.setattr(translate_subtitles, 'backoff_delay', lambda attempt, base_delay: delays.append(attempt) or 0)
+    return delays
+
+
+def counter(name):
+    return metrics.counters.get((name, ()), 0)
+
+
+def translate(model, items=ITEMS, max_retries=4, rate_limiter=None):
+    return asyncio.run(translate_subtitles.translate_payload_async(
+        model, items, "en", ["de"], rate_limiter or RateLimiter(10000), max_retries=max_retries))
+
+
+def test_missing_subtitles_are_requested_again_in_halves():
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    splits = counter('translation_splits')
+
+    result = translate(FirstOnlyModel(stub))
+
+    assert result == {"de": {number: f"~ {text}" for number, text in ITEMS}}
+    assert counter('translation_splits') == splits + 1
+
+
+def test_server_errors_back_off_and_then_succeed(no_delay):
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+
+    result = translate(FailingModel(stub, failures=1))
+
+    assert result == {"de": {number: f"~ {text}" for number, text in ITEMS}}
+    assert no_delay == [0]
+    assert stub.calls == 2
+
+
+def test_payload_that_never_succeeds_gives_up_after_its_retries(no_delay):
+    stub = GeminiStub(latency=0.0, jitter=0.0)
+    abandoned = counter('translation_abandoned_subtitles')
+
+    result = translate(FailingModel(stub, failures=100), items=ITEMS[:1], max_retries=3)
+
+    assert result == {"de": {}}
+    assert no_delay == [0, 1, 2]
+    assert stub.calls == 4
+    assert counter('translation_abandoned_subtitles') == abandoned + 1
+
+
+def test_timeouts_reduce_the_concurrency_limit():
+    limiter = RateLimiter(10000, max_concurrency=8)
+    with pytest.raises(TimeoutError):
+        asyncio.run(translate_subtitles.request_translation(TimeoutModel(GeminiStub()), "[1]\nOne", "en", "de",
+                                                            limiter, timeout=0.01))
+    assert limiter.concurrency.current_limit == 4
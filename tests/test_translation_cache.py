@@ -0,0 +1,131 @@
+import pytest
+
+import translate_subtitles
+from gemini_stub import GeminiStub
+from rate_limiter import RateLimiter
+from srt_model import read_srt
+from translation_cache import TranslationCache, TranslationCheckpoint, normalize_text
+
+SRT = """1
+00:00:01,000 --> 00:00:02,000
+Hello there
+
+2
+00:00:03,000 --> 00:00:04,000
+How are you?
+
+3
+00:00:05,000 --> 00:00:06,000
+Hello there
+
+4
+00:00:07,000 --> 00:00:08,000
+Goodbye
+"""
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'cache.sqlite3'))
+    yield cache
+    cache.connection.close()
+
+
+@pytest.fixture
+def stub():
+    return GeminiStub(latency=0.0, jitter=0.0, processing_time=0.0, seed=1)
+
+
+def translate(stub, input_file, output_file, **kwargs):
+    return translate_subtitles.translate_srt(str(input_file), str(output_file), "en", "de",
+                                             rate_limiter=RateLimiter(10000, max_concurrency=4),
+                                             model=stub.model(), **kwargs)
+
+
+def test_normalized_texts_share_a_key():
+    assert normalize_text("  Hello   there \n\n  you ") == "Hello there\nyou"
+    key = TranslationCache.make_key("Hello  there", "en", "de", "m", "prompt")
+    assert key == TranslationCache.make_key(" Hello there ", "en", "de", "m", "prompt")
+    assert key != TranslationCache.make_key("Hello there", "en", "fr", "m", "prompt")
+    assert key != TranslationCache.make_key("Hello there", "en", "de", "other", "prompt")
+    assert key != TranslationCache.make_key("Hello there", "en", "de", "m", "changed prompt")
+
+
+def test_cache_counts_hits_and_misses(cache):
+    cache.put_many({"a": "A", "b": "B"})
+    assert cache.get_many(["a", "b", "c", "a"]) == {"a": "A", "b": "B"}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 2)
+
+
+def test_cache_persists_across_instances(cache, tmp_path):
+    cache.put_many({"a": "A"})
+    reopened = TranslationCache(cache.path)
+    assert reopened.get_many(["a"]) == {"a": "A"}
+    reopened.connection.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'small.sqlite3'), max_bytes=200)
+    for number in range(5):
+        cache.put_many({f"key{number}": "x" * 50})
+        # Keep the first entry in use
+        cache.get_many(["key0"])
+    assert cache.stats()['size_bytes'] <= 200
+    assert "key0" in cache.get_many(["key0"])
+    assert "key1" not in cache.get_many(["key1"])
+    cache.connection.close()
+
+
+def test_checkpoint_skips_incomplete_lines(tmp_path):
+    checkpoint = TranslationCheckpoint(str(tmp_path / 'out.srt'))
+    checkpoint.save({"a": "A"})
+    checkpoint.save({"b": "B"})
+    with open(checkpoint.path, 'a', encoding='utf-8') as f:
+        f.write('{"c": "C"')
+    assert checkpoint.load() == {"a": "A", "b": "B"}
+    checkpoint.remove()
+    assert checkpoint.load() == {}
+
+
+def test_repeated_lines_are_sent_once(tmp_path, stub):
+    input_file = tmp_path / 'in.srt'
+    input_file.write_text(SRT, encoding='utf-8')
+    translate(stub, input_file, tmp_path / 'out.srt', use_cache=False)
+
+    texts = [cue.text for cue in read_srt(str(tmp_path / 'out.srt'))]
+    assert texts == ["~ Hello there", "~ How are you?", "~ Hello there", "~ Goodbye"]
+    assert [cue.start for cue in read_srt(str(tmp_path / 'out.srt'))] == [1000, 3000, 5000, 7000]
+    assert stub.prompt_tokens > 0
+
+
+def test_resume_sends_only_missing_texts(tmp_path, stub):
+    input_file = tmp_path / 'in.srt'
+    input_file.write_text(SRT, encoding='utf-8')
+    output_file = tmp_path / 'out.srt'
+    prompt = translate_subtitles.get_translation_prompt("en", "de")
+    key = TranslationCache.make_key("How are you?", "en", "de", "gemini-stub", prompt)
+    TranslationCheckpoint(str(output_file)).save({key: "Wie geht's?"})
+
+    sent = []
+    respond = stub.respond
+    stub.respond = lambda contents: sent.append(contents) or respond(contents)
+    translate(stub, input_file, output_file, use_cache=False)
+
+    assert "How are you?" not in "".join(str(contents) for contents in sent)
+    texts = [cue.text for cue in read_srt(str(output_file))]
+    assert texts == ["~ Hello there", "Wie geht's?", "~ Hello there", "~ Goodbye"]
+    # A complete output no longer needs its checkpoint
+    assert not (tmp_path / 'out.srt.checkpoint.jsonl').exists()
+
+
+def test_second_run_is_served_from_the_cache(tmp_path, stub, cache, monkeypatch):
+    monkeypatch.setattr(translate_subtitles, 'get_translation_cache', lambda: cache)
+    input_file = tmp_path / 'in.srt'
+    input_file.write_text(SRT, encoding='utf-8')
+    translate(stub, input_file, tmp_path / 'first.srt')
+    calls = stub.calls
+
+    translate(stub, input_file, tmp_path / 'second.srt')
+    assert stub.calls == calls
+    assert (tmp_path / 'second.srt').read_text(encoding='utf-8') == (tmp_path / 'first.srt').read_text(encoding='utf-8')
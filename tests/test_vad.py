@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from vad import SAMPLE_RATE, detect_speech_regions, split_on_silence
+
+
+def tone(seconds, amplitude=0.5):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    noise = np.random.default_rng(0).normal(0, 1e-4, int(seconds * SAMPLE_RATE))
+    return noise.astype(np.float32)
+
+
+def seconds(pairs):
+    return [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in pairs]
+
+
+def test_speech_regions_follow_the_tones():
+    audio = np.concatenate([silence(1), tone(2), silence(2), tone(2), silence(1)])
+    regions = seconds(detect_speech_regions(audio, padding_ms=0))
+    assert len(regions) == 2
+    assert regions[0] == pytest.approx((1, 3), abs=0.05)
+    assert regions[1] == pytest.approx((5, 7), abs=0.05)
+
+
+def test_segments_are_cut_in_the_pause():
+    audio = np.concatenate([tone(2), silence(2), tone(2)])
+
+    np.testing.assert_allclose(seconds(split_on_silence(audio, max_segment_seconds=3)), [(0, 2.2), (3.8, 6)],
+                               atol=0.05)
+    # Regions that fit into one segment together stay together
+    np.testing.assert_allclose(seconds(split_on_silence(audio, max_segment_seconds=120)), [(0, 6)], atol=0.05)
+
+
+def test_long_speech_is_cut_at_its_quietest_frame():
+    audio = np.concatenate([tone(3.5), tone(0.1, amplitude=0.05), tone(3)])
+    segments = seconds(split_on_silence(audio, max_segment_seconds=4))
+
+    assert len(segments) == 2
+    assert segments[0][1] == pytest.approx(3.5, abs=0.05)
+    assert all(end - start <= 4 for start, end in segments)
+    assert segments[-1][1] == pytest.approx(6.6, abs=0.01)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import process_video
+import transcribe_audio
+import transcription_backends
+from transcription_backends import TranscriptionBackend
+
+
+class WindowBackend(TranscriptionBackend):
+    """One segment per block, so tests can see which audio reached the model"""
+    name = "windows"
+    precisions = ("fp32",)
+    received = []
+
+    def transcribe_windows(self, blocks, language=None, verbose=None, window_seconds=30):
+        start = 0.0
+        for block in blocks:
+            WindowBackend.received.append(len(block))
+            end = start + len(block) / 16000
+            yield {"start": start, "end": end, "text": f" Block of {len(block)} samples."}
+            start = end
+
+    def transcribe_segments(self, audio, language=None, verbose=None, window_seconds=None):
+        raise AssertionError("decoded audio should not be used in windowed mode")
+
+
+@pytest.fixture(autouse=True)
+def window_backend(monkeypatch):
+    monkeypatch.setitem(transcription_backends.BACKENDS, "windows", WindowBackend)
+    monkeypatch.setattr(process_video, 'resolve_device', lambda device=None: 'cpu')
+    monkeypatch.setattr(transcribe_audio, 'resolve_device', lambda device=None: 'cpu')
+    for name in ('WHISPER_PRECISION', 'OUTPUT_FORMAT'):
+        monkeypatch.delenv(name, raising=False)
+    WindowBackend.received = []
+
+
+def test_windowed_stream_hands_every_cue_over(tmp_path):
+    cues = []
+    output = transcribe_audio.stream_transcription(np.zeros(32000, dtype=np.float32), str(tmp_path / 'talk'),
+                                                   'tiny', 'srt', 'windows', on_cue=cues.append, windowed=True)
+    assert output == str(tmp_path / 'talk_transcript.srt')
+    assert [cue.text for cue in cues] == ["Block of 32000 samples."]
+    assert "00:00:02,000" in open(output, encoding='utf-8').read()
+
+
+def test_process_video_reads_windowed_jobs_from_the_file(tmp_path, monkeypatch):
+    video = tmp_path / 'lecture.mp4'
+    video.write_bytes(b'not decoded')
+    blocks = [np.zeros(16000, dtype=np.float32), np.zeros(8000, dtype=np.float32)]
+    monkeypatch.setattr(transcribe_audio, 'stream_audio_pcm', lambda path: iter(blocks))
+    monkeypatch.setattr(process_video, 'load_audio_pcm', lambda path: pytest.fail("decoded into memory"))
+
+    job = {'input': str(video), 'model': 'tiny', 'backend': 'windows', 'output_format': 'txt',
+           'mode': process_video.transcription_mode(windowed=True)}
+    process_video.extract_stage(job)
+    assert 'audio' not in job
+    process_video.transcribe_stage(job)
+
+    assert WindowBackend.received == [16000, 8000]
+    assert job['transcript'] == str(tmp_path / 'lecture_transcript.txt')
+    assert "Block of 8000 samples." in open(job['transcript'], encoding='utf-8').read()
@@ -1,69 +1,271 @@
-import whisper
 import argparse
 import os
-import time
-import torch
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from model_registry import use_model, resolve_device, resolve_precision
+from srt_model import Cue, seconds_to_ms, write_srt, format_srt
+from extract_audio import load_audio_pcm, stream_audio_pcm, SAMPLE_RATE
+from parallel_transcribe import transcribe_parallel
+from transcription_backends import BACKENDS
+from metrics import metrics, add_metrics_arguments, start_metrics, finish_metrics
 
 # Load environment variables
 load_dotenv()
 
-def transcribe_audio(audio_path, model_name=None, output_format=None):
+def write_transcript(result, output_file, output_format):
+    """Save a Whisper-style result as plain text or SRT"""
+    if output_format == "txt":
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(result["text"])
+    elif output_format == "srt":
+        cues = [
+            Cue(i, seconds_to_ms(segment["start"]), seconds_to_ms(segment["end"]), segment["text"].strip())
+            for i, segment in enumerate(result["segments"], 1)
+        ]
+        write_srt(output_file, cues)
+
+class TranscriptWriter:
+    """Append segments to a txt or srt transcript as they arrive instead of writing it at the end"""
+
+    def __init__(self, output_file, output_format):
+        self.output_file = output_file
+        self.output_format = output_format
+        self.count = 0
+        self.end = 0.0
+        self.file = open(output_file, "w", encoding="utf-8")
+
+    def write(self, segment):
+        """Write one segment and return it as a subtitle cue"""
+        self.count += 1
+        self.end = segment["end"]
+        cue = Cue(self.count, seconds_to_ms(segment["start"]), seconds_to_ms(segment["end"]), segment["text"].strip())
+        if self.output_format == "srt":
+            self.file.write(format_srt([cue]))
+        else:
+            self.file.write(segment["text"])
+        self.file.flush()
+        return cue
+
+    def close(self):
+        self.file.close()
+
+def _write_segments(transcribe, output_base, model_name, output_format, backend, precision, on_cue=None,
+                    mode='stream'):
+    """
+    Borrow a model, run transcribe(model) and append every segment it yields to the transcript
+
+    Shared by the streaming and windowed paths: the transcript grows while the model
+    runs and each finished subtitle is handed to on_cue right away.
+    """
+    model_name = model_name or os.getenv('WHISPER_MODEL', 'small')
+    output_format = output_format or os.getenv('OUTPUT_FORMAT', 'txt')
+    device = resolve_device()
+    precision = resolve_precision(device, precision, backend)
+
+    output_file = f"{output_base}_transcript.{output_format}"
+    writer = TranscriptWriter(output_file, output_format)
+    try:
+        with use_model(model_name, device, precision, backend) as model:
+            print(f"Transcribing audio with {mode} output...")
+            with metrics.span('transcribe', mode=mode, model=model_name):
+                for segment in transcribe(model):
+                    cue = writer.write(segment)
+                    if on_cue:
+                        on_cue(cue)
+    finally:
+        writer.close()
+    metrics.inc('audio_seconds_transcribed', writer.end)
+
+    print(f"Transcription saved to: {output_file}")
+    return output_file
+
+def stream_transcription(audio, output_base, model_name=None, output_format=None, backend=None,
+                         precision=None, on_cue=None, language=None, windowed=False):
+    """
+    Transcribe audio, writing every segment to the transcript as soon as it is decoded
+
+    Unlike transcribe_audio, the transcript grows while Whisper runs and each
+    subtitle is handed to on_cue right away, e.g. to start translating it.
+    Audio is transcribed by a single model (TRANSCRIBE_WORKERS is not used).
+
+    Args:
+        audio (str | numpy.ndarray): Path to audio file, or 16 kHz mono float32 samples
+        output_base (str): Base path for the transcript file
+        model_name (str): Optional model name to override env setting
+        output_format (str): Optional output format to override env setting
+        backend (str): Transcription backend (default: WHISPER_BACKEND env or whisper)
+        precision (str): Model precision (default: WHISPER_PRECISION env or the backend default)
+        on_cue (callable): Called with each finished subtitle as a Cue
+        language (str): Spoken language (default: detected on the first window)
+        windowed (bool): Read a file from the ffmpeg pipe and decode it window by window as
+            in transcribe_windowed, instead of decoding it into memory first (default: False)
+
+    Returns:
+        str: Path of the transcript file
+    """
+    if windowed:
+        blocks = stream_audio_pcm(audio) if isinstance(audio, str) else [audio]
+        return _write_segments(lambda model: model.transcribe_windows(blocks, language=language, verbose=True),
+                               output_base, model_name, output_format, backend, precision, on_cue, 'windowed')
+    if isinstance(audio, str):
+        audio = load_audio_pcm(audio)
+    return _write_segments(lambda model: model.transcribe_segments(audio, language=language, verbose=True),
+                           output_base, model_name, output_format, backend, precision, on_cue, 'stream')
+
+def transcribe_windowed(audio, output_base=None, model_name=None, output_format=None, backend=None,
+                        precision=None, language=None):
+    """
+    Transcribe a long recording with memory use that does not grow with its length
+
+    The audio is read from the ffmpeg pipe in blocks and decoded in 30-second
+    windows as it arrives (see TranscriptionBackend.transcribe_windows), and
+    every segment is appended to the transcript as soon as it is final. Neither
+    the decoded audio nor the list of segments is ever held in memory as a whole.
+
+    Args:
+        audio (str | numpy.ndarray): Path to audio file, or 16 kHz mono float32 samples
+        output_base (str): Base path for the transcript file (required when audio is an array)
+        model_name (str): Optional model name to override env setting
+        output_format (str): Optional output format to override env setting
+        backend (str): Transcription backend (default: WHISPER_BACKEND env or whisper)
+        precision (str): Model precision (default: WHISPER_PRECISION env or the backend default)
+        language (str): Spoken language (default: detected on the first window)
+
+    Returns:
+        str: Path of the transcript file
+    """
+    if isinstance(audio, str):
+        if not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+        output_base = output_base or os.path.splitext(audio)[0]
+    elif output_base is None:
+        raise ValueError("output_base is required when transcribing in-memory audio")
+    return stream_transcription(audio, output_base, model_name, output_format, backend, precision,
+                                language=language, windowed=True)
+
+def transcribe_audio(audio, model_name=None, output_format=None, output_base=None, workers=None,
+                     backend=None, precision=None, language=None):
     """
-    Transcribe audio file using Whisper with automatic device selection
+    Transcribe audio using Whisper with automatic device selection
     
     Args:
-        audio_path (str): Path to audio file
+        audio (str | numpy.ndarray): Path to audio file, or 16 kHz mono float32 samples
         model_name (str): Optional model name to override env setting
         output_format (str): Optional output format to override env setting
+        output_base (str): Base path for the transcript file (required when audio is an array)
+        workers (int): CPU worker processes; more than 1 splits the audio at silences and
+            transcribes the segments in parallel (default: TRANSCRIBE_WORKERS env or 1)
+        backend (str): Transcription backend, whisper or faster-whisper (default: WHISPER_BACKEND env or whisper)
+        precision (str): Model precision, e.g. fp32, fp16 or int8 (default: WHISPER_PRECISION env or
+            the backend default for the device)
+        language (str): Spoken language (default: detected)
     """
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    if isinstance(audio, str):
+        if not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+        output_base = output_base or os.path.splitext(audio)[0]
+    elif output_base is None:
+        raise ValueError("output_base is required when transcribing in-memory audio")
     
     # Get model name and output format from environment variables or parameters
     model_name = model_name or os.getenv('WHISPER_MODEL', 'small')
     output_format = output_format or os.getenv('OUTPUT_FORMAT', 'txt')
+    if workers is None:
+        workers = int(os.getenv('TRANSCRIBE_WORKERS', '1'))
     
-    # Check if CUDA (NVIDIA GPU) is available
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"Loading Whisper model '{model_name}' using {device.upper()} device...")
+    # Check if CUDA (NVIDIA GPU) is available; the model is loaded once per process
+    device = resolve_device()
+    precision = resolve_precision(device, precision, backend)
+    if workers > 1 and device == "cpu":
+        # Each worker process loads its own model; the parent never needs one
+        if isinstance(audio, str):
+            audio = load_audio_pcm(audio)
+        with metrics.span('transcribe', mode='parallel', workers=workers):
+            result = transcribe_parallel(audio, model_name, workers, precision, language, backend=backend)
+    else:
+        with use_model(model_name, device, precision, backend) as model:
+            print("Transcribing audio... This may take a while.")
+            with metrics.span('transcribe', mode='single', model=model_name):
+                result = model.transcribe(audio, language=language, verbose=True)
+    if result["segments"]:
+        metrics.inc('audio_seconds_transcribed', result["segments"][-1]["end"])
     
-    model = whisper.load_model(model_name)
-    if device == "cuda":
-        model = model.to(device)
-    
-    print("Transcribing audio... This may take a while.")
-    result = model.transcribe(
-        audio_path,
-        verbose=True,
-        fp16=(device == "cuda")  # Use FP16 only when using GPU
-    )
-    
-    # Create output filename
-    base_name = os.path.splitext(audio_path)[0]
-    output_file = f"{base_name}_transcript.{output_format}"
-    
-    # Save the transcription
-    if output_format == "txt":
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(result["text"])
-    elif output_format == "srt":
-        with open(output_file, "w", encoding="utf-8") as f:
-            for i, segment in enumerate(result["segments"], 1):
-                start = time.strftime('%H:%M:%S,000', time.gmtime(segment["start"]))
-                end = time.strftime('%H:%M:%S,000', time.gmtime(segment["end"]))
-                text = segment["text"].strip()
-                
-                f.write(f"{i}\n")
-                f.write(f"{start} --> {end}\n")
-                f.write(f"{text}\n\n")
+    # Create output filename and save the transcription
+    output_file = f"{output_base}_transcript.{output_format}"
+    write_transcript(result, output_file, output_format)
     
     print(f"Transcription saved to: {output_file}")
     return output_file
 
+def transcribe_batch(audio_paths, model_name=None, output_format=None, batch_size=None, backend=None,
+                     precision=None, language=None):
+    """
+    Transcribe many short audio files with batched decoding
+
+    Files are decoded by ffmpeg in groups while the model works on the previous
+    group, and the 30-second windows of all files in a group are run through the
+    model in batches (see TranscriptionBackend.transcribe_batch). Each file gets
+    its own <name>_transcript.<format> next to it. Files that ffmpeg cannot decode
+    are reported and skipped, so they do not fail the rest of their group.
+
+    Args:
+        audio_paths (list): Paths to audio or video files
+        model_name (str): Optional model name to override env setting
+        output_format (str): Optional output format to override env setting
+        batch_size (int): Windows decoded together (default: TRANSCRIBE_BATCH_SIZE env or 16)
+        backend (str): Transcription backend (default: WHISPER_BACKEND env or whisper)
+        precision (str): Model precision (default: WHISPER_PRECISION env or the backend default)
+        language (str): Spoken language (default: detected)
+
+    Returns:
+        list: Paths of the transcript files of the files that could be decoded
+    """
+    for audio_path in audio_paths:
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    model_name = model_name or os.getenv('WHISPER_MODEL', 'small')
+    output_format = output_format or os.getenv('OUTPUT_FORMAT', 'txt')
+    if batch_size is None:
+        batch_size = int(os.getenv('TRANSCRIBE_BATCH_SIZE', '16'))
+    device = resolve_device()
+    precision = resolve_precision(device, precision, backend)
+
+    # Most clips span one to three windows, so a group fills a few batches
+    group_size = batch_size * 4
+    groups = [audio_paths[i:i + group_size] for i in range(0, len(audio_paths), group_size)]
+    output_files = []
+    failed = []
+    print(f"Transcribing {len(audio_paths)} files in batches of {batch_size} windows...")
+    with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as executor:
+        pending = [executor.submit(load_audio_pcm, path) for path in groups[0]] if groups else []
+        for number, group in enumerate(groups):
+            decoded = []
+            for audio_path, future in zip(group, pending):
+                audio = future.result()
+                if audio is None:
+                    print(f"Could not decode {audio_path}, skipping it")
+                    failed.append(audio_path)
+                else:
+                    decoded.append((audio_path, audio))
+            if number + 1 < len(groups):
+                pending = [executor.submit(load_audio_pcm, path) for path in groups[number + 1]]
+            if decoded:
+                audios = [audio for _, audio in decoded]
+                with use_model(model_name, device, precision, backend) as model:
+                    with metrics.span('transcribe', mode='batch', model=model_name, files=len(decoded)):
+                        results = model.transcribe_batch(audios, language=language, batch_size=batch_size)
+                for (audio_path, audio), result in zip(decoded, results):
+                    metrics.inc('audio_seconds_transcribed', len(audio) / SAMPLE_RATE)
+                    output_file = f"{os.path.splitext(audio_path)[0]}_transcript.{output_format}"
+                    write_transcript(result, output_file, output_format)
+                    output_files.append(output_file)
+            skipped = f" ({len(failed)} could not be decoded)" if failed else ""
+            print(f"Transcribed {len(output_files)}/{len(audio_paths)} files{skipped}")
+    return output_files
+
 def main():
     parser = argparse.ArgumentParser(description='Transcribe audio using Whisper')
-    parser.add_argument('input', help='Input audio file path')
+    parser.add_argument('input', nargs='+', help='Input audio file path(s); the model is loaded once for all files')
     parser.add_argument(
         '--model', 
         choices=['tiny', 'base', 'small', 'medium', 'large', 'turbo'],
@@ -75,8 +277,60 @@ def main():
         help='Output format (txt or srt with timestamps) (default: env setting or txt)'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='CPU worker processes; more than 1 splits audio at silences and transcribes segments in parallel '
+             '(default: env setting or 1)'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=list(BACKENDS),
+        help='Transcription backend (default: env setting or whisper)'
+    )
+    parser.add_argument(
+        '--precision',
+        choices=['fp32', 'fp16', 'int8', 'int8_float16'],
+        help='Model precision; int8 speeds up CPU inference (default: env setting or backend default)'
+    )
+    
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        help='Decode the 30-second windows of many short files together in batches of this size '
+             '(default: env setting; files are transcribed one by one when unset)'
+    )
+    parser.add_argument(
+        '--windowed',
+        action='store_true',
+        default=os.getenv('TRANSCRIBE_WINDOWED', '0').lower() in ('1', 'true', 'yes', 'on'),
+        help='Read and decode long recordings in 30-second windows, writing segments as they are final, '
+             'so memory use stays flat (default: TRANSCRIBE_WINDOWED env)'
+    )
+    parser.add_argument(
+        '--language',
+        help='Spoken language, e.g. en (default: detected)'
+    )
+    
+    add_metrics_arguments(parser)
+    
     args = parser.parse_args()
-    transcribe_audio(args.input, args.model, args.format)
+    batch_size = args.batch_size or int(os.getenv('TRANSCRIBE_BATCH_SIZE', '0'))
+    start_metrics(args)
+    try:
+        if batch_size:
+            transcribe_batch(args.input, args.model, args.format, batch_size,
+                             backend=args.backend, precision=args.precision, language=args.language)
+            return
+        for audio_path in args.input:
+            if args.windowed:
+                transcribe_windowed(audio_path, model_name=args.model, output_format=args.format,
+                                    backend=args.backend, precision=args.precision, language=args.language)
+                continue
+            transcribe_audio(audio_path, args.model, args.format, workers=args.workers,
+                             backend=args.backend, precision=args.precision, language=args.language)
+    finally:
+        finish_metrics(args)
 
 if __name__ == "__main__":
     main()
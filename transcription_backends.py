@@ -0,0 +1,372 @@
+import itertools
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class TranscriptionBackend:
+    """
+    Interface for speech-to-text engines used by transcribe_audio
+
+    A backend loads one model for a (model name, device, precision) combination and
+    returns Whisper-style results: a dict with "text", "segments" (each with
+    "start", "end" and "text" in seconds) and "language".
+    """
+
+    name = None
+    precisions = ()
+
+    def __init__(self, model_name, device, precision):
+        if precision not in self.precisions:
+            raise ValueError(f"Backend '{self.name}' does not support precision '{precision}' "
+                             f"(choose from: {', '.join(self.precisions)})")
+        self.model_name = model_name
+        self.device = device
+        self.precision = precision
+
+    @staticmethod
+    def default_precision(device):
+        return "fp16" if device == "cuda" else "fp32"
+
+    def transcribe(self, audio, language=None, verbose=None):
+        """Transcribe a file path or 16 kHz mono float32 samples"""
+        raise NotImplementedError
+
+    def detect_language(self, audio):
+        """Return the language code spoken in the first 30 seconds of the samples"""
+        raise NotImplementedError
+
+    def transcribe_segments(self, audio, language=None, verbose=None, window_seconds=None):
+        """
+        Yield segments of 16 kHz mono float32 samples as soon as they are transcribed
+
+        The audio is cut at silences into windows of up to window_seconds (default:
+        STREAM_WINDOW_SECONDS env or 60), which are transcribed one after another in
+        the language detected on the first window. Segment times are relative to the
+        start of the audio. Backends that decode incrementally override this.
+        """
+        from vad import SAMPLE_RATE, split_on_silence
+
+        if window_seconds is None:
+            window_seconds = float(os.getenv('STREAM_WINDOW_SECONDS', '60'))
+        for start, end in split_on_silence(audio, SAMPLE_RATE, window_seconds):
+            samples = audio[start:end]
+            if language is None:
+                language = self.detect_language(samples)
+            offset = start / SAMPLE_RATE
+            for segment in self.transcribe(samples, language=language, verbose=verbose)["segments"]:
+                yield {"start": segment["start"] + offset, "end": segment["end"] + offset, "text": segment["text"]}
+
+    def transcribe_windows(self, blocks, language=None, verbose=None, window_seconds=30):
+        """
+        Yield segments of audio that arrives as consecutive blocks of 16 kHz mono float32 samples
+
+        Only about two windows of samples are held at a time, so memory use does not
+        grow with the length of the recording. This default cuts the buffered audio
+        at silences into windows of up to window_seconds and transcribes them without
+        context from earlier windows; backends whose decoder accepts a prompt override
+        it. Segment times are relative to the start of the audio.
+        """
+        import numpy as np
+        from vad import SAMPLE_RATE, split_on_silence
+
+        window = int(window_seconds * SAMPLE_RATE)
+        buffer = np.zeros(0, dtype=np.float32)
+        offset = 0
+        for block in itertools.chain(blocks, [None]):
+            final = block is None
+            if not final:
+                buffer = np.concatenate([buffer, block])
+                if len(buffer) < 2 * window:
+                    continue
+            # Speech reaching the end of the buffer may continue in the next block, so it waits
+            cuts = split_on_silence(buffer, SAMPLE_RATE, window_seconds)
+            pending = not final and cuts and cuts[-1][1] > len(buffer) - SAMPLE_RATE
+            done = cuts[:-1] if pending else cuts
+            for start, end in done:
+                samples = buffer[start:end]
+                if language is None:
+                    language = self.detect_language(samples)
+                shift = (offset + start) / SAMPLE_RATE
+                for segment in self.transcribe(samples, language=language, verbose=verbose)["segments"]:
+                    yield {"start": segment["start"] + shift, "end": segment["end"] + shift, "text": segment["text"]}
+            if final:
+                consumed = len(buffer)
+            elif pending:
+                consumed = cuts[-1][0]
+            else:
+                # Keep the last second, which may hold the start of the next speech
+                consumed = len(buffer) - SAMPLE_RATE
+            buffer = buffer[consumed:]
+            offset += consumed
+
+    def transcribe_batch(self, audios, language=None, batch_size=None):
+        """
+        Transcribe several clips of 16 kHz mono float32 samples
+
+        Returns one Whisper-style result per clip, in order. This default runs the
+        clips one after another; backends that can decode windows of different
+        clips together override it.
+        """
+        return [self.transcribe(audio, language=language) for audio in audios]
+
+
+class WhisperBackend(TranscriptionBackend):
+    """
+    Stock openai-whisper PyTorch model
+
+    Precision "int8" applies dynamic int8 quantization to the linear layers, which
+    hold most of the weights, for faster and smaller CPU inference.
+    """
+
+    name = "whisper"
+    precisions = ("fp32", "fp16", "int8")
+
+    def __init__(self, model_name, device, precision):
+        super().__init__(model_name, device, precision)
+        import torch
+        import whisper
+
+        if precision == "int8" and device != "cpu":
+            raise ValueError("int8 quantization is only available on the CPU")
+        self.model = whisper.load_model(model_name, device=device)
+        if precision == "int8":
+            # Whisper's Linear subclass only adds dtype casting, which is a no-op in FP32;
+            # quantize_dynamic only converts plain nn.Linear modules
+            for module in self.model.modules():
+                if isinstance(module, torch.nn.Linear):
+                    module.__class__ = torch.nn.Linear
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def transcribe(self, audio, language=None, verbose=None):
+        return self.model.transcribe(audio, language=language, verbose=verbose,
+                                     fp16=(self.precision == "fp16"))
+
+    def detect_language(self, audio):
+        import whisper
+
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels)
+        _, probs = self.model.detect_language(mel.to(self.model.device))
+        return max(probs, key=probs.get)
+
+    def transcribe_batch(self, audios, language=None, batch_size=None):
+        """
+        Decode the 30-second windows of many short clips in padded batches
+
+        Every clip is cut at pauses into windows of up to 30 seconds. The log-mel
+        spectrograms of windows from different clips are stacked, so the encoder and
+        the decoder run once per batch instead of once per window. Decoding is greedy
+        without the temperature fallback of model.transcribe, and the language is
+        detected per window when not given; a clip's language is that of its first window.
+
+        Args:
+            audios (list): 16 kHz mono float32 samples, one array per clip
+            language (str): Spoken language (default: detected)
+            batch_size (int): Windows decoded together (default: TRANSCRIBE_BATCH_SIZE env or 16)
+
+        Returns:
+            list: One Whisper-style result per clip
+        """
+        import torch
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+        from vad import SAMPLE_RATE, split_on_silence
+
+        if batch_size is None:
+            batch_size = int(os.getenv('TRANSCRIBE_BATCH_SIZE', '16'))
+        windows = []
+        for index, audio in enumerate(audios):
+            for start, end in split_on_silence(audio, SAMPLE_RATE, whisper.audio.CHUNK_LENGTH):
+                windows.append((index, start / SAMPLE_RATE, audio[start:end]))
+
+        tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages)
+        options = whisper.DecodingOptions(language=language, fp16=(self.precision == "fp16"))
+        results = [{"text": "", "segments": [], "language": language} for _ in audios]
+        for i in range(0, len(windows), batch_size):
+            batch = windows[i:i + batch_size]
+            mel = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), self.model.dims.n_mels)
+                               for _, _, samples in batch]).to(self.model.device)
+            for (index, offset, samples), decoded in zip(batch, self.model.decode(mel, options)):
+                result = results[index]
+                result["language"] = result["language"] or decoded.language
+                duration = len(samples) / SAMPLE_RATE
+                segments, _ = self._timestamped_segments(decoded.tokens, tokenizer, duration)
+                for start, end, text in segments:
+                    result["segments"].append({"start": start + offset, "end": end + offset, "text": text})
+        for result in results:
+            result["text"] = "".join(segment["text"] for segment in result["segments"])
+        return results
+
+    def transcribe_windows(self, blocks, language=None, verbose=None, window_seconds=30):
+        """
+        Yield segments of audio that arrives as consecutive blocks of 16 kHz mono float32 samples
+
+        The audio is decoded in Whisper's 30-second windows while it is read, so only
+        the current window and the rest of the last block are held in memory. As in
+        model.transcribe, the text of earlier windows is passed to the decoder as
+        prompt, a window whose last segment is cut off is continued from where that
+        segment starts, windows are decoded again at higher temperatures when the
+        output repeats itself or has low confidence, and windows without speech are
+        skipped. window_seconds is fixed by the model and ignored.
+        """
+        import numpy as np
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+        from vad import SAMPLE_RATE
+
+        window = whisper.audio.N_SAMPLES
+        tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages)
+        max_context = self.model.dims.n_text_ctx // 2 - 1
+        buffer = np.zeros(0, dtype=np.float32)
+        offset = 0
+        context = []
+        blocks = iter(blocks)
+        final = False
+        while True:
+            while not final and len(buffer) < window:
+                block = next(blocks, None)
+                if block is None:
+                    final = True
+                else:
+                    buffer = np.concatenate([buffer, block])
+            if len(buffer) == 0:
+                break
+            samples = buffer[:window]
+            last_window = final and len(buffer) <= window
+            duration = len(samples) / SAMPLE_RATE
+            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), self.model.dims.n_mels)
+            mel = mel.to(self.model.device)
+            if language is None:
+                _, probs = self.model.detect_language(mel)
+                language = max(probs, key=probs.get)
+
+            decoded, temperature = self._decode_with_fallback(mel, language, context)
+            if decoded.no_speech_prob > 0.6 and decoded.avg_logprob < -1.0:
+                segments, consumed = [], duration
+            else:
+                segments, consumed = self._timestamped_segments(decoded.tokens, tokenizer, duration,
+                                                                final=last_window)
+            shift = offset / SAMPLE_RATE
+            for start, end, text in segments:
+                if verbose:
+                    print(f"[{start + shift:.2f} --> {end + shift:.2f}] {text.strip()}")
+                context.extend(tokenizer.encode(text))
+                yield {"start": start + shift, "end": end + shift, "text": text}
+            # Like model.transcribe, stop conditioning on text that needed a high temperature
+            context = [] if temperature > 0.5 else context[-max_context:]
+
+            consumed = min(max(int(consumed * SAMPLE_RATE), 1), len(buffer))
+            buffer = buffer[consumed:]
+            offset += consumed
+
+    def _decode_with_fallback(self, mel, language, context):
+        import whisper
+
+        for temperature in (0.0, 0.2, 0.4, 0.6, 0.8, 1.0):
+            options = whisper.DecodingOptions(language=language, temperature=temperature, prompt=context or None,
+                                              fp16=(self.precision == "fp16"))
+            decoded = self.model.decode(mel, options)
+            # Same thresholds as model.transcribe; silence is not worth retrying
+            repetitive = decoded.compression_ratio > 2.4
+            unsure = decoded.avg_logprob < -1.0 and decoded.no_speech_prob <= 0.6
+            if not repetitive and not unsure:
+                break
+        return decoded, temperature
+
+    @staticmethod
+    def _timestamped_segments(tokens, tokenizer, duration, final=True):
+        # Text between a pair of timestamp tokens forms a segment. A segment left open at the end of the
+        # window ends with the window in the final one; otherwise it is dropped and the next window starts
+        # where it began. Returns the segments and the seconds of the window that were consumed.
+        time_precision = 0.02
+        segments = []
+        start = None
+        text_tokens = []
+        for token in tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            time = min((token - tokenizer.timestamp_begin) * time_precision, duration)
+            if start is not None and text_tokens:
+                segments.append((start, time, tokenizer.decode(text_tokens)))
+                text_tokens = []
+                start = None
+            else:
+                start = time
+        resume = start if start is not None else (segments[-1][1] if segments else 0.0)
+        consumed = duration
+        if not final and (start is not None or text_tokens) and resume > 0:
+            consumed = resume
+        elif text_tokens:
+            segments.append((resume, duration, tokenizer.decode(text_tokens)))
+        return [segment for segment in segments if segment[2].strip()], consumed
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """
+    CTranslate2 inference runtime via the optional faster-whisper package
+
+    Supports int8 weights on the CPU and int8/FP16 on the GPU.
+    """
+
+    name = "faster-whisper"
+    precisions = ("int8", "int8_float16", "fp16", "fp32")
+
+    # openai-whisper names that differ in faster-whisper
+    MODEL_NAMES = {"large": "large-v3", "turbo": "large-v3-turbo"}
+    COMPUTE_TYPES = {"int8": "int8", "int8_float16": "int8_float16", "fp16": "float16", "fp32": "float32"}
+
+    def __init__(self, model_name, device, precision):
+        super().__init__(model_name, device, precision)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError("The faster-whisper backend requires the faster-whisper package: "
+                              "pip install faster-whisper")
+
+        threads = int(os.getenv('TRANSCRIBE_THREADS', '0'))
+        self.model = WhisperModel(self.MODEL_NAMES.get(model_name, model_name), device=device,
+                                  compute_type=self.COMPUTE_TYPES[precision], cpu_threads=threads)
+
+    @staticmethod
+    def default_precision(device):
+        return "fp16" if device == "cuda" else "int8"
+
+    def transcribe(self, audio, language=None, verbose=None):
+        segments, info = self.model.transcribe(audio, language=language)
+        result_segments = []
+        for segment in segments:
+            result_segments.append({"start": segment.start, "end": segment.end, "text": segment.text})
+            if verbose:
+                print(f"[{segment.start:.2f} --> {segment.end:.2f}] {segment.text.strip()}")
+        return {
+            "text": "".join(segment["text"] for segment in result_segments),
+            "segments": result_segments,
+            "language": info.language,
+        }
+
+    def transcribe_segments(self, audio, language=None, verbose=None, window_seconds=None):
+        # The segment generator decodes lazily, so segments arrive while the rest is still transcribed
+        segments, _ = self.model.transcribe(audio, language=language)
+        for segment in segments:
+            if verbose:
+                print(f"[{segment.start:.2f} --> {segment.end:.2f}] {segment.text.strip()}")
+            yield {"start": segment.start, "end": segment.end, "text": segment.text}
+
+    def detect_language(self, audio):
+        # Language detection runs eagerly; the segment generator is never consumed
+        _, info = self.model.transcribe(audio[:30 * 16000])
+        return info.language
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+
+def get_backend_class(name=None):
+    """Look up a backend class by name (default: WHISPER_BACKEND env or whisper)"""
+    name = name or os.getenv('WHISPER_BACKEND', 'whisper')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend '{name}' (choose from: {', '.join(BACKENDS)})")
+    return BACKENDS[name]
@@ -1,169 +1,772 @@
 import os
 import re
 import argparse
+import time
 from dotenv import load_dotenv
-import google.generativeai as genai
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from threading import Lock, Semaphore
-import time
+from contextlib import nullcontext
+from threading import Condition, Lock, Semaphore, Thread
+from rate_limiter import RateLimiter, backoff_delay
+from gemini_pool import create_gemini_pool, pool_size
+from srt_model import parse_srt, format_srt, write_srt, parse_text, format_text
+from translation_cache import TranslationCache, TranslationCheckpoint, get_translation_cache
+from metrics import metrics, add_metrics_arguments, start_metrics, finish_metrics
 
 # Load environment variables
 load_dotenv()
 
-class RateLimiter:
-    def __init__(self, max_requests_per_minute):
-        self.max_requests = max_requests_per_minute
-        self.window_size = 60  # 60 seconds = 1 minute
-        self.requests = []
-        self.lock = Lock()
-        self.semaphore = Semaphore(max_requests_per_minute)
-    
-    def wait_if_needed(self):
-        with self.lock:
-            current_time = time.time()
-            # Remove old requests
-            self.requests = [req_time for req_time in self.requests 
-                           if current_time - req_time < self.window_size]
-            
-            if len(self.requests) >= self.max_requests:
-                # Wait until the oldest request expires
-                sleep_time = self.window_size - (current_time - self.requests[0])
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                self.requests = self.requests[1:]
-            
-            self.requests.append(current_time)
+# Marker line that starts every subtitle in a request payload, e.g. "[12]"
+PAYLOAD_MARKER = re.compile(r'^\[(\d+)\][ \t]*$', re.MULTILINE)
+
+# Marker line in a multi-language response, e.g. "[12:de]"
+MULTILINGUAL_MARKER = re.compile(r'^\[(\d+):([\w-]+)\][ \t]*$', re.MULTILINE)
+
+# Appended to the translation prompt so the response can be mapped back to cues
+FORMAT_INSTRUCTIONS = '''
+The input is a list of subtitles. Each subtitle starts with a marker line such as [12] followed by its text.
+Return every marker unchanged on its own line, followed by the translation of that subtitle's text.
+Do not merge, split, skip or reorder subtitles, keep the number of lines within each subtitle and return nothing else.
+'''
+
+# Used instead of FORMAT_INSTRUCTIONS when one request covers several target languages
+MULTILINGUAL_FORMAT_INSTRUCTIONS = '''
+The input is a list of subtitles. Each subtitle starts with a marker line such as [12] followed by its text.
+Translate every subtitle into each of these languages: {languages}.
+For every subtitle and language, return a marker line with the subtitle number and language code, such as [12:{example}],
+followed by the translation into that language. Do not merge, split, skip or reorder subtitles,
+keep the number of lines within each subtitle and return nothing else.
+'''
 
 def setup_gemini():
-    """Setup Gemini API with configuration from environment variables"""
+    """
+    Setup Gemini API with configuration from environment variables
+
+    With several keys in GEMINI_API_KEYS or fallback models in GEMINI_FALLBACK_MODELS,
+    a GeminiPool that spreads requests over them is returned instead of a single model.
+    """
+    if pool_size() > 1:
+        return create_gemini_pool()
+
+    import google.generativeai as genai
+
     api_key = os.getenv('GEMINI_API_KEY')
     model_name = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')  # Default to gemini-1.5-flash if not specified
 
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables")
-    
+
     genai.configure(api_key=api_key)
     model = genai.GenerativeModel(model_name)
     return model
 
-def split_srt_into_chunks(content, chunk_size=None):
-    """Split SRT content into chunks while preserving subtitle blocks"""
-    # Get chunk size from environment variable or use default
-    if chunk_size is None:
-        chunk_size = int(os.getenv('CHUNK_SIZE', '6500'))
-    
-    # Split into individual subtitle blocks
-    blocks = re.split(r'\n\n+', content.strip())
+def gemini_model_name(model=None):
+    """Name of a model as set in GEMINI_MODEL, without the "models/" prefix GenerativeModel adds"""
+    name = getattr(model, 'model_name', None) or os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+    return name[len('models/'):] if name.startswith('models/') else name
+
+def create_rate_limiter(max_requests_per_minute=None, parallel_requests=None, max_tokens_per_minute=None):
+    """
+    Create a rate limiter from arguments, falling back to environment variables
+
+    The MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE and PARALLEL_REQUESTS limits apply to
+    each key and model of a Gemini pool, so the default shared limits cover all of them.
+    """
+    entries = pool_size()
+    if max_requests_per_minute is None:
+        max_requests_per_minute = int(os.getenv('MAX_REQUESTS_PER_MINUTE', '15')) * entries
+    if parallel_requests is None:
+        parallel_requests = int(os.getenv('PARALLEL_REQUESTS', '5')) * entries
+    if max_tokens_per_minute is None and os.getenv('MAX_TOKENS_PER_MINUTE'):
+        max_tokens_per_minute = int(os.getenv('MAX_TOKENS_PER_MINUTE')) * entries
+    return RateLimiter(max_requests_per_minute, max_tokens_per_minute, max_concurrency=parallel_requests)
+
+def estimate_tokens(text):
+    """Rough token count used for rate budgeting (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+def response_token_count(response):
+    """Total tokens reported by the API for a response, if available"""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None)
+
+def response_usage(response):
+    """(prompt tokens, output tokens) reported by the API for a response, if available"""
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'prompt_token_count', None), getattr(usage, 'candidates_token_count', None)
+
+def format_payload(items):
+    """Format (number, text) pairs as the marker-separated request payload"""
+    return '\n'.join(f"[{number}]\n{text}" for number, text in items)
+
+def parse_payload(content):
+    """Map subtitle numbers to translated text in a model response"""
+    parts = PAYLOAD_MARKER.split(content)
+    translated = {}
+    # parts alternate between marker numbers and the text that follows them
+    for i in range(1, len(parts) - 1, 2):
+        text = parts[i + 1].strip()
+        if text:
+            translated[int(parts[i])] = text
+    return translated
+
+async def measure_chars_per_token(model, sample):
+    """Calibrate the characters-per-token ratio of the model on a sample of the text"""
+    if sample:
+        try:
+            result = await model.count_tokens_async(sample)
+            if result.total_tokens:
+                return len(sample) / result.total_tokens
+        except Exception as e:
+            print(f"Token counting failed, assuming 4 characters per token: {str(e)}")
+    return 4.0
+
+def pack_payloads(items, token_budget, chars_per_token):
+    """
+    Group (number, text) pairs into requests of at most token_budget payload tokens
+
+    A single subtitle larger than the budget still gets a request of its own.
+    """
     chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for block in blocks:
-        block_size = len(block)
-        if current_size + block_size + 2 > chunk_size and current_chunk:  # +2 for \n\n
-            chunks.append('\n\n'.join(current_chunk))
-            current_chunk = []
-            current_size = 0
-        
-        current_chunk.append(block)
-        current_size += block_size + 2  # +2 for \n\n
-    
-    if current_chunk:
-        chunks.append('\n\n'.join(current_chunk))
-    
+    current = []
+    current_tokens = 0
+    for number, text in items:
+        tokens = (len(text) + len(str(number)) + 3) / chars_per_token  # "[n]" plus newlines
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append((number, text))
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
     return chunks
 
-def translate_chunk(model, chunk, source_lang, target_lang, rate_limiter):
-    """Translate a chunk of subtitles"""
+def parse_multilingual_payload(content):
+    """Map (subtitle number, language) pairs to translated text in a multi-language response"""
+    parts = MULTILINGUAL_MARKER.split(content)
+    translated = {}
+    # parts repeat as number, language, text after the leading preamble
+    for i in range(1, len(parts) - 2, 3):
+        text = parts[i + 2].strip()
+        if text:
+            translated[(int(parts[i]), parts[i + 1])] = text
+    return translated
+
+def get_translation_prompt(source_lang, target_lang):
+    """
+    Build the translation prompt from the TRANSLATION_PROMPT template
+
+    target_lang may be a list of languages translated by a single request.
+    """
+    target_langs = [target_lang] if isinstance(target_lang, str) else list(target_lang)
     prompt = os.getenv('TRANSLATION_PROMPT', '''
 You are an expert translator. Your task is to translate the given subtitle text from {source_lang} to {target_lang}.
-The input will be in SRT format. Only translate the text content, keeping all numbers, timestamps, and formatting intact.
+Keep translations concise to match subtitle timing.
 ''')
-    
-    prompt = prompt.format(source_lang=source_lang, target_lang=target_lang)
-    
+    prompt = prompt.format(source_lang=source_lang, target_lang=', '.join(target_langs)).rstrip() + '\n'
+    if len(target_langs) == 1:
+        return prompt + FORMAT_INSTRUCTIONS
+    return prompt + MULTILINGUAL_FORMAT_INSTRUCTIONS.format(languages=', '.join(target_langs),
+                                                            example=target_langs[0])
+
+def group_languages(target_langs, chunk_tokens):
+    """
+    Split target languages into groups translated by one request each
+
+    Up to LANGS_PER_REQUEST languages share a request, as long as the expected
+    output (one translation per language) fits TRANSLATION_MAX_OUTPUT_TOKENS.
+    """
+    per_request = int(os.getenv('LANGS_PER_REQUEST', '1'))
+    max_output = int(os.getenv('TRANSLATION_MAX_OUTPUT_TOKENS', '8000'))
+    per_request = max(1, min(per_request, max_output // max(1, chunk_tokens)))
+    return [target_langs[i:i + per_request] for i in range(0, len(target_langs), per_request)]
+
+def parse_languages(values):
+    """Flatten space- and comma-separated language codes from the command line"""
+    languages = []
+    for value in values:
+        languages.extend(code.strip() for code in value.split(',') if code.strip())
+    return list(dict.fromkeys(languages))
+
+def language_output_path(output_file, lang):
+    """Output path for one language: fills a {lang} placeholder or appends _<lang> to the name"""
+    if '{lang}' in output_file:
+        return output_file.replace('{lang}', lang)
+    base, ext = os.path.splitext(output_file)
+    return f"{base}_{lang}{ext or '.srt'}"
+
+def clean_translation(text):
+    """Clean up formatting issues in a model response"""
+    text = text.strip()
+    text = re.sub(r'\\n', '\n', text)  # Replace literal \n with newlines
+    text = re.sub(r'\n{3,}', '\n\n', text)  # Normalize multiple newlines
+    return text
+
+_loop = None
+_loop_lock = Lock()
+
+def get_event_loop():
+    """
+    Return the background event loop shared by all synchronous callers
+
+    The async Gemini client is bound to the loop it was first used on, so every
+    translation in the process runs on this one loop in a daemon thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            Thread(target=_loop.run_forever, name="translation-loop", daemon=True).start()
+        return _loop
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # Interrupted callers cancel the work still in flight
+        future.cancel()
+        raise
+
+async def request_translation(model, payload, source_lang, target_lang, rate_limiter, timeout=None):
+    """Send one translation request and return the cleaned response text, raising on failure"""
+    if timeout is None:
+        timeout = float(os.getenv('TRANSLATION_TIMEOUT', '120'))
+    prompt = get_translation_prompt(source_lang, target_lang)
+
+    request = f"{prompt}\n\n{payload}"
+    # Budget for the request plus a translation of about the same size as the payload per language
+    languages = 1 if isinstance(target_lang, str) else len(target_lang)
+    estimated_tokens = estimate_tokens(request) + estimate_tokens(payload) * languages
+
+    start = None
     try:
+        async with rate_limiter.request_async(estimated_tokens) if rate_limiter else nullcontext():
+            start = time.perf_counter()
+            response = await asyncio.wait_for(
+                model.generate_content_async(request, request_options={"timeout": timeout}),
+                timeout
+            )
+    except asyncio.TimeoutError:
+        metrics.record_request('translate', time.perf_counter() - start, 'timeout')
+        error = TimeoutError(f"request timed out after {timeout:.0f}s")
         if rate_limiter:
-            rate_limiter.wait_if_needed()
-        
-        response = model.generate_content(f"{prompt}\n\n{chunk}")
-        translated_text = response.text.strip()
-        
-        # Clean up any potential formatting issues
-        translated_text = re.sub(r'\\n', '\n', translated_text)  # Replace literal \n with newlines
-        translated_text = re.sub(r'\n{3,}', '\n\n', translated_text)  # Normalize multiple newlines
-        
-        return translated_text
+            rate_limiter.on_error(error)
+        raise error
+    except Exception as e:
+        if start is not None:
+            metrics.record_request('translate', time.perf_counter() - start, 'error', error=type(e).__name__)
+        if rate_limiter:
+            rate_limiter.on_error(e)
+        raise
+    metrics.record_request('translate', time.perf_counter() - start, 'ok', *response_usage(response),
+                           languages=languages)
+    if rate_limiter:
+        rate_limiter.on_success()
+        rate_limiter.record_tokens(estimated_tokens, response_token_count(response))
+    return clean_translation(response.text)
+
+async def translate_chunk_async(model, chunk, source_lang, target_lang, rate_limiter, timeout=None):
+    """Translate a chunk of SRT content using the async Gemini API"""
+    cues = parse_srt(chunk)
+    try:
+        translated = parse_payload(await request_translation(
+            model, format_payload((i, cue.text) for i, cue in enumerate(cues, 1)),
+            source_lang, target_lang, rate_limiter, timeout
+        ))
     except Exception as e:
         print(f"Translation error: {str(e)}")
         return chunk
+    return format_srt(cue.with_text(translated.get(i, cue.text)) for i, cue in enumerate(cues, 1)).strip()
+
+def translate_chunk(model, chunk, source_lang, target_lang, rate_limiter, timeout=None):
+    """Translate a chunk of SRT content"""
+    return run_async(translate_chunk_async(model, chunk, source_lang, target_lang, rate_limiter, timeout))
 
-def translate_srt(input_file, output_file, source_lang="auto", target_lang="en", 
-                 max_requests_per_minute=None, parallel_requests=None):
+async def translate_payload_async(model, chunk, source_lang, target_langs, rate_limiter,
+                                  timeout=None, max_retries=None):
     """
-    Translate SRT subtitle file
-    
+    Translate (number, text) pairs with retries and bisection
+
+    Failed requests are retried with jittered exponential backoff. Subtitles missing
+    from a response are requested again on their own. When a request keeps failing
+    or returning the wrong number of subtitles, it is split in half and each half
+    is retried separately. Subtitles that still fail are left out of the result.
+
     Args:
-        input_file (str): Path to input SRT file
-        output_file (str): Path to output translated SRT file
+        target_langs (list): Languages translated by each request
+
+    Returns:
+        dict: {language: {number: translated text}}
+    """
+    if max_retries is None:
+        max_retries = int(os.getenv('TRANSLATION_MAX_RETRIES', '4'))
+    base_delay = float(os.getenv('TRANSLATION_RETRY_DELAY', '1'))
+    translated = {lang: {} for lang in target_langs}
+    remaining = list(chunk)
+    failures = 0
+
+    while remaining:
+        try:
+            response = await request_translation(
+                model, format_payload(remaining),
+                source_lang, target_langs[0] if len(target_langs) == 1 else target_langs,
+                rate_limiter, timeout
+            )
+            if len(target_langs) == 1:
+                result = {(number, target_langs[0]): text for number, text in parse_payload(response).items()}
+                # A lone subtitle returned without its marker is still a usable translation
+                if not result and len(remaining) == 1 and response:
+                    result = {(remaining[0][0], target_langs[0]): response}
+            else:
+                result = parse_multilingual_payload(response)
+            numbers = {number for number, _ in remaining}
+            for (number, lang), text in result.items():
+                if number in numbers and lang in translated:
+                    translated[lang][number] = text
+            received = len(remaining)
+            remaining = [item for item in remaining
+                         if any(item[0] not in translated[lang] for lang in target_langs)]
+            if not remaining:
+                break
+            error = f"{len(remaining)} of {received} subtitles missing from the response"
+        except Exception as e:
+            error = str(e)
+
+        failures += 1
+        # Split requests that keep failing; smaller requests are less likely to be garbled
+        if len(remaining) > 1 and failures >= 2:
+            middle = len(remaining) // 2
+            print(f"Translation error: {error}; splitting {len(remaining)} subtitles into two requests")
+            metrics.inc('translation_splits')
+            halves = await asyncio.gather(
+                translate_payload_async(model, remaining[:middle], source_lang, target_langs,
+                                        rate_limiter, timeout, max_retries),
+                translate_payload_async(model, remaining[middle:], source_lang, target_langs,
+                                        rate_limiter, timeout, max_retries),
+            )
+            for half in halves:
+                for lang, texts in half.items():
+                    translated[lang].update(texts)
+            break
+        if failures > max_retries:
+            print(f"Translation error: {error}; giving up on {len(remaining)} subtitles")
+            metrics.inc('translation_abandoned_subtitles', len(remaining))
+            break
+        delay = backoff_delay(failures - 1, base_delay)
+        print(f"Translation error: {error}; retrying in {delay:.1f}s")
+        metrics.inc('translation_retries')
+        await asyncio.sleep(delay)
+    return translated
+
+def cue_cache_keys(cues, source_lang, target_langs, model_name):
+    """
+    Translation cache keys of every cue for each language ({language: [key or None for empty cues]})
+
+    Keys use the single-language prompt, so cached texts are shared however languages
+    are grouped into requests, and by translate_srt and StreamingTranslator.
+    """
+    keys = {}
+    for lang in target_langs:
+        prompt = get_translation_prompt(source_lang, lang)
+        keys[lang] = [TranslationCache.make_key(cue.text, source_lang, lang, model_name, prompt) if cue.text else None
+                      for cue in cues]
+    return keys
+
+def lookup_cached(cache, keys, known=()):
+    """Look up the distinct keys not in known in the translation cache and count hits and misses"""
+    lookup = list(dict.fromkeys(key for lang_keys in keys.values() for key in lang_keys
+                                if key and key not in known))
+    with metrics.span('cache_lookup'):
+        found = cache.get_many(lookup)
+    metrics.inc('translation_cache_hits', len(found))
+    metrics.inc('translation_cache_misses', len(lookup) - len(found))
+    return found
+
+def pending_texts(cues, keys, translations):
+    """
+    Texts that still need translating as {text: {language: key}}
+
+    Repeated lines collapse into one entry, so each distinct text is sent once for
+    all languages that need it.
+    """
+    pending = {}
+    for lang, lang_keys in keys.items():
+        for cue, key in zip(cues, lang_keys):
+            if key and key not in translations:
+                pending.setdefault(cue.text, {})[lang] = key
+    return pending
+
+async def translate_texts_async(model, items, source_lang, target_langs, rate_limiter,
+                                timeout=None, chunk_tokens=None, on_translated=None, chars_per_token=None,
+                                verbose=True):
+    """
+    Translate subtitle texts into one or more languages and return {key: translated text}
+
+    Only the texts are sent, numbered 1..n so the response can be mapped back to
+    keys, and packed into requests of up to chunk_tokens tokens. The same packing
+    is shared by every language; languages may also share requests (see
+    group_languages). Texts that could not be translated are left out of the result.
+
+    Args:
+        items (list): (text, {language: key}) pairs listing the languages each text still needs
+        target_langs (list): Target language codes
+        chunk_tokens (int): Token budget for the subtitle payload of one request (default: from env)
+        on_translated (callable): Called with {key: text} as soon as each request completes
+        chars_per_token (float): Characters per token of the model (default: measured on the texts)
+        verbose (bool): Print how the texts were packed into requests (default: True)
+    """
+    if chunk_tokens is None:
+        chunk_tokens = int(os.getenv('CHUNK_TOKENS', '2000'))
+    numbered = [(number, text) for number, (text, _) in enumerate(items, 1)]
+
+    # Calibrate on a sample of the payload instead of counting every request
+    if chars_per_token is None:
+        chars_per_token = await measure_chars_per_token(model, format_payload(numbered[:200]))
+    groups = group_languages(list(target_langs), chunk_tokens)
+    requests = []
+    for group in groups:
+        needed = [(number, text) for number, text in numbered
+                  if any(lang in items[number - 1][1] for lang in group)]
+        requests.extend((group, chunk) for chunk in pack_payloads(needed, chunk_tokens, chars_per_token))
+    if verbose:
+        print(f"Packed {len(numbered)} subtitles into {len(requests)} requests of up to {chunk_tokens} tokens "
+              f"for {len(target_langs)} languages")
+        if rate_limiter.concurrency:
+            print(f"Using up to {rate_limiter.concurrency.maximum} parallel requests with {rate_limiter.max_requests} max requests per minute")
+
+    async def translate_one(group, chunk):
+        result = await translate_payload_async(model, chunk, source_lang, group, rate_limiter, timeout)
+        translated = {}
+        for lang, texts in result.items():
+            for number, text in texts.items():
+                key = items[number - 1][1].get(lang)
+                if key:
+                    translated[key] = text
+        if on_translated:
+            on_translated(translated)
+        return translated
+
+    # Translate chunks concurrently; the rate limiter bounds how many are in flight
+    results = await asyncio.gather(*(translate_one(group, chunk) for group, chunk in requests))
+    translations = {}
+    for result in results:
+        translations.update(result)
+    return translations
+
+async def translate_srt_async(input_file, output_file, source_lang="auto", target_lang="en",
+                              max_requests_per_minute=None, parallel_requests=None, rate_limiter=None,
+                              max_tokens_per_minute=None, model=None, timeout=None, use_cache=True,
+                              chunk_tokens=None):
+    """
+    Translate SRT subtitle file with all chunks in flight on the current event loop
+
+    Only subtitle texts are sent to the model; numbers and timings are kept from
+    the source file. Texts found in the translation cache are not sent again, and
+    repeated lines within the file are translated once. Finished requests are
+    recorded in a checkpoint next to each output, so a restarted run only sends the
+    subtitles that are still missing.
+
+    Input without SRT timings, such as a .txt transcript, is translated paragraph
+    by paragraph and written back as plain text.
+
+    Several target languages are handled as one job: the source is parsed and
+    packed once and all requests share the rate limiter.
+
+    Args:
+        input_file (str): Path to input SRT (or plain text) file
+        output_file (str): Path to output translated SRT file. For several languages it may
+            contain a {lang} placeholder, otherwise _<lang> is added to the file name
         source_lang (str): Source language code (default: auto-detect)
-        target_lang (str): Target language code
+        target_lang (str | list): Target language code, or a list of codes
         max_requests_per_minute (int): Maximum API requests per minute (default: from env)
         parallel_requests (int): Number of parallel translation requests (default: from env)
+        rate_limiter (RateLimiter): Shared rate limiter to use instead of creating a new one
+        max_tokens_per_minute (int): Maximum API tokens per minute (default: from env, unlimited if unset)
+        model (GenerativeModel): Gemini model to use instead of creating one from env settings
+        timeout (float): Per-request timeout in seconds (default: TRANSLATION_TIMEOUT env or 120)
+        use_cache (bool): Use the on-disk translation cache (default: True)
+        chunk_tokens (int): Token budget for the subtitle payload of one request (default: CHUNK_TOKENS env or 2000)
+
+    Returns:
+        str | dict: Output path, or {language: output path} when a list of languages is given
     """
     if not os.path.exists(input_file):
         raise FileNotFoundError(f"Input file not found: {input_file}")
-    
-    # Get configuration from environment variables if not provided
-    if max_requests_per_minute is None:
-        max_requests_per_minute = int(os.getenv('MAX_REQUESTS_PER_MINUTE', '15'))
-    if parallel_requests is None:
-        parallel_requests = int(os.getenv('PARALLEL_REQUESTS', '5'))
-    
+
+    single = isinstance(target_lang, str)
+    target_langs = [target_lang] if single else list(dict.fromkeys(target_lang))
+    output_files = {lang: output_file if single else language_output_path(output_file, lang)
+                    for lang in target_langs}
+
     # Setup Gemini model and rate limiter
-    model = setup_gemini()
-    rate_limiter = RateLimiter(max_requests_per_minute)
-    
-    # Read and split content into chunks
+    if model is None:
+        model = setup_gemini()
+    if rate_limiter is None:
+        rate_limiter = create_rate_limiter(max_requests_per_minute, parallel_requests, max_tokens_per_minute)
+
     with open(input_file, 'r', encoding='utf-8') as f:
         content = f.read()
-    
-    chunks = split_srt_into_chunks(content)
-    print(f"Split content into {len(chunks)} chunks")
-    print(f"Using {parallel_requests} parallel requests with {max_requests_per_minute} max requests per minute")
-    
-    # Translate chunks in parallel
-    with ThreadPoolExecutor(max_workers=parallel_requests) as executor:
-        translated_chunks = list(executor.map(
-            lambda chunk: translate_chunk(model, chunk, source_lang, target_lang, rate_limiter),
-            chunks
-        ))
-    
-    # Combine translated chunks using the same separator
-    separator = '\n\n'
-    translated_content = separator.join(translated_chunks)
-    
-    # Write translated content
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(translated_content)
-    
-    print(f"Translation completed. Output saved to: {output_file}")
-    return output_file
+    cues = parse_srt(content)
+    # Without timings (e.g. a .txt transcript) the text is translated paragraph by paragraph
+    plain_text = not cues
+    if plain_text:
+        cues = parse_text(content)
+    if not cues:
+        raise ValueError(f"No subtitles or text found in: {input_file}")
+    cache = get_translation_cache() if use_cache else None
+    model_name = gemini_model_name(model)
+
+    keys = cue_cache_keys(cues, source_lang, target_langs, model_name)
+    translations = {}
+    checkpoints = {}
+    key_language = {}
+    for lang in target_langs:
+        key_language.update((key, lang) for key in keys[lang] if key)
+
+        # Resume from the checkpoint and reuse cached translations
+        checkpoints[lang] = TranslationCheckpoint(output_files[lang])
+        restored = checkpoints[lang].load()
+        if restored:
+            print(f"[{lang}] Resuming from checkpoint with {len(restored)} translated texts")
+            metrics.inc('checkpoint_restored_texts', len(restored))
+        translations.update(restored)
+    if cache:
+        translations.update(lookup_cached(cache, keys, translations))
+
+    pending = pending_texts(cues, keys, translations)
+    missing = sum(len(langs) for langs in pending.values())
+    print(f"{len(cues)} subtitles, {len(target_langs)} languages: {len(pending)} unique texts to translate "
+          f"({missing} text/language pairs)")
+
+    def save_progress(translated):
+        by_language = {}
+        for key, text in translated.items():
+            by_language.setdefault(key_language[key], {})[key] = text
+        for lang, texts in by_language.items():
+            checkpoints[lang].save(texts)
+        if cache:
+            cache.put_many(translated)
+
+    if pending:
+        with metrics.span('translate_texts', file=os.path.basename(input_file)):
+            translated = await translate_texts_async(model, list(pending.items()), source_lang, target_langs,
+                                                     rate_limiter, timeout, chunk_tokens, save_progress)
+        translations.update(translated)
+    if cache:
+        stats = cache.stats()
+        print(f"Translation cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+
+    # Rebuild the subtitles locally from the original numbers and timings
+    for lang in target_langs:
+        translated_cues = [cue.with_text(translations.get(key, cue.text)) for cue, key in zip(cues, keys[lang])]
+        os.makedirs(os.path.dirname(os.path.abspath(output_files[lang])), exist_ok=True)
+        if plain_text:
+            with open(output_files[lang], 'w', encoding='utf-8') as f:
+                f.write(format_text(translated_cues))
+        else:
+            write_srt(output_files[lang], translated_cues)
+
+        untranslated = len({key for key in keys[lang] if key and key not in translations})
+        if untranslated:
+            print(f"[{lang}] {untranslated} texts could not be translated and were kept in the source language; "
+                  f"run again to retry them")
+        else:
+            checkpoints[lang].remove()
+        print(f"Translation completed. Output saved to: {output_files[lang]}")
+    return output_file if single else output_files
+
+def translate_srt(input_file, output_file, source_lang="auto", target_lang="en",
+                 max_requests_per_minute=None, parallel_requests=None, rate_limiter=None,
+                 max_tokens_per_minute=None, model=None, timeout=None, use_cache=True,
+                 chunk_tokens=None):
+    """
+    Translate SRT subtitle file
+
+    Synchronous wrapper around translate_srt_async; see it for the arguments.
+    """
+    return run_async(translate_srt_async(input_file, output_file, source_lang, target_lang,
+                                         max_requests_per_minute, parallel_requests, rate_limiter,
+                                         max_tokens_per_minute, model, timeout, use_cache, chunk_tokens))
+
+class StreamingTranslator:
+    """
+    Translate subtitles while they are still being produced, e.g. by a running transcription
+
+    Cues passed to add() are buffered until chunk_tokens worth of text has built up;
+    the chunk then goes through translate_texts_async like a small translate_srt
+    job (cache lookup, repeated lines sent once) and is translated on the shared event loop while the caller keeps
+    going. Finished chunks are appended to the output files in order, so only the
+    chunks in flight are held in memory, and add() blocks while max_pending chunks
+    are unfinished. Translations are looked up in and stored to the translation cache.
+
+    Args:
+        output_file (str): Output SRT path; for several languages it may contain {lang},
+            otherwise _<lang> is added to the file name
+        source_lang (str): Source language code (default: auto-detect)
+        target_lang (str | list): Target language code, or a list of codes
+        rate_limiter (RateLimiter): Shared rate limiter (default: created from env settings)
+        model (GenerativeModel): Gemini model (default: created from env settings)
+        timeout (float): Per-request timeout in seconds (default: TRANSLATION_TIMEOUT env or 120)
+        use_cache (bool): Use the on-disk translation cache (default: True)
+        chunk_tokens (int): Subtitle tokens per chunk (default: CHUNK_TOKENS env or 2000)
+        max_pending (int): Chunks in flight before add() waits (default: twice PARALLEL_REQUESTS)
+    """
+
+    def __init__(self, output_file, source_lang="auto", target_lang="en", rate_limiter=None, model=None,
+                 timeout=None, use_cache=True, chunk_tokens=None, max_pending=None):
+        self.single = isinstance(target_lang, str)
+        self.target_langs = [target_lang] if self.single else list(dict.fromkeys(target_lang))
+        self.output_files = {lang: output_file if self.single else language_output_path(output_file, lang)
+                             for lang in self.target_langs}
+        self.source_lang = source_lang
+        self.model = model or setup_gemini()
+        self.rate_limiter = rate_limiter or create_rate_limiter()
+        self.timeout = timeout
+        self.cache = get_translation_cache() if use_cache else None
+        self.model_name = gemini_model_name(self.model)
+        self.chars_per_token = None
+        self.chunk_tokens = chunk_tokens or int(os.getenv('CHUNK_TOKENS', '2000'))
+        if max_pending is None:
+            max_pending = 2 * int(os.getenv('PARALLEL_REQUESTS', '5'))
+        self.slots = Semaphore(max(1, max_pending))
+
+        self.buffer = []
+        self.buffer_tokens = 0
+        self.sent = 0
+        self.written = 0
+        self.finished = {}
+        self.outstanding = {}
+        self.error = None
+        self.untranslated = {lang: 0 for lang in self.target_langs}
+        self.condition = Condition()
+        self.files = {}
+        for lang, path in self.output_files.items():
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.files[lang] = open(path, 'w', encoding='utf-8')
+
+    def add(self, cue):
+        """Queue one subtitle; sends the buffered chunk first when the subtitle would not fit in it"""
+        # Counted like pack_payloads (text plus its "[n]" marker), so a chunk becomes one request
+        tokens = (len(cue.text) + 6) / (self.chars_per_token or 4.0)
+        if self.buffer and self.buffer_tokens + tokens > self.chunk_tokens:
+            self._send()
+        self.buffer.append(cue)
+        self.buffer_tokens += tokens
+
+    def _send(self):
+        if not self.buffer:
+            return
+        chunk = self.buffer
+        self.buffer = []
+        self.buffer_tokens = 0
+        self.slots.acquire()
+        index = self.sent
+        self.sent += 1
+        future = asyncio.run_coroutine_threadsafe(self._translate_chunk(chunk), get_event_loop())
+        with self.condition:
+            self.outstanding[index] = future
+        future.add_done_callback(lambda done: self._chunk_done(index, chunk, done))
+
+    async def _translate_chunk(self, chunk):
+        keys = cue_cache_keys(chunk, self.source_lang, self.target_langs, self.model_name)
+        translations = lookup_cached(self.cache, keys) if self.cache else {}
+        pending = pending_texts(chunk, keys, translations)
+        if pending:
+            items = list(pending.items())
+            # Calibrated once on the first chunk instead of counting tokens for every chunk
+            if self.chars_per_token is None:
+                self.chars_per_token = await measure_chars_per_token(
+                    self.model, format_payload([(number, text) for number, (text, _) in enumerate(items, 1)]))
+            translated = await translate_texts_async(self.model, items, self.source_lang, self.target_langs,
+                                                     self.rate_limiter, self.timeout, self.chunk_tokens,
+                                                     self.cache.put_many if self.cache else None,
+                                                     self.chars_per_token, verbose=False)
+            translations.update(translated)
+
+        return {lang: [(cue, translations.get(key)) for cue, key in zip(chunk, keys[lang])]
+                for lang in self.target_langs}
+
+    def _chunk_done(self, index, chunk, future):
+        # Runs on the event loop thread; writes every chunk that is now next in order
+        try:
+            result = future.result()
+        except BaseException as e:
+            result = {lang: [(cue, None) for cue in chunk] for lang in self.target_langs}
+            if not future.cancelled():
+                self.error = self.error or e
+        with self.condition:
+            self.finished[index] = result
+            while self.written in self.finished:
+                for lang, cues in self.finished.pop(self.written).items():
+                    self.untranslated[lang] += sum(1 for cue, text in cues if cue.text and text is None)
+                    self.files[lang].write(format_srt(cue.with_text(text or cue.text) for cue, text in cues))
+                    self.files[lang].flush()
+                self.written += 1
+            del self.outstanding[index]
+            self.condition.notify_all()
+        self.slots.release()
+
+    def finish(self):
+        """
+        Send the remaining subtitles, wait for every chunk and close the outputs
+
+        Returns:
+            str | dict: Output path, or {language: output path} when a list of languages was given
+        """
+        self._send()
+        with self.condition:
+            self.condition.wait_for(lambda: not self.outstanding)
+        self._close()
+        if self.error:
+            raise self.error
+        for lang, path in self.output_files.items():
+            if self.untranslated[lang]:
+                print(f"[{lang}] {self.untranslated[lang]} subtitles could not be translated and were kept "
+                      f"in the source language")
+            print(f"Translation completed. Output saved to: {path}")
+        return self.output_files[self.target_langs[0]] if self.single else dict(self.output_files)
+
+    def cancel(self):
+        """Stop translating, e.g. when the producer failed, and close the outputs"""
+        with self.condition:
+            futures = list(self.outstanding.values())
+        for future in futures:
+            future.cancel()
+        with self.condition:
+            self.condition.wait_for(lambda: not self.outstanding, timeout=10)
+        self._close()
+
+    def _close(self):
+        for f in self.files.values():
+            f.close()
 
 def main():
     parser = argparse.ArgumentParser(description='Translate SRT subtitle file')
     parser.add_argument('input', help='Input SRT file path')
-    parser.add_argument('output', help='Output SRT file path')
+    parser.add_argument('output', help='Output SRT file path; with several target languages may contain {lang}')
     parser.add_argument('--source', default='auto', help='Source language code (default: auto)')
-    parser.add_argument('--target', default='en', help='Target language code')
+    parser.add_argument('--target', default=['en'], nargs='+',
+                        help='Target language code(s), space or comma separated; each gets its own output file')
     parser.add_argument('--max-rpm', type=int, default=None, help='Maximum requests per minute (default: from env)')
     parser.add_argument('--parallel', type=int, default=None, help='Number of parallel requests (default: from env)')
-    
+    parser.add_argument('--max-tpm', type=int, default=None, help='Maximum tokens per minute (default: from env, unlimited if unset)')
+    parser.add_argument('--timeout', type=float, default=None, help='Per-request timeout in seconds (default: from env or 120)')
+    parser.add_argument('--chunk-tokens', type=int, default=None, help='Subtitle tokens per request (default: from env or 2000)')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the translation cache')
+    add_metrics_arguments(parser)
+
     args = parser.parse_args()
-    translate_srt(args.input, args.output, args.source, args.target, 
-                 args.max_rpm, args.parallel)
+    target_langs = parse_languages(args.target)
+    start_metrics(args)
+    try:
+        translate_srt(args.input, args.output, args.source,
+                     target_langs[0] if len(target_langs) == 1 else target_langs,
+                     args.max_rpm, args.parallel, max_tokens_per_minute=args.max_tpm, timeout=args.timeout,
+                     use_cache=not args.no_cache, chunk_tokens=args.chunk_tokens)
+    finally:
+        finish_metrics(args)
 
 if __name__ == "__main__":
     main()
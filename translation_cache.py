@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from threading import Lock
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'auto-translator', 'translations.sqlite3')
+
+
+def normalize_text(text):
+    """Normalize subtitle text for cache lookups, keeping the line structure intact"""
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in text.strip().split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+def prompt_hash(prompt):
+    """Short stable hash of a prompt so prompt changes invalidate cached translations"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+
+class TranslationCache:
+    """
+    On-disk cache of translated subtitle blocks backed by SQLite
+
+    Entries are keyed by normalized source text, source/target language, model name
+    and prompt hash. When the stored text exceeds max_bytes, the least recently
+    used entries are evicted.
+
+    Args:
+        path (str): SQLite database path (default: TRANSLATION_CACHE_PATH env or ~/.cache/auto-translator)
+        max_bytes (int): Size limit for stored text (default: TRANSLATION_CACHE_MAX_MB env or 200 MB)
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or os.getenv('TRANSLATION_CACHE_PATH') or DEFAULT_CACHE_PATH
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('TRANSLATION_CACHE_MAX_MB', '200')) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                translation TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)')
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(text, source_lang, target_lang, model_name, prompt):
+        """Build the cache key for one subtitle block"""
+        payload = json.dumps([normalize_text(text), source_lang, target_lang, model_name, prompt_hash(prompt)],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Look up several keys at once and return a {key: translation} dict of the hits"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's limit on query parameters
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self.connection.execute(
+                    f'SELECT key, translation FROM translations WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.connection.executemany('UPDATE translations SET last_used = ? WHERE key = ?',
+                                            [(now, key) for key in found])
+                self.connection.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Store {key: translation} pairs and evict old entries if the cache is too large"""
+        if not items:
+            return
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO translations (key, translation, size, last_used) VALUES (?, ?, ?, ?)',
+                [(key, value, len(key) + len(value.encode('utf-8')), now) for key, value in items.items()]
+            )
+            self.connection.commit()
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM translations').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the limit so eviction does not run on every insert
+        to_free = total - int(self.max_bytes * 0.9)
+        freed = 0
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM translations ORDER BY last_used'):
+            evicted.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        self.connection.executemany('DELETE FROM translations WHERE key = ?', evicted)
+        self.connection.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the current size of the cache"""
+        with self.lock:
+            entries, size = self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size,
+        }
+
+
+class TranslationCheckpoint:
+    """
+    Append-only record of translated subtitles for one output file
+
+    Every finished request is appended as a JSON line, so a restarted translation
+    only sends the subtitles that are still missing. Entries use the same keys as
+    TranslationCache, so stale entries from a changed source are simply ignored.
+    """
+
+    def __init__(self, output_file):
+        self.path = f"{output_file}.checkpoint.jsonl"
+        self.lock = Lock()
+
+    def load(self):
+        """Return {key: translation} for everything recorded so far"""
+        translations = {}
+        if not os.path.exists(self.path):
+            return translations
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    translations.update(json.loads(line))
+                except ValueError:
+                    # A crash may leave the last line incomplete
+                    continue
+        return translations
+
+    def save(self, translations):
+        """Append a batch of finished translations"""
+        if not translations:
+            return
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(translations, ensure_ascii=False) + '\n')
+                f.flush()
+
+    def remove(self):
+        """Delete the checkpoint once the output is complete"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+_cache = None
+_cache_lock = Lock()
+
+
+def get_translation_cache():
+    """Return the process-wide translation cache, or None when disabled via TRANSLATION_CACHE=0"""
+    global _cache
+    if os.getenv('TRANSLATION_CACHE', '1').lower() in ('0', 'false', 'no', 'off'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranslationCache()
+        return _cache
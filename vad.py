@@ -0,0 +1,99 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def frame_energy_db(audio, frame_size):
+    """RMS energy in dB of consecutive non-overlapping frames"""
+    frames = len(audio) // frame_size
+    if frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    framed = audio[:frames * frame_size].reshape(frames, frame_size)
+    rms = np.sqrt(np.mean(framed.astype(np.float32) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect_speech_regions(audio, sample_rate=SAMPLE_RATE, frame_ms=30, threshold_db=None,
+                          min_silence_ms=500, min_speech_ms=250, padding_ms=200):
+    """
+    Find regions containing speech with an energy-based detector
+
+    Frames louder than the threshold count as speech. By default the threshold
+    adapts to the recording: 12 dB above its noise floor (10th percentile of frame
+    energy), capped at 20 dB below its loud level (95th percentile) for recordings
+    without pauses, and never below -50 dBFS. Pauses shorter than min_silence_ms are bridged
+    and regions shorter than min_speech_ms are dropped.
+
+    Returns:
+        list: (start_sample, end_sample) pairs in ascending order
+    """
+    frame_size = int(sample_rate * frame_ms / 1000)
+    energy = frame_energy_db(audio, frame_size)
+    if len(energy) == 0:
+        return []
+    if threshold_db is None:
+        noise_floor, loud_level = np.percentile(energy, [10, 95])
+        threshold_db = max(min(float(noise_floor) + 12.0, float(loud_level) - 20.0), -50.0)
+    voiced = energy > threshold_db
+
+    regions = []
+    start = None
+    for i, is_voiced in enumerate(voiced):
+        if is_voiced and start is None:
+            start = i
+        elif not is_voiced and start is not None:
+            regions.append([start, i])
+            start = None
+    if start is not None:
+        regions.append([start, len(voiced)])
+
+    # Bridge short pauses, then drop blips
+    min_silence = max(1, min_silence_ms // frame_ms)
+    merged = []
+    for region in regions:
+        if merged and region[0] - merged[-1][1] < min_silence:
+            merged[-1][1] = region[1]
+        else:
+            merged.append(region)
+    min_speech = max(1, min_speech_ms // frame_ms)
+    merged = [region for region in merged if region[1] - region[0] >= min_speech]
+
+    padding = int(sample_rate * padding_ms / 1000)
+    return [
+        (max(0, start * frame_size - padding), min(len(audio), end * frame_size + padding))
+        for start, end in merged
+    ]
+
+
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, max_segment_seconds=120, **vad_options):
+    """
+    Cut audio into segments at silences for independent transcription
+
+    Neighbouring speech regions are grouped into segments of up to
+    max_segment_seconds, so every cut falls in a pause. A single region longer
+    than the limit is cut at its quietest frame.
+
+    Returns:
+        list: (start_sample, end_sample) pairs in ascending order
+    """
+    max_samples = int(max_segment_seconds * sample_rate)
+    segments = []
+    for start, end in detect_speech_regions(audio, sample_rate, **vad_options):
+        if segments and end - segments[-1][0] <= max_samples:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+
+    frame_size = int(sample_rate * 0.03)
+    result = []
+    for start, end in segments:
+        while end - start > max_samples:
+            # Look for the quietest frame in the last quarter of the allowed length
+            window_start = start + max_samples * 3 // 4
+            energy = frame_energy_db(audio[window_start:start + max_samples], frame_size)
+            cut = window_start + (int(np.argmin(energy)) * frame_size if len(energy) else 0)
+            cut = cut if cut > start else start + max_samples
+            result.append((start, cut))
+            start = cut
+        result.append((start, end))
+    return result